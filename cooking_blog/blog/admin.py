@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
-from .models import User, Recipe, Ingredient, Instruction, StoryPost, RecipeLike, RecipeReport
+from .models import User, Recipe, Ingredient, Instruction, StoryPost, RecipeLike, RecipeReport, ModerationFlag
 
 
 @admin.register(User)
@@ -41,9 +41,9 @@ class RecipeAdmin(admin.ModelAdmin):
     """Admin configuration for Recipe model."""
     list_display = ('title', 'in_evidenza_badge', 'author', 'category', 'prep_time', 'gluten_free', 'lactose_free', 'is_featured', 'created_at', 'is_published')
     list_editable = ('is_featured',)
-    list_filter = ('category', 'is_published', 'is_featured', 'gluten_free', 'lactose_free', 'created_at')
+    list_filter = ('category', 'is_published', 'is_featured', 'is_hidden', 'gluten_free', 'lactose_free', 'created_at')
     search_fields = ('title', 'description', 'author__name', 'author__email')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'likes_count', 'reports_count', 'hidden_at')
     inlines = [IngredientInline, InstructionInline]
 
     @admin.display(description='Ricetta in evidenza')
@@ -63,6 +63,9 @@ class RecipeAdmin(admin.ModelAdmin):
         ('Status', {
             'fields': ('is_published', 'is_featured')
         }),
+        ('Segnalazioni', {
+            'fields': ('is_hidden', 'hidden_at', 'reports_count', 'likes_count')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -90,6 +93,17 @@ class RecipeReportAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
 
+@admin.register(ModerationFlag)
+class ModerationFlagAdmin(admin.ModelAdmin):
+    """Admin configuration for ModerationFlag model."""
+    list_display = ('source', 'object_id', 'field', 'term', 'category', 'recipe', 'excerpt', 'reviewed', 'flagged_at')
+    list_filter = ('reviewed', 'source', 'category')
+    list_editable = ('reviewed',)
+    search_fields = ('term', 'excerpt', 'recipe__title')
+    readonly_fields = ('source', 'object_id', 'field', 'recipe', 'term', 'category', 'excerpt', 'flagged_at')
+    list_select_related = ('recipe',)
+
+
 @admin.register(StoryPost)
 class StoryPostAdmin(admin.ModelAdmin):
     """Admin configuration for StoryPost model."""
@@ -8,6 +8,8 @@ class BlogConfig(AppConfig):
     name = 'blog'
 
     def ready(self):
+        from . import signals  # noqa: F401  (connect signal handlers)
+
         # Create MEDIA_ROOT at runtime when using a persistent disk (path exists = disk is mounted).
         # Skip during build, when the disk is not available.
         from django.conf import settings
@@ -0,0 +1,437 @@
+"""
+Endpoint benchmark harness (seed_benchmark_data and benchmark_endpoints commands).
+
+seed() fills the database with a reproducible dataset: users, recipes with
+realistic ingredient and instruction counts, and likes and reports whose
+popularity follows a Zipf-like distribution (a few recipes get most of the
+traffic). Everything it creates belongs to users under BENCH_EMAIL_DOMAIN,
+so flush() removes it again.
+
+run() drives every route of blog/urls.py through the real WSGI handler
+(full middleware stack, no test client shortcuts), first one request at a
+time and then from concurrent client threads, and measures per scenario:
+latency percentiles, requests/s, SQL queries and SQL time per request,
+response size and peak Python memory (tracemalloc). Results are plain
+dicts, written as JSON by the command so runs can be diffed across commits.
+
+Write scenarios (register, create, like, report...) change the data: run
+the benchmark against a scratch database.
+"""
+import json
+import math
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import cache, category_counts
+from .models import Ingredient, Instruction, Recipe, RecipeLike, RecipeReport, StoryPost, User
+from .search import index_recipes
+from .slugs import next_free_slug, slug_base
+
+BENCH_EMAIL_DOMAIN = 'bench.sardegnaricette.invalid'
+BENCH_PASSWORD = 'benchmark-password'
+BATCH_SIZE = 1000
+
+DISHES = [
+    'Culurgiones', 'Malloreddus', 'Fregola', 'Seadas', 'Porceddu', 'Pane carasau', 'Pane guttiau',
+    'Zuppa gallurese', 'Su filindeu', 'Pardulas', 'Amaretti', 'Papassinos', 'Bottarga', 'Favata',
+    'Culurgiones di patate', 'Lorighittas', 'Panadas', 'Aragosta alla catalana', 'Sebadas al miele',
+]
+VARIANTS = ['della nonna', 'al pomodoro', 'con arselle', 'alla campidanese', 'al pecorino', 'veloci', 'tradizionali']
+INGREDIENTS = [
+    '500 g di semola', '300 g di pecorino sardo', '2 uova', '1 spicchio di aglio', 'olio extravergine',
+    'sale', '400 g di passata di pomodoro', '10 foglie di menta', 'zafferano', '200 g di salsiccia',
+    'miele di corbezzolo', 'scorza di limone', '1 kg di patate', 'acqua tiepida', 'pepe nero',
+]
+STEPS = [
+    'Impastare la semola con acqua tiepida e un pizzico di sale.',
+    'Lasciare riposare l\'impasto coperto per mezz\'ora.',
+    'Preparare il sugo facendo soffriggere aglio e olio.',
+    'Unire il pomodoro e cuocere a fuoco lento per venti minuti.',
+    'Formare gli gnocchetti passando l\'impasto sul ciurili.',
+    'Cuocere in abbondante acqua salata e scolare al dente.',
+    'Condire con il sugo e completare con pecorino grattugiato.',
+    'Servire ben caldo.',
+]
+
+
+def _zipf_weights(count, exponent=1.1):
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def _skewed_pairs(rng, user_ids, recipe_ids, count, max_per_recipe=None):
+    """Up to `count` distinct (user, recipe) pairs; recipes picked with a Zipf-like popularity."""
+    weights = _zipf_weights(len(recipe_ids))
+    per_recipe = Counter()
+    pairs = set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 20:
+        attempts += 1
+        recipe_id = rng.choices(recipe_ids, weights)[0]
+        if max_per_recipe is not None and per_recipe[recipe_id] >= max_per_recipe:
+            continue
+        pair = (rng.choice(user_ids), recipe_id)
+        if pair not in pairs:
+            pairs.add(pair)
+            per_recipe[recipe_id] += 1
+    return sorted(pairs), per_recipe
+
+
+def seed(users=50, recipes=500, stories=20, likes=5000, reports=200, random_seed=42):
+    """Create a benchmark dataset; returns the number of rows created per model."""
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    # Hashing once: PBKDF2 per user would dominate the seeding time.
+    password = make_password(BENCH_PASSWORD)
+    start = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').count()
+
+    with transaction.atomic():
+        new_users = User.objects.bulk_create([
+            User(email=f'user{start + i}@{BENCH_EMAIL_DOMAIN}', name=f'Utente {start + i}', password=password)
+            for i in range(users)
+        ], batch_size=BATCH_SIZE)
+        user_ids = list(
+            User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').values_list('pk', flat=True)
+        )
+
+        taken = set(Recipe.objects.values_list('slug', flat=True))
+        categories = [value for value, _ in Recipe.CATEGORY_CHOICES]
+        new_recipes = []
+        for i in range(recipes):
+            title = f'{rng.choice(DISHES)} {rng.choice(VARIANTS)}'
+            slug = next_free_slug(slug_base(title), taken)
+            taken.add(slug)
+            new_recipes.append(Recipe(
+                title=title,
+                slug=slug,
+                description=' '.join(rng.sample(STEPS, 3)),
+                final_comment=rng.choice(['', 'Ottime anche il giorno dopo.']),
+                category=rng.choice(categories),
+                prep_time=rng.choice([15, 20, 30, 45, 60, 90, 120]),
+                author_id=rng.choice(user_ids),
+                gluten_free=rng.random() < 0.2,
+                lactose_free=rng.random() < 0.2,
+                is_sardinian=rng.random() < 0.8,
+                is_featured=rng.random() < 0.05,
+                is_published=rng.random() < 0.95,
+            ))
+        new_recipes = Recipe.objects.bulk_create(new_recipes, batch_size=BATCH_SIZE)
+        # auto_now_add ignores given values: spread creation dates over two years afterwards.
+        for recipe in new_recipes:
+            recipe.created_at = now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))
+        Recipe.objects.bulk_update(new_recipes, ['created_at'], batch_size=BATCH_SIZE)
+        new_ids = [recipe.pk for recipe in new_recipes]
+
+        lines = {Ingredient: [], Instruction: []}
+        for recipe_id in new_ids:
+            for order, name in enumerate(rng.sample(INGREDIENTS, rng.randint(5, 14))):
+                lines[Ingredient].append(Ingredient(recipe_id=recipe_id, name=name, order=order))
+            for order in range(rng.randint(4, 10)):
+                lines[Instruction].append(Instruction(recipe_id=recipe_id, step=rng.choice(STEPS), order=order))
+        for model, rows in lines.items():
+            model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+        like_pairs, like_counts = _skewed_pairs(rng, user_ids, new_ids, likes)
+        RecipeLike.objects.bulk_create(
+            [RecipeLike(user_id=user_id, recipe_id=recipe_id) for user_id, recipe_id in like_pairs],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        # Below the hiding threshold, so every seeded recipe stays visible.
+        report_pairs, report_counts = _skewed_pairs(
+            rng, user_ids, new_ids, reports, max_per_recipe=Recipe.FLAG_REPORT_THRESHOLD - 1,
+        )
+        reasons = [value for value, _ in RecipeReport.REASON_CHOICES]
+        RecipeReport.objects.bulk_create(
+            [RecipeReport(user_id=user_id, recipe_id=recipe_id, reason=rng.choice(reasons)) for user_id, recipe_id in report_pairs],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        for recipe in new_recipes:
+            recipe.likes_count = like_counts[recipe.pk]
+            recipe.reports_count = report_counts[recipe.pk]
+        Recipe.objects.bulk_update(new_recipes, ['likes_count', 'reports_count'], batch_size=BATCH_SIZE)
+
+        new_stories = StoryPost.objects.bulk_create([
+            StoryPost(
+                title=f'La cucina di {rng.choice(DISHES)}',
+                content=' '.join(rng.sample(STEPS, 5)),
+                author_id=rng.choice(user_ids),
+                role=rng.choice(['Chef', 'Sous Chef', 'Pastry Chef']),
+            )
+            for _ in range(stories)
+        ], batch_size=BATCH_SIZE)
+
+        # Bulk writes send no signals: rebuild the derived data once.
+        index_recipes(new_ids)
+        category_counts.rebuild()
+        for scope in (cache.RECIPES, cache.STORIES, cache.SITEMAP):
+            cache.bump_generation(scope)
+
+    return {
+        'users': len(new_users), 'recipes': len(new_ids), 'ingredients': len(lines[Ingredient]),
+        'instructions': len(lines[Instruction]), 'likes': len(like_pairs), 'reports': len(report_pairs),
+        'stories': len(new_stories),
+    }
+
+
+def flush():
+    """Delete every benchmark user and, through the cascades, their recipes, likes, reports and stories."""
+    with transaction.atomic():
+        deleted, _ = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
+        category_counts.rebuild()
+        for scope in (cache.RECIPES, cache.STORIES, cache.SITEMAP):
+            cache.bump_generation(scope)
+    return deleted
+
+
+def dataset_counts():
+    return {
+        'users': User.objects.count(), 'recipes': Recipe.objects.count(), 'ingredients': Ingredient.objects.count(),
+        'instructions': Instruction.objects.count(), 'likes': RecipeLike.objects.count(),
+        'reports': RecipeReport.objects.count(), 'stories': StoryPost.objects.count(),
+    }
+
+
+# Scenarios
+
+# path and data may be callables taking (context, iteration). auth: True sends the JWT of a benchmark
+# user; 'report' the JWT of a different user per request (see Context.report_target).
+Scenario = namedtuple('Scenario', ['name', 'method', 'path', 'data', 'auth', 'writes'])
+
+
+def _recipe_payload(context, i):
+    return {
+        'title': f'Malloreddus benchmark {context.run_id} {i}',
+        'description': STEPS[0],
+        'category': 'Pasta Dishes',
+        'prep_time': 45,
+        'ingredients': INGREDIENTS[:8],
+        'instructions': STEPS[:6],
+    }
+
+
+SCENARIOS = [
+    Scenario('recipe-list', 'get', '/api/recipes/', None, False, False),
+    Scenario('recipe-list-auth', 'get', '/api/recipes/', None, True, False),
+    Scenario('recipe-list-filtered', 'get', '/api/recipes/', {'category': 'Desserts', 'gluten_free': 'true'}, True, False),
+    Scenario('recipe-list-search', 'get', '/api/recipes/', {'search': 'culurgiones pecorino'}, True, False),
+    Scenario('recipe-list-deep-page', 'get', '/api/recipes/', lambda c, i: {'page': c.last_page}, True, False),
+    Scenario('category-counts', 'get', '/api/recipes/category_counts/', None, False, False),
+    Scenario('my-recipes', 'get', '/api/recipes/my/', None, True, False),
+    Scenario('like-states', 'get', '/api/recipes/likes/', lambda c, i: {'ids': c.like_state_ids}, True, False),
+    Scenario('recipe-detail', 'get', lambda c, i: f'/api/recipes/{c.popular_slug}/', None, False, False),
+    Scenario('recipe-detail-auth', 'get', lambda c, i: f'/api/recipes/{c.popular_slug}/', None, True, False),
+    Scenario('story-list', 'get', '/api/stories/', None, False, False),
+    Scenario('story-detail', 'get', lambda c, i: f'/api/stories/{c.story_id}/', None, False, False),
+    Scenario('sitemap-index', 'get', '/api/sitemap.xml', None, False, False),
+    Scenario('sitemap-recipes', 'get', '/api/sitemap-recipes-1.xml', None, False, False),
+    Scenario('me', 'get', '/api/auth/me/', None, True, False),
+    Scenario('token-refresh', 'post', '/api/auth/token/refresh/', lambda c, i: {'refresh': c.refresh_token}, False, False),
+    Scenario('login', 'post', '/api/auth/login/', lambda c, i: {'email': c.email, 'password': BENCH_PASSWORD}, False, False),
+    Scenario('register', 'post', '/api/auth/register/', lambda c, i: {
+        'email': f'register-{c.run_id}-{i}@{BENCH_EMAIL_DOMAIN}', 'name': 'Nuovo Utente',
+        'password': 'Sardegna-2024!', 'password2': 'Sardegna-2024!',
+    }, False, True),
+    Scenario('recipe-create', 'post', '/api/recipes/', _recipe_payload, True, True),
+    Scenario('recipe-update', 'patch', lambda c, i: f'/api/recipes/{c.own_slug}/', lambda c, i: {
+        'description': STEPS[i % len(STEPS)],
+    }, True, True),
+    Scenario('like-toggle', 'post', lambda c, i: f'/api/recipes/{c.recipe_slugs[i % len(c.recipe_slugs)]}/like/', None, True, True),
+    Scenario('like-put', 'put', lambda c, i: f'/api/recipes/{c.recipe_slugs[i % len(c.recipe_slugs)]}/like/', None, True, True),
+    Scenario('report', 'post', lambda c, i: f'/api/recipes/{c.report_target(i)[1]}/report/', {'reason': 'spam'}, 'report', True),
+]
+
+
+class Context:
+    """Ids, slugs and tokens the scenarios need, picked from the current data."""
+
+    def __init__(self):
+        self.run_id = format(time.time_ns(), 'x')
+        user = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}', recipes__isnull=False).order_by('pk').first()
+        if user is None:
+            raise ValueError('No benchmark data: run seed_benchmark_data first.')
+        self.user = user
+        self.email = user.email
+        refresh = RefreshToken.for_user(user)
+        self.refresh_token = str(refresh)
+        self.access_token = str(refresh.access_token)
+        visible = Recipe.objects.filter(is_published=True, is_hidden=False)
+        self.popular_slug = visible.order_by('-likes_count', 'pk').values_list('slug', flat=True)[0]
+        self.own_slug = Recipe.objects.filter(author=user).values_list('slug', flat=True)[0]
+        self.recipe_slugs = list(visible.order_by('-likes_count', 'pk').values_list('slug', flat=True)[:200])
+        self.like_state_ids = ','.join(map(str, visible.order_by('-created_at').values_list('pk', flat=True)[:20]))
+        self.last_page = max(1, math.ceil(visible.count() / 20))
+        self.story_id = StoryPost.objects.filter(is_published=True).values_list('pk', flat=True).first() or 0
+        self._report_targets = None
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def report_target(self, i):
+        """(user id, recipe slug) pairs that haven't been reported yet, least reported recipes first."""
+        with self._lock:
+            if self._report_targets is None:
+                user_ids = list(User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').values_list('pk', flat=True))
+                recipes = list(
+                    Recipe.objects.filter(is_published=True, is_hidden=False, reports_count=0)
+                    .values_list('slug', 'author_id')[:1000]
+                )
+                self._report_targets = []
+                for j, (slug, author_id) in enumerate(recipes):
+                    user_id = user_ids[j % len(user_ids)]
+                    if user_id != author_id:
+                        self._report_targets.append((user_id, slug))
+            return self._report_targets[i % len(self._report_targets)]
+
+    def token_for(self, user_id):
+        with self._lock:
+            if user_id not in self._tokens:
+                self._tokens[user_id] = str(RefreshToken.for_user(User(pk=user_id)).access_token)
+            return self._tokens[user_id]
+
+
+# Running
+
+class _QueryCounter:
+    """Counts the queries and SQL time of the current thread's connection (connection.execute_wrapper)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class Runner:
+    """Sends scenario requests through the WSGI handler and records the measurements."""
+
+    def __init__(self, context, host='localhost', secure=False):
+        self.context = context
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory()
+        self.headers = {'HTTP_HOST': host}
+        if secure:
+            self.headers['HTTP_X_FORWARDED_PROTO'] = 'https'
+        self.secure = secure
+
+    def _environ(self, scenario, i):
+        resolve = lambda value: value(self.context, i) if callable(value) else value  # noqa: E731
+        path, data = resolve(scenario.path), resolve(scenario.data)
+        headers = dict(self.headers)
+        if scenario.auth == 'report':
+            token = self.context.token_for(self.context.report_target(i)[0])
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        elif scenario.auth:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {self.context.access_token}'
+        method = getattr(self.factory, scenario.method)
+        if scenario.method == 'get':
+            return method(path, data=data, secure=self.secure, **headers).environ
+        return method(
+            path, data=json.dumps(data or {}), content_type='application/json', secure=self.secure, **headers,
+        ).environ
+
+    def request(self, scenario, i):
+        """One request: (status, seconds, queries, SQL seconds, response bytes)."""
+        environ = self._environ(scenario, i)
+        statuses = []
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            body = self.handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                size = sum(len(chunk) for chunk in body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        elapsed = time.perf_counter() - started
+        return int(statuses[0].split()[0]), elapsed, counter.count, counter.seconds, size
+
+    def sequential(self, scenario, requests, warmup):
+        for i in range(warmup):
+            self.request(scenario, i)
+        started = time.perf_counter()
+        samples = [self.request(scenario, warmup + i) for i in range(requests)]
+        result = summarize(samples, time.perf_counter() - started)
+        result['peak_memory_kib'] = self.peak_memory(scenario, warmup + requests)
+        return result
+
+    def concurrent(self, scenario, requests, concurrency, offset):
+        def work(i):
+            try:
+                return self.request(scenario, offset + i)
+            finally:
+                connections.close_all()  # the worker thread's own connections
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(work, range(requests)))
+        result = summarize(samples, time.perf_counter() - started)
+        result['concurrency'] = concurrency
+        return result
+
+    def peak_memory(self, scenario, offset, repeats=3):
+        """Largest Python heap growth (KiB) during one request, measured apart from the timed runs."""
+        tracemalloc.start()
+        try:
+            peak = 0
+            for i in range(repeats):
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                self.request(scenario, offset + i)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+        return round(peak / 1024, 1)
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile."""
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, wall_seconds):
+    latencies = sorted(sample[1] * 1000 for sample in samples)
+    count = len(samples)
+    statuses = Counter(str(sample[0]) for sample in samples)
+    return {
+        'requests': count,
+        'status': dict(sorted(statuses.items())),
+        'errors': sum(n for status, n in statuses.items() if int(status) >= 500),
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / count, 2),
+        'requests_per_s': round(count / wall_seconds, 1) if wall_seconds else None,
+        'queries': round(sum(sample[2] for sample in samples) / count, 2),
+        'sql_ms': round(sum(sample[3] for sample in samples) / count * 1000, 2),
+        'bytes': round(sum(sample[4] for sample in samples) / count),
+    }
+
+
+def run(scenarios, requests=200, warmup=10, concurrency=4, host='localhost', secure=False, progress=None):
+    """Benchmark `scenarios` (read ones first); returns {scenario: {'sequential': ..., 'concurrent': ...}}."""
+    context = Context()
+    runner = Runner(context, host=host, secure=secure)
+    results = {}
+    for scenario in sorted(scenarios, key=lambda s: s.writes):
+        results[scenario.name] = {'method': scenario.method.upper(), 'sequential': runner.sequential(scenario, requests, warmup)}
+        if concurrency > 1:
+            offset = warmup + requests + 3
+            results[scenario.name]['concurrent'] = runner.concurrent(scenario, requests, concurrency, offset)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
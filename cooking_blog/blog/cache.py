@@ -0,0 +1,169 @@
+"""
+Shared response cache for anonymous listing requests.
+
+Entries are keyed by a generation counter per content scope ('recipes',
+'stories') plus the scheme and host of the request (responses hold absolute
+next/previous and image URLs) and a normalized form of the query parameters. Saving or deleting
+a Recipe, RecipeLike, RecipeReport or StoryPost bumps the generation of its
+scope on commit (see blog.signals), which makes every older entry unreachable:
+invalidation is exact and costs one single-row UPDATE.
+
+The generations live in the database (ContentGeneration), not in the cache:
+without REDIS_URL every gunicorn worker has its own in-memory cache, and a
+bump stored there would never reach the other workers, nor would one made by
+a management command or the like-buffer flusher reach any of them. Reading a
+generation is one primary-key lookup, done at most once per request and
+scope. The entries themselves may stay per process: they are only ever
+reached through the current generation.
+
+Recomputation is single-flight: when an entry is missing or expired, one
+request takes a short lock and rebuilds it, while concurrent requests serve
+the expired copy (or wait briefly for the fresh one) instead of all hitting
+the database at once.
+"""
+import hashlib
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Value
+from django.db.models.functions import Greatest
+from . import metrics
+from .models import ContentGeneration
+
+logger = logging.getLogger(__name__)
+
+RECIPES = 'recipes'
+STORIES = 'stories'
+# Bumped only when the set of public recipe/story URLs or their lastmod may change (see blog.sitemap)
+SITEMAP = 'sitemap'
+
+# Query parameters that change the response of each cached endpoint; anything else is ignored.
+RECIPE_LIST_PARAMS = (
+    'search', 'category', 'gluten_free', 'lactose_free', 'is_sardinian', 'redazione_only',
+    'order_by', 'page', 'cursor', 'fields',
+)
+STORY_LIST_PARAMS = ('search', 'page', 'cursor')
+BOOLEAN_PARAMS = {'gluten_free', 'lactose_free', 'is_sardinian', 'redazione_only'}
+
+LOCK_TIMEOUT = 10  # seconds a recomputation may hold the lock
+WAIT_TIMEOUT = 2.0  # seconds a request waits for another one's recomputation
+WAIT_INTERVAL = 0.05
+
+
+def _timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def get_generation(scope, request=None):
+    """
+    Current generation of a scope. Generations are time.time_ns() values, so they
+    double as the scope's last-modified time. With a request, the value is read once
+    and reused by the rest of that request (validators, cache key).
+    """
+    memo = getattr(request, '_content_generations', None) if request is not None else None
+    if memo is not None and scope in memo:
+        return memo[scope]
+    generation = ContentGeneration.objects.filter(scope=scope).values_list('value', flat=True).first()
+    if generation is None:
+        # Row missing (e.g. a flushed test database): start a new generation, treating content as changed now.
+        ContentGeneration.objects.bulk_create(
+            [ContentGeneration(scope=scope, value=time.time_ns())], ignore_conflicts=True,
+        )
+        generation = ContentGeneration.objects.filter(scope=scope).values_list('value', flat=True).first()
+    if request is not None:
+        if memo is None:
+            memo = request._content_generations = {}
+        memo[scope] = generation
+    return generation
+
+
+def _store_generation(scope):
+    now = time.time_ns()
+    # Strictly increasing, even when this host's clock is behind the previous writer's.
+    updated = ContentGeneration.objects.filter(scope=scope).update(
+        value=Greatest(F('value') + 1, Value(now, output_field=BigIntegerField())),
+    )
+    if not updated:
+        ContentGeneration.objects.bulk_create([ContentGeneration(scope=scope, value=now)], ignore_conflicts=True)
+
+
+def bump_generation(scope):
+    """Invalidate every cached response of a scope, in every process, once the current transaction commits."""
+    transaction.on_commit(lambda: _store_generation(scope), robust=True)
+
+
+def normalize_params(query_params, allowed):
+    """Canonical, order-independent representation of the parameters that affect a response."""
+    normalized = []
+    for name in allowed:
+        value = query_params.get(name)
+        if value is None:
+            continue
+        value = ' '.join(value.split())
+        if name in BOOLEAN_PARAMS:
+            value = 'true' if value.lower() in ('true', '1', 'yes') else 'false'
+        elif name in ('search', 'order_by'):
+            value = value.casefold()
+        elif name == 'fields':
+            value = ','.join(sorted({field.strip() for field in value.split(',') if field.strip()}))
+        if value or name == 'cursor':
+            normalized.append(f'{name}={value}')
+    return '&'.join(normalized)
+
+
+def is_cacheable(request):
+    return request.method in ('GET', 'HEAD') and not request.user.is_authenticated
+
+
+def cached_response_data(name, scope, request, compute, allowed_params=()):
+    """
+    Return the cached response data for an anonymous request, computing it with `compute()`
+    (single-flight) on a miss. `scope` selects the generation counter that invalidates it.
+    """
+    params = normalize_params(request.query_params, allowed_params)
+    # Pagination links and image URLs are absolute: one entry per origin.
+    origin = f'{request.scheme}://{request.get_host()}'
+    digest = hashlib.sha1(f'{origin}?{params}'.encode('utf-8')).hexdigest()
+    key = f'blog:resp:{name}:{get_generation(scope, request)}:{digest}'
+    return get_or_compute(key, compute, _timeout(), metric_name=name)
+
+
+def get_or_compute(key, compute, timeout, metric_name='response'):
+    """
+    Cache-aside with stampede protection. Entries are stored as (fresh_until, value).
+    Lookups are counted in blog_cache_requests_total{cache=metric_name}.
+    """
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and entry[0] > now:
+        metrics.count_cache(metric_name, 'hit')
+        return entry[1]
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        metrics.count_cache(metric_name, 'miss')
+        try:
+            value = compute()
+            # Keep expired entries around a while longer so they can be served during recomputation.
+            cache.set(key, (time.time() + timeout, value), timeout * 2)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        # Someone else is recomputing: serve the expired copy.
+        metrics.count_cache(metric_name, 'stale')
+        return entry[1]
+
+    deadline = now + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.count_cache(metric_name, 'hit')
+            return entry[1]
+    logger.warning("Response cache: gave up waiting for %s, computing it", key)
+    metrics.count_cache(metric_name, 'miss')
+    return compute()
@@ -0,0 +1,70 @@
+"""
+Per-category counts of publicly visible recipes (published and not flagged),
+kept in the RecipeCategoryCount table so the homepage doesn't aggregate the
+recipes table on every visit.
+
+Counts are adjusted incrementally when a recipe is created, published or
+unpublished, hidden or unhidden, changes category, is deleted (signal handlers
+in blog.signals) or gets hidden by reports (RecipeReportView). `rebuild()` recomputes them
+from scratch (see the rebuild_category_counts command).
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from .models import Recipe, RecipeCategoryCount
+
+
+def is_visible(is_published, is_hidden):
+    """Whether a recipe appears in the public listing and therefore in the counts."""
+    return is_published and not is_hidden
+
+
+def counted_category(recipe):
+    """Category under which `recipe` is counted, or None if it isn't publicly visible."""
+    if is_visible(recipe.is_published, recipe.is_hidden):
+        return recipe.category
+    return None
+
+
+def adjust(category, delta):
+    """Add `delta` to the count of `category` (creating its row if needed)."""
+    if not category or not delta:
+        return
+    updated = RecipeCategoryCount.objects.filter(category=category).update(count=F('count') + delta)
+    if not updated:
+        RecipeCategoryCount.objects.get_or_create(category=category)
+        RecipeCategoryCount.objects.filter(category=category).update(count=F('count') + delta)
+
+
+def move(old_category, new_category):
+    """Apply a visibility/category transition (either side may be None for 'not counted')."""
+    if old_category == new_category:
+        return
+    adjust(old_category, -1)
+    adjust(new_category, 1)
+
+
+def get_counts():
+    """Mapping category -> count of the non-empty categories, in one primary-key scan."""
+    return dict(RecipeCategoryCount.objects.filter(count__gt=0).values_list('category', 'count'))
+
+
+def rebuild():
+    """Recompute every count from the recipes table."""
+    rows = (
+        Recipe.objects.filter(is_published=True, is_hidden=False)
+        .order_by()
+        .values('category')
+        .annotate(count=Count('id'))
+        .values_list('category', 'count')
+    )
+    counts = dict(rows)
+    categories = {choice for choice, _ in Recipe.CATEGORY_CHOICES} | set(counts)
+    with transaction.atomic():
+        RecipeCategoryCount.objects.exclude(category__in=categories).delete()
+        RecipeCategoryCount.objects.bulk_create(
+            [RecipeCategoryCount(category=category, count=counts.get(category, 0)) for category in categories],
+            update_conflicts=True,
+            unique_fields=['category'],
+            update_fields=['count'],
+        )
+    return counts
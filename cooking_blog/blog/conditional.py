@@ -0,0 +1,101 @@
+"""
+Conditional GET (ETag / Last-Modified / 304) for the public read endpoints.
+
+Each view derives its validators from a cheap lookup instead of the response
+body: `updated_at` and the like counter of a single object, or the response
+cache generation of a collection (see blog.cache). When the client already
+holds the current representation the view answers 304 before running the
+queryset and serializer.
+
+Single objects get an ETag only: their representation also depends on likes,
+the author and the request variant, which a Last-Modified taken from
+`updated_at` would miss. Collections send both, the generation being bumped
+by every change. Collection validators must only come from state every
+process sees: the generations are read from the database (ContentGeneration),
+never from a per-process cache, or a worker that missed a write made by
+another worker or a management command would keep answering 304 for a
+changed listing.
+
+The ETags are strong: the same validators always produce the same bytes for a
+given renderer, user and set of query parameters, and all of those are part of
+the tag.
+"""
+import hashlib
+from datetime import datetime, timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from . import cache
+
+
+def make_etag(*parts):
+    """Strong ETag (quoted) from the values that determine a representation."""
+    digest = hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def generation_to_datetime(generation):
+    """Response cache generations are time.time_ns() values: use them as Last-Modified."""
+    return datetime.fromtimestamp(generation / 1e9, tz=timezone.utc)
+
+
+def request_variant(request):
+    """Parts of the request, besides the content, that change the response body."""
+    renderer = getattr(request, 'accepted_renderer', None)
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else ''
+    return (getattr(renderer, 'format', ''), user_id)
+
+
+def collection_validators(request, scope, allowed_params):
+    """(etag, last_modified) of a listing: the scope's shared generation plus the parameters that shape the page."""
+    generation = cache.get_generation(scope, request)
+    etag = make_etag(
+        scope, generation, cache.normalize_params(request.query_params, allowed_params), *request_variant(request)
+    )
+    return etag, generation_to_datetime(generation)
+
+
+def not_modified_response(request, etag, last_modified):
+    """The 304 (or 412) response for `request` if its preconditions hold, else None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if response is not None:
+        set_validator_headers(response, etag, last_modified)
+    return response
+
+
+def set_validator_headers(response, etag, last_modified):
+    if etag and not response.has_header('ETag'):
+        response['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Validators depend on the negotiated format and on the authenticated user
+    patch_vary_headers(response, ('Accept', 'Authorization'))
+
+
+class ConditionalGetMixin:
+    """
+    Emit ETag / Last-Modified on GET and answer matching If-None-Match /
+    If-Modified-Since with 304 before any queryset or serializer work.
+
+    Views implement get_validators() returning (etag, last_modified) from a cheap
+    lookup (last_modified may be None: ETag only), or None to skip conditional
+    handling (e.g. the object does not exist).
+    """
+
+    def get_validators(self, request):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators(request)
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+        etag, last_modified = validators
+        response = not_modified_response(request, etag, last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code == 200:
+                set_validator_headers(response, etag, last_modified)
+        return response
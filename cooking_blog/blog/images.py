@@ -0,0 +1,331 @@
+"""
+Resized variants of uploaded images (Recipe.image, StoryPost.image).
+
+Every upload is re-encoded at a fixed set of widths (VARIANT_WIDTHS, never
+upscaled) as WebP plus a JPEG fallback, with the EXIF orientation applied
+and the metadata stripped. Files go next to the original:
+`recipes/variants/<file name>/640.webp`.
+
+Encoding is CPU-heavy, so it runs in a small process pool
+(IMAGE_VARIANT_WORKERS) once the upload's transaction commits; the request
+that saved the image doesn't wait for it. The result is stored in the
+model's `image_variants` field and turned into a srcset map by
+`variant_srcset()`; until then (or if encoding failed) serializers expose
+the original only. Existing images are backfilled with the
+generate_image_variants command.
+
+serve_media also resizes any image on demand (`?w=480&fmt=webp`, widths
+limited to IMAGE_RESIZE_WIDTHS): see resized_image().
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import posixpath
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from . import cache, metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1280)
+# format: (file extension, Pillow format, encoder options)
+FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# On-demand resizes are cached under MEDIA_ROOT/<RESIZE_CACHE_DIR>
+RESIZE_CACHE_DIR = 'resized'
+RESIZABLE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+# Cache hits refresh a file's mtime (the LRU clock) at most this often, in seconds
+TOUCH_INTERVAL = 3600
+# Renders of different keys may share a lock file; a fixed set avoids piling up one file per key.
+LOCK_STRIPES = 64
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(name, width, fmt):
+    """Storage name of one variant of the image stored as `name`."""
+    directory, filename = posixpath.split(name)
+    # The full file name (extension included) keeps foto.jpg and foto.png apart.
+    return posixpath.join(directory, 'variants', filename, f'{width}.{FORMATS[fmt][0]}')
+
+
+def render_variants(media_root, name, widths=VARIANT_WIDTHS):
+    """
+    Write the variants of MEDIA_ROOT/`name` and return the manifest stored in `image_variants`:
+    {'source': name, 'variants': [{'width', 'height', 'webp', 'jpeg'}, ...]} (storage names).
+    Needs only the file system, so it runs in pool workers without a Django setup.
+    """
+    image, icc_profile = _open(os.path.join(media_root, name), max(widths))
+    variants = []
+    for width in sorted({min(width, image.width) for width in widths}):
+        resized = _resize(image, width)
+        entry = {'width': resized.width, 'height': resized.height}
+        for fmt in FORMATS:
+            entry[fmt] = variant_name(name, width, fmt)
+            _save(resized, os.path.join(media_root, entry[fmt]), fmt, icc_profile)
+        variants.append(entry)
+    return {'source': name, 'variants': variants}
+
+
+def _open(path, max_width):
+    """Decode an image with its EXIF orientation applied and its metadata dropped: (image, ICC profile)."""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as original:
+        # JPEGs are decoded at a reduced scale when they are much larger than the biggest output.
+        original.draft('RGB', (max_width, max_width))
+        image = ImageOps.exif_transpose(original)
+    icc_profile = image.info.get('icc_profile')
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.info = {}  # drop EXIF, XMP and comments
+    return image, icc_profile
+
+
+def _resize(image, width):
+    from PIL import Image
+
+    if width >= image.width:
+        return image
+    return image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+
+
+def _save(image, path, fmt, icc_profile):
+    """Encode to a temporary file and move it in place, so readers never see a partial file."""
+    from PIL import Image
+
+    _, pil_format, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        flattened = Image.new('RGB', image.size, (255, 255, 255))
+        flattened.paste(image, mask=image.getchannel('A'))
+        image = flattened
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, pil_format, icc_profile=icc_profile, **options)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def variant_srcset(instance, request=None):
+    """
+    srcset map of an instance's current image:
+    {'webp': 'url 320w, url 640w', 'jpeg': '...', 'variants': [{'width', 'height', 'webp', 'jpeg'}]}
+    (absolute URLs when a request is given). None until the variants of the current image exist.
+    """
+    manifest = instance.image_variants or {}
+    if not instance.image or manifest.get('source') != instance.image.name:
+        return None
+
+    def url(name):
+        location = instance.image.storage.url(name)
+        return request.build_absolute_uri(location) if request is not None else location
+
+    variants = [
+        {'width': entry['width'], 'height': entry['height'], **{fmt: url(entry[fmt]) for fmt in FORMATS}}
+        for entry in manifest['variants']
+    ]
+    srcset = {fmt: ', '.join(f"{entry[fmt]} {entry['width']}w" for entry in variants) for fmt in FORMATS}
+    return {**srcset, 'variants': variants}
+
+
+# Scheduling
+
+def needs_variants(instance):
+    """True if the instance has an image whose variants haven't been generated."""
+    return bool(instance.image) and (instance.image_variants or {}).get('source') != instance.image.name
+
+
+def schedule_variants(instance, using=DEFAULT_DB_ALIAS):
+    """Generate the variants of the instance's image in the pool once the current transaction commits."""
+    if not settings.IMAGE_VARIANT_WORKERS or not needs_variants(instance):
+        return
+    transaction.on_commit(
+        partial(_submit, type(instance), instance.pk, instance.image.name, using), using=using, robust=True,
+    )
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned, not forked: the workers must not inherit the web process's DB connections and threads.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _submit(model, pk, name, using):
+    global _executor
+    try:
+        future = _get_executor().submit(render_variants, str(settings.MEDIA_ROOT), name)
+    except Exception:
+        # E.g. a worker died (killed for memory) and broke the pool: start a new one next time.
+        with _executor_lock:
+            _executor = None
+        logger.exception("Image variants: could not schedule %s", name)
+        return
+    future.add_done_callback(partial(_store, model, pk, name, using))
+
+
+def _store(model, pk, name, using, future):
+    """Save a finished manifest (runs in the pool's result thread)."""
+    try:
+        manifest = future.result()
+    except Exception:
+        logger.exception("Image variants: could not process %s", name)
+        return
+    try:
+        # Ignored if the image was replaced in the meantime; its own job stores the newer manifest.
+        updated = model.objects.using(using).filter(pk=pk, image=name).update(image_variants=manifest)
+        if updated:
+            cache.bump_generation(cache.RECIPES if model._meta.model_name == 'recipe' else cache.STORIES)
+    finally:
+        connections.close_all()  # this thread's connection only
+
+
+def _run_in_pool(function, *args):
+    """Run `function` in the pool and wait for it (in this process when the pool is disabled or broken)."""
+    global _executor
+    if settings.IMAGE_VARIANT_WORKERS:
+        try:
+            return _get_executor().submit(function, *args).result()
+        except BrokenProcessPool:
+            with _executor_lock:
+                _executor = None
+            logger.error("Image variants: pool broken, running %s in process", function.__name__)
+    return function(*args)
+
+
+# On-demand resizing
+
+def resized_image(name, width, fmt):
+    """
+    Path of MEDIA_ROOT/`name` resized to `width` and encoded as `fmt`, rendered once and then served
+    from the disk cache. Raises ValueError for a width outside IMAGE_RESIZE_WIDTHS, an unknown format
+    or a file that isn't an image. Concurrent renders of one key are serialized only where fcntl exists.
+    """
+    if width not in settings.IMAGE_RESIZE_WIDTHS:
+        raise ValueError(f"w must be one of {', '.join(map(str, settings.IMAGE_RESIZE_WIDTHS))}")
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {', '.join(FORMATS)}")
+    if posixpath.splitext(name)[1].lower() not in RESIZABLE_EXTENSIONS or name.startswith(f'{RESIZE_CACHE_DIR}/'):
+        raise ValueError("Not a resizable image")
+
+    media_root = Path(settings.MEDIA_ROOT)
+    source = media_root / name
+    stat = source.stat()
+    # A file replaced under the same name gets new cache entries.
+    key = hashlib.sha1(f'{name}\0{stat.st_mtime_ns}\0{stat.st_size}\0{width}\0{fmt}'.encode()).hexdigest()
+    cache_dir = media_root / RESIZE_CACHE_DIR
+    path = cache_dir / key[:2] / f'{key}.{FORMATS[fmt][0]}'
+    if _touch(path):
+        metrics.count_cache('image_resize', 'hit')
+        return path
+    with _key_lock(cache_dir, key):
+        # Concurrent requests for the same key wait here; only the first one renders.
+        if _touch(path):
+            metrics.count_cache('image_resize', 'hit')
+        else:
+            metrics.count_cache('image_resize', 'miss')
+            _run_in_pool(render_resized, str(source), str(path), width, fmt)
+            _evict(cache_dir, settings.IMAGE_RESIZE_CACHE_MAX_BYTES)
+    return path
+
+
+def render_resized(source, path, width, fmt):
+    """Write `source` resized to `width` (never upscaled) as `fmt` to `path`."""
+    image, icc_profile = _open(source, width)
+    _save(_resize(image, width), path, fmt, icc_profile)
+
+
+def _touch(path):
+    """True if `path` is cached; marks it as recently used for the LRU eviction."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    if time.time() - mtime > TOUCH_INTERVAL:
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # evicted meanwhile
+            return False
+    return True
+
+
+@contextmanager
+def _key_lock(cache_dir, key):
+    """Exclusive lock for one cache key, across threads and processes."""
+    lock_dir = cache_dir / 'locks'
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / f'{int(key[:8], 16) % LOCK_STRIPES}.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _evict(cache_dir, max_bytes):
+    """Delete the least recently used files until the cache is back under 90% of `max_bytes`."""
+    with open(cache_dir / 'locks' / 'evict.lock', 'a') as lock_file:
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return  # another process is already evicting
+        entries = []
+        total = 0
+        for bucket in os.scandir(cache_dir):
+            if not bucket.is_dir() or bucket.name == 'locks':
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= max_bytes:
+            return
+        entries.sort()
+        target = max_bytes * 0.9
+        removed = 0
+        for _, size, entry_path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(entry_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        logger.info("Resized image cache: evicted %d files, %d bytes left", removed, total)
@@ -0,0 +1,335 @@
+"""
+Write-behind buffering of like events (optional, LIKE_WRITE_BEHIND = True).
+
+When a recipe goes viral every like contends on the same blog_recipe row. In
+write-behind mode the like endpoints don't write to the database at all:
+
+- each like/unlike that changes the user's state is appended as one JSON line
+  to an append-only log file (LIKE_BUFFER_PATH, fsync'ed by default), and the
+  pending state and the recipe's pending counter delta are kept in the cache;
+- the endpoint answers at once with an optimistic count (stored counter plus
+  pending delta), at the cost of a single read query;
+- `flush()` rotates the log, coalesces the events per (user, recipe) (last
+  one wins), applies them with batched inserts/deletes and recomputes the
+  affected counters from the like rows, so the stored counts are exact.
+
+flush() runs in a daemon thread of the web process (started on the first
+buffered like, every LIKE_BUFFER_FLUSH_INTERVAL seconds) or from the
+flush_like_buffer command. A separate flusher process needs a shared cache
+(REDIS_URL) so that the web workers see their pending deltas drained.
+
+The log survives crashes: rotated files that were not fully applied are
+picked up again by the next flush, and applying them twice is harmless.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import reduce
+from operator import or_
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from . import cache, metrics
+from .models import User, Recipe, RecipeLike
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'blog:likebuf:stats'
+BATCH_SIZE = 500
+
+_flusher_lock = threading.Lock()
+_flusher_thread = None
+
+
+def is_enabled():
+    return getattr(settings, 'LIKE_WRITE_BEHIND', False)
+
+
+def buffer_path():
+    return Path(settings.LIKE_BUFFER_PATH)
+
+
+def _state_key(user_id, recipe_id):
+    return f'blog:likebuf:state:{user_id}:{recipe_id}'
+
+
+def _delta_key(recipe_id):
+    return f'blog:likebuf:delta:{recipe_id}'
+
+
+def _add_to_delta(recipe_id, delta):
+    """Atomically add delta to the recipe's pending counter delta and return the new value."""
+    key = _delta_key(recipe_id)
+    while True:
+        django_cache.add(key, 0, None)
+        try:
+            return django_cache.incr(key, delta)
+        except ValueError:  # evicted between add() and incr(): create it again
+            continue
+
+
+@contextmanager
+def _locked(fd, mode):
+    if fcntl is not None:
+        fcntl.flock(fd, mode)
+    try:
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _append(event):
+    """Append one event line. Writers hold a shared lock; flush() takes it exclusively after rotating."""
+    path = buffer_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(event, separators=(',', ':')) + '\n').encode('utf-8')
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            with _locked(fd, fcntl.LOCK_SH if fcntl else None):
+                # The file may have been rotated between open() and the lock: write to the new one.
+                try:
+                    current = os.stat(path).st_ino
+                except FileNotFoundError:
+                    current = None
+                if current != os.fstat(fd).st_ino:
+                    continue
+                os.write(fd, line)
+                if getattr(settings, 'LIKE_BUFFER_FSYNC', True):
+                    os.fsync(fd)
+                return
+        finally:
+            os.close(fd)
+
+
+def record(user, recipe_id, liked=None):
+    """
+    Buffer a like (liked=True), an unlike (False) or a toggle (None) and return
+    (liked, optimistic likes_count). Raises Http404 if the recipe doesn't exist.
+    """
+    row = (
+        Recipe.objects.filter(pk=recipe_id)
+        .annotate(is_liked=Exists(RecipeLike.objects.filter(recipe=OuterRef('pk'), user=user)))
+        .values_list('likes_count', 'is_liked')
+        .first()
+    )
+    if row is None:
+        raise Http404('Ricetta non trovata.')
+    stored_count, stored_liked = row
+
+    pending = django_cache.get(_state_key(user.pk, recipe_id))
+    current = pending[1] if pending is not None else stored_liked
+    target = (not current) if liked is None else liked
+    if target != current:
+        delta = 1 if target else -1
+        event_id = uuid.uuid4().hex
+        _append({'id': event_id, 'u': user.pk, 'r': recipe_id, 'l': int(target), 'd': delta, 't': time.time()})
+        django_cache.set(_state_key(user.pk, recipe_id), (event_id, target), None)
+        pending_delta = _add_to_delta(recipe_id, delta)
+        metrics.LIKES.labels('like' if target else 'unlike').inc()
+        ensure_flusher()
+    else:
+        pending_delta = django_cache.get(_delta_key(recipe_id)) or 0
+    return target, max(0, stored_count + pending_delta)
+
+
+def overlay_states(user, states):
+    """Apply pending (not yet flushed) likes to like_states() output, in place."""
+    if not states:
+        return states
+    deltas = django_cache.get_many([_delta_key(recipe_id) for recipe_id in states])
+    pending = {}
+    if user.is_authenticated:
+        pending = django_cache.get_many([_state_key(user.pk, recipe_id) for recipe_id in states])
+    for recipe_id, state in states.items():
+        state['likes_count'] = max(0, state['likes_count'] + (deltas.get(_delta_key(recipe_id)) or 0))
+        user_pending = pending.get(_state_key(user.pk, recipe_id)) if pending else None
+        if user_pending is not None:
+            state['liked'] = user_pending[1]
+    return states
+
+
+# Flushing
+
+def _pending_files(path):
+    return sorted(path.parent.glob(f'{path.name}.flushing-*'))
+
+
+def _read_events(files):
+    events = []
+    for file in files:
+        with open(file, 'rb') as handle:
+            # Wait for writers that opened the file before it was rotated.
+            with _locked(handle.fileno(), fcntl.LOCK_EX if fcntl else None):
+                data = handle.read()
+        for line in data.splitlines():
+            try:
+                event = json.loads(line)
+                events.append((event['id'], int(event['u']), int(event['r']), bool(event['l']), int(event['d'])))
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Like buffer: skipping malformed line in %s: %r", file, line[:200])
+    return events
+
+
+def _apply(final):
+    """Write the coalesced states {(user_id, recipe_id): liked} and fix the affected counters."""
+    user_ids = {user_id for user_id, _ in final}
+    recipe_ids = {recipe_id for _, recipe_id in final}
+    # Users and recipes deleted since the event was buffered are skipped.
+    live_users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    live_recipes = set(Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True))
+    final = {pair: liked for pair, liked in final.items() if pair[0] in live_users and pair[1] in live_recipes}
+    if not final:
+        return 0
+    existing = set(
+        RecipeLike.objects.filter(user_id__in=live_users, recipe_id__in=live_recipes).values_list('user_id', 'recipe_id')
+    )
+    to_insert = [pair for pair, liked in final.items() if liked and pair not in existing]
+    to_delete = [pair for pair, liked in final.items() if not liked and pair in existing]
+
+    RecipeLike.objects.bulk_create(
+        [RecipeLike(user_id=user_id, recipe_id=recipe_id) for user_id, recipe_id in to_insert],
+        batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+    for start in range(0, len(to_delete), BATCH_SIZE):
+        batch = to_delete[start:start + BATCH_SIZE]
+        RecipeLike.objects.filter(reduce(or_, (Q(user_id=u, recipe_id=r) for u, r in batch))).delete()
+
+    changed_recipes = {recipe_id for _, recipe_id in to_insert + to_delete}
+    if changed_recipes:
+        like_counts = (
+            RecipeLike.objects.filter(recipe=OuterRef('pk')).order_by()
+            .values('recipe').annotate(c=Count('pk')).values('c')
+        )
+        Recipe.objects.filter(pk__in=changed_recipes).update(likes_count=Coalesce(Subquery(like_counts), Value(0)))
+        cache.bump_generation(cache.RECIPES)
+    return len(to_insert) + len(to_delete)
+
+
+def flush():
+    """Apply every buffered event to the database. Returns the number of events processed."""
+    path = buffer_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+    lock_fd = os.open(path.with_name(path.name + '.lock'), os.O_WRONLY | os.O_CREAT, 0o640)
+    try:
+        # One flusher at a time (thread and command may both run)
+        with _locked(lock_fd, fcntl.LOCK_EX if fcntl else None):
+            if path.exists():
+                os.replace(path, path.with_name(f'{path.name}.flushing-{time.time_ns()}'))
+            files = _pending_files(path)
+            events = _read_events(files)
+
+            final = {}
+            deltas = {}
+            last_event = {}
+            for event_id, user_id, recipe_id, liked, delta in events:
+                final[(user_id, recipe_id)] = liked
+                last_event[(user_id, recipe_id)] = event_id
+                deltas[recipe_id] = deltas.get(recipe_id, 0) + delta
+
+            written = 0
+            if final:
+                with transaction.atomic():
+                    written = _apply(final)
+
+            # The flushed events are now in the stored counters: drop them from the optimistic state.
+            for recipe_id, delta in deltas.items():
+                if delta:
+                    _add_to_delta(recipe_id, -delta)
+            for (user_id, recipe_id), event_id in last_event.items():
+                key = _state_key(user_id, recipe_id)
+                pending = django_cache.get(key)
+                if pending is not None and pending[0] == event_id:
+                    django_cache.delete(key)
+            for file in files:
+                file.unlink(missing_ok=True)
+    finally:
+        os.close(lock_fd)
+
+    elapsed = time.monotonic() - started
+    if events:
+        stats = django_cache.get(STATS_KEY) or {'flushes': 0, 'events': 0}
+        stats.update({
+            'flushes': stats['flushes'] + 1,
+            'events': stats['events'] + len(events),
+            'last_flush_at': time.time(),
+            'last_flush_seconds': elapsed,
+            'last_flush_events': len(events),
+            'last_flush_writes': written,
+        })
+        django_cache.set(STATS_KEY, stats, None)
+        logger.info("Like buffer: flushed %d events (%d writes) in %.3fs", len(events), written, elapsed)
+    return len(events)
+
+
+def buffer_stats():
+    """Buffer depth (events not yet applied, oldest first) and flush latency figures."""
+    path = buffer_path()
+    depth = 0
+    oldest = None
+    for file in _pending_files(path) + [path]:
+        try:
+            with open(file, 'rb') as handle:
+                lines = handle.read().splitlines()
+        except FileNotFoundError:
+            continue
+        depth += len(lines)
+        if lines and oldest is None:
+            try:
+                oldest = json.loads(lines[0])['t']
+            except (ValueError, KeyError):
+                pass
+    stats = {
+        'depth': depth,
+        'oldest_event_age_seconds': time.time() - oldest if oldest is not None else None,
+        'flushes': 0,
+        'events': 0,
+        'last_flush_at': None,
+        'last_flush_seconds': None,
+        'last_flush_events': None,
+        'last_flush_writes': None,
+    }
+    stats.update(django_cache.get(STATS_KEY) or {})
+    return stats
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Like buffer: flush failed, will retry")
+        finally:
+            close_old_connections()
+
+
+def ensure_flusher():
+    """Start the in-process flusher thread (once per process) unless disabled."""
+    global _flusher_thread
+    if not getattr(settings, 'LIKE_BUFFER_FLUSH_IN_PROCESS', True):
+        return
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            interval = getattr(settings, 'LIKE_BUFFER_FLUSH_INTERVAL', 2.0)
+            _flusher_thread = threading.Thread(
+                target=_flush_loop, args=(interval,), name='like-buffer-flusher', daemon=True
+            )
+            _flusher_thread.start()
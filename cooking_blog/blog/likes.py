@@ -0,0 +1,139 @@
+"""
+Like state changes in a constant number of statements.
+
+Each change is one `INSERT ... ON CONFLICT DO NOTHING` (or one `DELETE`) of
+the RecipeLike row, followed, only if a row was actually inserted or
+deleted, by `UPDATE blog_recipe SET likes_count = likes_count ± 1 ...
+RETURNING likes_count`, which both keeps the denormalized counter exact and
+returns the new count. Repeating a like or an unlike is a no-op, so double
+taps and retries can't drift the counter.
+
+Raw SQL because the ORM can't report whether an ignored-conflict insert
+happened nor return values from an UPDATE; it is valid on PostgreSQL and on
+SQLite >= 3.35, the backends the project runs on. Raw writes send no
+signals, so the response cache generation is bumped here.
+
+With LIKE_WRITE_BEHIND enabled the changes are buffered instead and applied
+in batches (see blog.like_buffer).
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import Http404
+from django.utils import timezone
+from . import cache, like_buffer, metrics
+from .models import Recipe, RecipeLike
+
+# Upper bound on the ids accepted by the batch like-state endpoint
+MAX_BATCH_IDS = 100
+
+
+def _names(connection):
+    quote = connection.ops.quote_name
+    like_fields = {name: RecipeLike._meta.get_field(name).column for name in ('user', 'recipe', 'created_at')}
+    return {
+        'like_table': quote(RecipeLike._meta.db_table),
+        'user_col': quote(like_fields['user']),
+        'recipe_col': quote(like_fields['recipe']),
+        'created_col': quote(like_fields['created_at']),
+        'recipe_table': quote(Recipe._meta.db_table),
+        'recipe_pk': quote(Recipe._meta.pk.column),
+        'likes_col': quote(Recipe._meta.get_field('likes_count').column),
+    }
+
+
+def _insert_like(cursor, names, connection, user_id, recipe_id):
+    cursor.execute(
+        'INSERT INTO {like_table} ({user_col}, {recipe_col}, {created_col}) VALUES (%s, %s, %s) '
+        'ON CONFLICT ({user_col}, {recipe_col}) DO NOTHING'.format(**names),
+        [user_id, recipe_id, connection.ops.adapt_datetimefield_value(timezone.now())],
+    )
+    return cursor.rowcount == 1
+
+
+def _delete_like(cursor, names, user_id, recipe_id):
+    cursor.execute(
+        'DELETE FROM {like_table} WHERE {user_col} = %s AND {recipe_col} = %s'.format(**names),
+        [user_id, recipe_id],
+    )
+    return cursor.rowcount == 1
+
+
+def _bump_counter(cursor, names, recipe_id, delta):
+    """Apply `delta` to likes_count and return the new value (None if the recipe doesn't exist)."""
+    if delta:
+        cursor.execute(
+            'UPDATE {recipe_table} SET {likes_col} = {likes_col} + %s WHERE {recipe_pk} = %s '
+            'RETURNING {likes_col}'.format(**names),
+            [delta, recipe_id],
+        )
+    else:
+        cursor.execute(
+            'SELECT {likes_col} FROM {recipe_table} WHERE {recipe_pk} = %s'.format(**names),
+            [recipe_id],
+        )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_like(user, recipe_id, liked, using=DEFAULT_DB_ALIAS):
+    """
+    Make `user`'s like on `recipe_id` match `liked` (idempotent).
+    Returns the new likes_count; raises Http404 if the recipe doesn't exist.
+    """
+    if like_buffer.is_enabled():
+        return like_buffer.record(user, recipe_id, liked)[1]
+    connection = connections[using]
+    names = _names(connection)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if liked:
+            changed = _insert_like(cursor, names, connection, user.pk, recipe_id)
+        else:
+            changed = _delete_like(cursor, names, user.pk, recipe_id)
+        likes_count = _bump_counter(cursor, names, recipe_id, (1 if liked else -1) if changed else 0)
+        if likes_count is None:
+            # Also rolls back the like row, whose foreign key is only checked at commit on PostgreSQL.
+            raise Http404('Ricetta non trovata.')
+        if changed:
+            cache.bump_generation(cache.RECIPES)
+            transaction.on_commit(metrics.LIKES.labels('like' if liked else 'unlike').inc, using=using)
+    return likes_count
+
+
+def toggle_like(user, recipe_id, using=DEFAULT_DB_ALIAS):
+    """Remove `user`'s like if present, add it otherwise. Returns (liked, likes_count)."""
+    if like_buffer.is_enabled():
+        return like_buffer.record(user, recipe_id)
+    connection = connections[using]
+    names = _names(connection)
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if _delete_like(cursor, names, user.pk, recipe_id):
+            liked, delta = False, -1
+        else:
+            liked = True
+            delta = 1 if _insert_like(cursor, names, connection, user.pk, recipe_id) else 0
+        likes_count = _bump_counter(cursor, names, recipe_id, delta)
+        if likes_count is None:
+            raise Http404('Ricetta non trovata.')
+        if delta:
+            cache.bump_generation(cache.RECIPES)
+            transaction.on_commit(metrics.LIKES.labels('like' if liked else 'unlike').inc, using=using)
+    return liked, likes_count
+
+
+def like_states(user, recipe_ids):
+    """{recipe_id: {'liked': bool, 'likes_count': int}} for the visible recipes among `recipe_ids`, in two queries."""
+    counts = dict(
+        Recipe.objects.filter(pk__in=recipe_ids, is_published=True, is_hidden=False)
+        .values_list('pk', 'likes_count')
+    )
+    liked = set()
+    if counts and user.is_authenticated:
+        liked = set(
+            RecipeLike.objects.filter(user=user, recipe_id__in=counts).values_list('recipe_id', flat=True)
+        )
+    states = {
+        recipe_id: {'liked': recipe_id in liked, 'likes_count': likes_count}
+        for recipe_id, likes_count in counts.items()
+    }
+    if like_buffer.is_enabled():
+        like_buffer.overlay_states(user, states)
+    return states
@@ -0,0 +1,84 @@
+"""
+Management command to fill in missing recipe slugs and, optionally, normalize
+malformed ones (uppercase, accents, spaces, over-long).
+Run with: python manage.py backfill_recipe_slugs [--normalize] [--batch-size 500] [--dry-run]
+
+Slugs are allocated in memory against the set of existing slugs (loaded once)
+and written with batched bulk updates. Normalizing changes public URLs, so it
+is opt-in.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from blog import cache
+from blog.models import Recipe
+from blog.slugs import next_free_slug, slug_base
+
+
+class Command(BaseCommand):
+    help = 'Backfill empty recipe slugs (and normalize malformed ones with --normalize) in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--normalize',
+            action='store_true',
+            help='Also rewrite existing slugs that are not in normalized form (changes their URLs)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of recipes to update per batch (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the new slugs without writing them',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+        normalize = options['normalize']
+
+        taken = set(Recipe.objects.exclude(Q(slug='') | Q(slug__isnull=True)).values_list('slug', flat=True))
+        changed = 0
+        last_pk = 0
+
+        while True:
+            batch = list(
+                Recipe.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'title', 'slug')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            updates = []
+            for pk, title, slug in batch:
+                if slug and (not normalize or slug == slug_base(slug)):
+                    continue
+                if slug:
+                    # Release the malformed slug so its normalized form may reuse it.
+                    taken.discard(slug)
+                new_slug = next_free_slug(slug_base(slug or title), taken)
+                taken.add(new_slug)
+                if new_slug == slug:
+                    continue
+                self.stdout.write(f'Recipe {pk}: {slug or "(empty)"} -> {new_slug}')
+                updates.append(Recipe(pk=pk, slug=new_slug, updated_at=timezone.now()))
+
+            if updates and not dry_run:
+                with transaction.atomic():
+                    Recipe.objects.bulk_update(updates, ['slug', 'updated_at'])
+            changed += len(updates)
+
+        if changed and not dry_run:
+            # bulk_update sends no signals: drop cached listings and sitemaps that embed the old slugs.
+            cache.bump_generation(cache.RECIPES)
+            cache.bump_generation(cache.SITEMAP)
+
+        verb = 'Would update' if dry_run else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {changed} recipe slugs.'))
@@ -0,0 +1,124 @@
+"""
+Benchmark every API route (blog/urls.py) through the WSGI handler, in process.
+Run with: python manage.py benchmark_endpoints [--requests 200] [--concurrency 4] [--output results.json] [--compare baseline.json]
+
+Seed the data first with seed_benchmark_data, on a scratch database: the
+write scenarios register users, create recipes, like and report. Each
+scenario is measured one request at a time (with peak memory) and then from
+--concurrency client threads. The JSON output (--output) holds the git
+commit, the dataset size and per-scenario p50/p95/p99 latency, requests/s,
+queries and SQL time per request; --compare prints the change against an
+earlier output.
+"""
+import json
+import platform
+import subprocess
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from blog import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measure latency percentiles, throughput, SQL queries and memory of every API endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario and mode (default: 200)')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per scenario first (default: 10)')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Client threads for the concurrent run; 1 skips it (default: 4)',
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=[scenario.name for scenario in benchmark.SCENARIOS],
+            help='Only run this scenario (repeatable; default: all)',
+        )
+        parser.add_argument('--read-only', action='store_true', help='Skip the scenarios that write data')
+        parser.add_argument('--host', default='localhost', help='Host header to send (must be in ALLOWED_HOSTS)')
+        parser.add_argument('--secure', action='store_true', help='Send requests as HTTPS (production settings)')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Earlier JSON output to compare the results with')
+
+    def handle(self, *args, **options):
+        scenarios = [
+            scenario for scenario in benchmark.SCENARIOS
+            if (not options['scenario'] or scenario.name in options['scenario'])
+            and not (options['read_only'] and scenario.writes)
+        ]
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+
+        self.stdout.write(f"{'scenario':<24} {'mode':<10} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'queries':>8} {'peak KiB':>9}")
+        try:
+            results = benchmark.run(
+                scenarios,
+                requests=max(1, options['requests']),
+                warmup=max(0, options['warmup']),
+                concurrency=max(1, options['concurrency']),
+                host=options['host'],
+                secure=options['secure'],
+                progress=lambda name, result: self.print_result(name, result, baseline),
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            report = {'meta': self.metadata(options), 'results': results}
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+        errors = sum(mode['errors'] for result in results.values() for mode in result.values() if isinstance(mode, dict))
+        style = self.style.SUCCESS if not errors else self.style.ERROR
+        self.stdout.write(style(f'Benchmarked {len(results)} scenarios ({errors} server errors).'))
+
+    def print_result(self, name, result, baseline):
+        for mode in ('sequential', 'concurrent'):
+            if mode not in result:
+                continue
+            row = result[mode]
+            self.stdout.write(
+                f"{name:<24} {mode:<10} {row['p50_ms']:>7.1f}ms {row['p95_ms']:>6.1f}ms {row['p99_ms']:>6.1f}ms "
+                f"{row['requests_per_s']:>8} {row['queries']:>8} {row.get('peak_memory_kib', ''):>9}"
+            )
+            before = (baseline or {}).get(name, {}).get(mode)
+            if before:
+                self.stdout.write(
+                    f"{'':<24} {'vs base':<10} {self.change(before['p50_ms'], row['p50_ms']):>9} "
+                    f"{self.change(before['p95_ms'], row['p95_ms']):>8} {self.change(before['p99_ms'], row['p99_ms']):>8} "
+                    f"{self.change(before['requests_per_s'], row['requests_per_s']):>8} "
+                    f"{row['queries'] - before['queries']:>+8.2f}"
+                )
+            if row['errors']:
+                self.stdout.write(self.style.ERROR(f"{'':<24} status codes: {row['status']}"))
+
+    @staticmethod
+    def change(before, after):
+        if not before or after is None:
+            return 'n/a'
+        return f'{(after - before) / before * 100:+.0f}%'
+
+    @staticmethod
+    def metadata(options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': benchmark.dataset_counts(),
+            'options': {key: options[key] for key in ('requests', 'warmup', 'concurrency', 'scenario', 'read_only')},
+        }
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark of the moderation engine (blog/content_moderation.py).
+Run with: python manage.py benchmark_moderation [--iterations 2000] [--max-size 200000]
+
+Times a realistic recipe payload through moderate_fields() and single texts
+through find_match(), then feeds punctuation-heavy pathological inputs of
+growing size to show that the run time grows linearly.
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from blog.content_moderation import find_match, moderate_fields
+
+PAYLOAD = {
+    'title': 'Culurgiones di patate e menta',
+    'description': (
+        "Ravioli tipici dell'Ogliastra, chiusi a spiga, con un ripieno di patate, pecorino sardo, "
+        "menta e aglio. Si servono con sugo di pomodoro fresco e una spolverata di pecorino."
+    ),
+    'ingredients': [
+        '500 g di semola di grano duro', '1 kg di patate', '150 g di pecorino sardo', '1 spicchio di aglio',
+        '10 foglie di menta', 'olio extravergine di oliva', 'sale', '400 g di passata di pomodoro',
+    ],
+    'instructions': [
+        "Lessare le patate, sbucciarle e schiacciarle ancora calde.",
+        "Unire il pecorino grattugiato, l'aglio tritato, la menta e un filo d'olio.",
+        "Impastare la semola con acqua tiepida e un pizzico di sale fino a ottenere un impasto liscio.",
+        "Stendere la sfoglia sottile e ricavare dei dischi di 8 cm di diametro.",
+        "Mettere al centro una noce di ripieno e chiudere a spiga pizzicando i bordi.",
+        "Cuocere in acqua salata per 5-6 minuti e condire con il sugo di pomodoro.",
+    ],
+}
+
+
+def _pathological(size):
+    """Inputs that made the old `[\\W_]*` evasion regexes backtrack: letters drowned in separators."""
+    return [
+        ('separators', ('c' + '._-' * 8) * (size // 25)),
+        ('near-miss evasion', ('c.a.z.z.' + '!' * 20) * (size // 28)),
+        ('single letters', 'v a f f a n c u l ' * (size // 18)),
+        ('long word', 'a' * size),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the moderation engine and check that pathological inputs run in linear time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Payload checks to time (default: 2000)')
+        parser.add_argument(
+            '--max-size', type=int, default=200000,
+            help='Largest pathological input, in characters (default: 200000)',
+        )
+
+    def handle(self, *args, **options):
+        iterations = max(1, options['iterations'])
+        max_size = options['max_size']
+        if max_size < 1:
+            raise CommandError('--max-size must be at least 1.')
+        texts = sum(len(v) if isinstance(v, list) else 1 for v in PAYLOAD.values())
+        chars = sum(sum(map(len, v)) if isinstance(v, list) else len(v) for v in PAYLOAD.values())
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            moderate_fields(PAYLOAD)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Recipe payload ({texts} texts, {chars} chars): {elapsed / iterations * 1e6:.1f} µs per payload, '
+            f'{chars * iterations / elapsed / 1e6:.2f} M chars/s'
+        )
+
+        sizes = []
+        size = 1000
+        while size < max_size:
+            sizes.append(size)
+            size *= 10
+        # Always measured, also when it is below the first step
+        sizes.append(max_size)
+        for label, _ in _pathological(sizes[0]):
+            timings = []
+            for size in sizes:
+                text = dict(_pathological(size))[label]
+                started = time.perf_counter()
+                find_match(text)
+                timings.append((len(text), time.perf_counter() - started))
+            line = ', '.join(f'{length} chars {seconds * 1000:.2f} ms' for length, seconds in timings)
+            self.stdout.write(f'Pathological ({label}): {line}')
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
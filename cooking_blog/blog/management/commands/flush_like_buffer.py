@@ -0,0 +1,58 @@
+"""
+Management command to apply buffered like events (write-behind mode, see blog/like_buffer.py).
+Run with: python manage.py flush_like_buffer [--loop] [--interval 2] [--stats]
+
+Without --loop it flushes once, e.g. from cron or before a deploy. A flusher
+running in its own process needs a shared cache (REDIS_URL); with the default
+in-memory cache leave flushing to the web process (LIKE_BUFFER_FLUSH_IN_PROCESS).
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from blog import like_buffer
+
+
+class Command(BaseCommand):
+    help = 'Apply buffered like/unlike events to the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep flushing every --interval seconds until interrupted',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'LIKE_BUFFER_FLUSH_INTERVAL', 2.0),
+            help='Seconds between flushes with --loop (default: LIKE_BUFFER_FLUSH_INTERVAL)',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Only print buffer depth and flush latency figures',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for name, value in like_buffer.buffer_stats().items():
+                self.stdout.write(f'{name}: {value}')
+            return
+
+        if not options['loop']:
+            flushed = like_buffer.flush()
+            self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} like events.'))
+            return
+
+        self.stdout.write(f'Flushing like events every {options["interval"]}s (Ctrl+C to stop).')
+        try:
+            while True:
+                flushed = like_buffer.flush()
+                if flushed:
+                    self.stdout.write(f'Flushed {flushed} like events.')
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            like_buffer.flush()
+            self.stdout.write(self.style.SUCCESS('Stopped.'))
@@ -0,0 +1,16 @@
+"""
+Management command to rebuild the per-category recipe counts from scratch.
+Run with: python manage.py rebuild_category_counts
+"""
+from django.core.management.base import BaseCommand
+from blog import category_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the visible recipe count of every category (RecipeCategoryCount)'
+
+    def handle(self, *args, **options):
+        counts = category_counts.rebuild()
+        for category, count in sorted(counts.items()):
+            self.stdout.write(f'{category}: {count}')
+        self.stdout.write(self.style.SUCCESS('Category counts rebuilt.'))
@@ -0,0 +1,37 @@
+"""
+Management command to rebuild the recipe full-text search documents.
+Run with: python manage.py rebuild_search_index [--batch-size 500]
+"""
+from django.core.management.base import BaseCommand
+from blog.models import Recipe
+from blog.search import index_recipes
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search document of every recipe (e.g. after changing blog.search.fold)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of recipes to index per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        indexed = 0
+        last_pk = 0
+
+        while True:
+            pks = list(
+                Recipe.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+            indexed += index_recipes(pks)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed} recipes.')
+        )
@@ -0,0 +1,80 @@
+"""
+Management command to recompute the denormalized like/report counters on Recipe.
+Run with: python manage.py recount_recipe_counters [--batch-size 500] [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from blog.models import Recipe, RecipeLike, RecipeReport
+
+
+class Command(BaseCommand):
+    help = 'Recompute likes_count and reports_count on recipes and repair drifted values'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of recipes to check per batch (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted counters without writing them',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+        checked = 0
+        repaired = 0
+        last_pk = 0
+
+        while True:
+            batch = list(
+                Recipe.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'likes_count', 'reports_count')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            pks = [row[0] for row in batch]
+
+            likes = self._counts(RecipeLike, pks)
+            reports = self._counts(RecipeReport, pks)
+
+            drifted = []
+            for pk, likes_count, reports_count in batch:
+                actual_likes = likes.get(pk, 0)
+                actual_reports = reports.get(pk, 0)
+                if likes_count != actual_likes or reports_count != actual_reports:
+                    self.stdout.write(
+                        f'Recipe {pk}: likes {likes_count} -> {actual_likes}, '
+                        f'reports {reports_count} -> {actual_reports}'
+                    )
+                    drifted.append(Recipe(pk=pk, likes_count=actual_likes, reports_count=actual_reports))
+
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    Recipe.objects.bulk_update(drifted, ['likes_count', 'reports_count'])
+
+            checked += len(batch)
+            repaired += len(drifted)
+
+        verb = 'Found' if dry_run else 'Repaired'
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {checked} recipes. {verb} {repaired} drifted counters.')
+        )
+
+    @staticmethod
+    def _counts(model, pks):
+        rows = (
+            model.objects.filter(recipe_id__in=pks)
+            .order_by()
+            .values('recipe_id')
+            .annotate(c=Count('pk'))
+            .values_list('recipe_id', 'c')
+        )
+        return dict(rows)
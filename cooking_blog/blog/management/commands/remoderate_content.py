@@ -0,0 +1,211 @@
+"""
+Re-run content moderation over the text already stored in the database, e.g.
+after the term tables in blog/content_moderation.py have changed.
+Run with: python manage.py remoderate_content [--workers 4] [--batch-size 2000] [--source recipe ...] [--restart]
+
+Recipes (title, description, final comment), ingredients, instructions,
+stories and report descriptions are streamed in primary-key chunks and
+checked in a process pool. Offending fields are stored as ModerationFlag rows
+(listed in the admin for review); unreviewed flags for rows that are now
+clean are removed.
+
+The last primary key handled per source is saved to a checkpoint file after
+every chunk, so an interrupted run resumes where it stopped. The checkpoint
+is discarded when the term tables change or with --restart, and deleted
+once every source has been scanned.
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.content_moderation import moderate_rows, terms_fingerprint
+from blog.models import Ingredient, Instruction, ModerationFlag, Recipe, RecipeReport, StoryPost
+
+# source: (model, text fields, field holding the related recipe id or None)
+SOURCES = {
+    'recipe': (Recipe, ['title', 'description', 'final_comment'], 'pk'),
+    'ingredient': (Ingredient, ['name'], 'recipe_id'),
+    'instruction': (Instruction, ['step'], 'recipe_id'),
+    'story': (StoryPost, ['title', 'content'], None),
+    'report': (RecipeReport, ['description'], 'recipe_id'),
+}
+
+EXCERPT_LENGTH = 200
+
+
+class Command(BaseCommand):
+    help = 'Re-moderate stored recipes, ingredients, instructions, stories and reports in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes (default: CPU count; 0 checks in this process)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows read and checked per chunk (default: 2000)',
+        )
+        parser.add_argument(
+            '--source',
+            action='append',
+            choices=list(SOURCES),
+            help='Only scan this source (repeatable; default: all)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=str(settings.BASE_DIR / 'remoderation_checkpoint.json'),
+            help='Checkpoint file used to resume an interrupted run',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the checkpoint and scan everything again',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the hits without writing flags or the checkpoint',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = max(1, options['batch_size'])
+        self.dry_run = options['dry_run']
+        self.checkpoint_path = options['checkpoint']
+        self.checkpoint = self.load_checkpoint(options['restart'])
+        sources = options['source'] or list(SOURCES)
+        workers = max(0, options['workers'])
+
+        pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+        total_rows = total_hits = 0
+        started = time.perf_counter()
+        try:
+            for source in sources:
+                rows, hits = self.scan(source, pool, max(1, workers) * 2)
+                total_rows += rows
+                total_hits += hits
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+        elapsed = time.perf_counter() - started
+        if not self.dry_run and set(self.checkpoint['done']) >= set(SOURCES):
+            os.remove(self.checkpoint_path)
+        verb = 'Found' if self.dry_run else 'Flagged'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total_hits} fields in {total_rows} rows ({self.rate(total_rows, elapsed)}).'
+        ))
+
+    def scan(self, source, pool, max_pending):
+        """Stream one source in pk chunks, keeping up to `max_pending` chunks in flight."""
+        if source in self.checkpoint['done']:
+            self.stdout.write(f'{source}: already scanned, skipping (use --restart to scan again)')
+            return 0, 0
+        model, fields, recipe_field = SOURCES[source]
+        last_pk = self.checkpoint['sources'].get(source, 0)
+        if last_pk:
+            self.stdout.write(f'{source}: resuming after pk {last_pk}')
+
+        rows = hits = 0
+        started = time.perf_counter()
+        pending = deque()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                chunk = list(
+                    model.objects.filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .values_list('pk', *fields)[:self.batch_size]
+                )
+                if not chunk:
+                    exhausted = True
+                    break
+                first_pk, last_pk = chunk[0][0], chunk[-1][0]
+                texts = [(row[0], dict(zip(fields, row[1:]))) for row in chunk]
+                result = pool.submit(moderate_rows, texts) if pool else moderate_rows(texts)
+                pending.append((first_pk, last_pk, len(chunk), result))
+            if not pending:
+                break
+            # Results are applied in pk order, so the checkpoint never skips an unchecked chunk.
+            first_pk, chunk_last_pk, count, result = pending.popleft()
+            chunk_hits = result if isinstance(result, list) else result.result()
+            self.save_hits(source, model, recipe_field, first_pk, chunk_last_pk, chunk_hits)
+            rows += count
+            hits += len(chunk_hits)
+            self.checkpoint['sources'][source] = chunk_last_pk
+            self.save_checkpoint()
+
+        self.checkpoint['done'].append(source)
+        self.save_checkpoint()
+        self.stdout.write(
+            f'{source}: {rows} rows, {hits} hits ({self.rate(rows, time.perf_counter() - started)})'
+        )
+        return rows, hits
+
+    def save_hits(self, source, model, recipe_field, first_pk, last_pk, hits):
+        """Replace the unreviewed flags of a chunk's pk range with its hits."""
+        if self.dry_run:
+            for pk, field, term, category in hits:
+                self.stdout.write(f'{source} {pk} ({field}): {term} [{category}]')
+            return
+        details = {}
+        if hits:
+            columns = ['pk', *{field for _, field, _, _ in hits}] + ([recipe_field] if recipe_field else [])
+            details = {
+                row['pk']: row
+                for row in model.objects.filter(pk__in={pk for pk, _, _, _ in hits}).values(*columns)
+            }
+        flags = [
+            ModerationFlag(
+                source=source,
+                object_id=pk,
+                field=field,
+                recipe_id=details[pk][recipe_field] if recipe_field else None,
+                term=term,
+                category=category,
+                excerpt=(details[pk][field] or '')[:EXCERPT_LENGTH],
+            )
+            for pk, field, term, category in hits
+            if pk in details  # deleted since it was read
+        ]
+        with transaction.atomic():
+            ModerationFlag.objects.filter(
+                source=source, object_id__gte=first_pk, object_id__lte=last_pk, reviewed=False,
+            ).delete()
+            # Reviewed flags are kept: a hit on an already reviewed field only refreshes its details.
+            ModerationFlag.objects.bulk_create(
+                flags,
+                update_conflicts=True,
+                unique_fields=['source', 'object_id', 'field'],
+                update_fields=['recipe', 'term', 'category', 'excerpt', 'flagged_at'],
+            )
+
+    def load_checkpoint(self, restart):
+        fresh = {'fingerprint': terms_fingerprint(), 'sources': {}, 'done': []}
+        if restart or not os.path.exists(self.checkpoint_path):
+            return fresh
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('fingerprint') != fresh['fingerprint']:
+            self.stdout.write(self.style.WARNING('Term tables changed since the checkpoint: starting over.'))
+            return fresh
+        return checkpoint
+
+    def save_checkpoint(self):
+        if self.dry_run:
+            return
+        temp_path = f'{self.checkpoint_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    @staticmethod
+    def rate(rows, elapsed):
+        return f'{rows / elapsed:,.0f} rows/s' if elapsed > 0 else 'n/a rows/s'
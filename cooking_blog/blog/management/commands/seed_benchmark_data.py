@@ -0,0 +1,43 @@
+"""
+Management command to seed a reproducible benchmark dataset (see blog/benchmark.py).
+Run with: python manage.py seed_benchmark_data [--users 50] [--recipes 500] [--likes 5000] [--reports 200] [--stories 20] [--seed 42] [--flush]
+
+All rows belong to users under the benchmark e-mail domain; --flush deletes
+them (and everything they own) before seeding. Use a scratch database.
+"""
+import time
+from django.core.management.base import BaseCommand
+from blog import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Seed users, recipes, likes, reports and stories for benchmark_endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Users to create (default: 50)')
+        parser.add_argument('--recipes', type=int, default=500, help='Recipes to create (default: 500)')
+        parser.add_argument('--likes', type=int, default=5000, help='Likes, Zipf-distributed over recipes (default: 5000)')
+        parser.add_argument('--reports', type=int, default=200, help='Reports, Zipf-distributed over recipes (default: 200)')
+        parser.add_argument('--stories', type=int, default=20, help='Stories to create (default: 20)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for a reproducible dataset (default: 42)')
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Delete the previously seeded benchmark data first',
+        )
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            deleted = benchmark.flush()
+            self.stdout.write(f'Deleted {deleted} benchmark rows.')
+        started = time.perf_counter()
+        created = benchmark.seed(
+            users=max(1, options['users']),
+            recipes=max(1, options['recipes']),
+            stories=max(1, options['stories']),
+            likes=max(0, options['likes']),
+            reports=max(0, options['reports']),
+            random_seed=options['seed'],
+        )
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {time.perf_counter() - started:.1f}s.'))
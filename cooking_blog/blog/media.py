@@ -0,0 +1,119 @@
+"""
+Responses for media files (serve_media in cooking_blog/urls.py).
+
+- Caching: every file gets an ETag and Last-Modified and answers conditional
+  requests with 304. Content-hashed uploads (blog/storage.py), with their
+  variants and resizes, never change behind their URL and are sent with
+  `Cache-Control: public, max-age=<1 year>, immutable`; older uploads get
+  MEDIA_CACHE_MAX_AGE.
+- Byte ranges: a single `Range` (honouring `If-Range`) gets a 206; several
+  ranges get the whole file, as RFC 9110 allows.
+- Offload: with MEDIA_SENDFILE = 'x-accel-redirect' (nginx, path under
+  MEDIA_ACCEL_REDIRECT_PREFIX) or 'x-sendfile' (Apache, lighttpd, Caddy) the
+  response carries only headers and the front proxy sends the file, ranges
+  included. Otherwise full files go out through wsgi.file_wrapper, which
+  gunicorn turns into sendfile().
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from .storage import is_content_hashed
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_response(request, name, path, stat):
+    """
+    Response for the media file `name` (the URL path under MEDIA_URL), read from `path` (the file
+    itself, or its cached resize) whose os.stat() result is `stat`.
+    """
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+    if is_content_hashed(name):
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, path, stat.st_size, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _file_response(request, path, size, etag, last_modified):
+    content_type = mimetypes.guess_type(str(path))[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SENDFILE
+    if mode == 'x-accel-redirect':
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(relative)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = str(path)
+        return response
+
+    byte_range = _requested_range(request, size, etag, last_modified)
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _requested_range(request, size, etag, last_modified):
+    """
+    (start, end) of a satisfiable single-range request, False if it can't be satisfied, None to send
+    the whole file (no, malformed or multiple ranges, or an If-Range that no longer matches).
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    if request.method not in ('GET', 'HEAD') or not header:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+        return None
+    match = _RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            return False
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if end < start:
+        return None
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,199 @@
+"""
+Prometheus metrics, scraped from /metrics.
+
+- HTTP: requests per route (the URL name) and status, latency histogram per
+  route, requests in progress (MetricsMiddleware).
+- Database: queries and SQL time per request, as histograms per route.
+- Caches: hits, stale hits and misses of the response cache (per cached
+  endpoint), the sitemap files and the on-demand image resizes. The hit
+  ratio is `sum(rate(blog_cache_requests_total{result!="miss"}[5m])) /
+  sum(rate(blog_cache_requests_total[5m]))`.
+- Workers: start time and peak RSS of every gunicorn worker (a `pid` label),
+  configured worker count (from gunicorn.conf.py).
+- Domain: likes and unlikes, reports, recipes published, and the state of
+  the like buffer when LIKE_WRITE_BEHIND is on.
+
+Metrics are updated in process, with no I/O on the request path. Under
+gunicorn every worker writes its values to memory-mapped files in
+PROMETHEUS_MULTIPROC_DIR (set up by gunicorn.conf.py) and a scrape
+aggregates all of them, whichever worker answers it. Without that variable
+(runserver, tests) the values live in the process.
+
+/metrics answers only requests with `Authorization: Bearer <METRICS_TOKEN>`
+and is disabled (404) while METRICS_TOKEN is empty.
+
+Models are imported lazily: gunicorn.conf.py imports this module from a
+hook.
+"""
+import hmac
+import os
+import resource
+import threading
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64)
+# Peak RSS is read at most this often per worker, in seconds
+MEMORY_SAMPLE_INTERVAL = 10
+# Any other method is counted as 'other': clients choose it, so it mustn't create label values.
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+REQUESTS = Counter('blog_http_requests_total', 'HTTP requests.', ['method', 'route', 'status'])
+REQUEST_DURATION = Histogram(
+    'blog_http_request_duration_seconds', 'Time to produce the response.', ['route'], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'blog_http_requests_in_progress', 'Requests being processed.', multiprocess_mode='livesum',
+)
+DB_QUERIES = Histogram(
+    'blog_db_queries_per_request', 'SQL queries per request.', ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'blog_db_duration_seconds', 'SQL time per request.', ['route'], buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'blog_cache_requests_total', 'Cache lookups by result (hit, stale, miss).', ['cache', 'result'],
+)
+
+WORKER_START_TIME = Gauge(
+    'blog_worker_start_time_seconds', 'Start time of the worker process.', multiprocess_mode='liveall',
+)
+WORKER_MAX_RSS = Gauge(
+    'blog_worker_max_resident_memory_bytes', 'Peak resident memory of the worker process.',
+    multiprocess_mode='liveall',
+)
+GUNICORN_WORKERS = Gauge(
+    'blog_gunicorn_workers', 'Configured gunicorn workers.', multiprocess_mode='livemostrecent',
+)
+
+LIKES = Counter('blog_likes_total', 'Likes and unlikes that changed a like state.', ['action'])
+REPORTS = Counter('blog_reports_total', 'Recipe reports.')
+RECIPES_PUBLISHED = Counter('blog_recipes_published_total', 'Recipes created as or switched to published.')
+
+_memory_sampled_at = 0.0
+_memory_lock = threading.Lock()
+
+
+def count_cache(cache, result):
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def _sample_worker_memory():
+    global _memory_sampled_at
+    now = time.monotonic()
+    if now - _memory_sampled_at < MEMORY_SAMPLE_INTERVAL or not _memory_lock.acquire(blocking=False):
+        return
+    try:
+        _memory_sampled_at = now
+        # ru_maxrss is in kilobytes on Linux
+        WORKER_MAX_RSS.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    finally:
+        _memory_lock.release()
+
+
+class _QueryTimer:
+    """connection.execute_wrapper() hook counting the queries of one request and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Count and time every request for Prometheus."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        WORKER_START_TIME.set_to_current_time()
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        queries = _QueryTimer()
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            with ExitStack() as stack:
+                for alias in settings.DATABASES:
+                    stack.enter_context(connections[alias].execute_wrapper(queries))
+                response = self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        # The URL name, not the path: one series per route, whatever the ids and slugs.
+        route = (match.view_name or match.route) if match else 'unmatched'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUESTS.labels(method, route, str(response.status_code)).inc()
+        REQUEST_DURATION.labels(route).observe(duration)
+        DB_QUERIES.labels(route).observe(queries.count)
+        DB_DURATION.labels(route).observe(queries.duration)
+        _sample_worker_memory()
+        return response
+
+
+class LikeBufferCollector:
+    """State of the write-behind like buffer, read at scrape time (see blog/like_buffer.py)."""
+
+    def collect(self):
+        from . import like_buffer
+
+        if not like_buffer.is_enabled():
+            return
+        stats = like_buffer.buffer_stats()
+        figures = [
+            ('blog_like_buffer_depth', 'Buffered like events not yet applied.', stats['depth']),
+            ('blog_like_buffer_oldest_event_age_seconds', 'Age of the oldest buffered event.',
+             stats['oldest_event_age_seconds']),
+            ('blog_like_buffer_flushes', 'Flushes applied since the cache was last cleared.', stats['flushes']),
+            ('blog_like_buffer_flushed_events', 'Events applied since the cache was last cleared.', stats['events']),
+            ('blog_like_buffer_last_flush_seconds', 'Duration of the last flush.', stats['last_flush_seconds']),
+        ]
+        for name, documentation, value in figures:
+            yield GaugeMetricFamily(name, documentation, value=value if value is not None else float('nan'))
+
+
+def is_multiprocess():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def render_metrics():
+    """The exposition text of every metric, aggregated across worker processes in multiprocess mode."""
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    extra = CollectorRegistry()
+    extra.register(LikeBufferCollector())
+    return generate_latest(registry) + generate_latest(extra)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, behind a bearer token (METRICS_TOKEN)."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        raise Http404('Metrics are disabled.')
+    scheme, _, sent = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(sent.strip().encode(), token.encode()):
+        response = HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    response = HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Recipe = apps.get_model('blog', 'Recipe')
+    RecipeLike = apps.get_model('blog', 'RecipeLike')
+    RecipeReport = apps.get_model('blog', 'RecipeReport')
+
+    def count_of(model):
+        counts = (
+            model.objects.filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(c=Count('pk'))
+            .values('c')
+        )
+        return Coalesce(Subquery(counts), Value(0))
+
+    Recipe.objects.update(
+        likes_count=count_of(RecipeLike),
+        reports_count=count_of(RecipeReport),
+    )
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_merge_20260204_1516'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='reports_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, noop),
+    ]
@@ -0,0 +1,151 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:00
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE blog_recipesearchdocument ADD COLUMN vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('italian', title), 'A') ||
+        setweight(to_tsvector('italian', ingredients), 'B') ||
+        setweight(to_tsvector('italian', category || ' ' || author), 'C') ||
+        setweight(to_tsvector('italian', description), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX blog_recipesearch_vector_gin ON blog_recipesearchdocument USING gin (vector)",
+    """
+    CREATE INDEX blog_recipesearch_trgm_gin ON blog_recipesearchdocument
+    USING gin ((title || ' ' || ingredients) gin_trgm_ops)
+    """,
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS blog_recipesearch_trgm_gin",
+    "DROP INDEX IF EXISTS blog_recipesearch_vector_gin",
+    "ALTER TABLE blog_recipesearchdocument DROP COLUMN IF EXISTS vector",
+]
+
+_FTS_COLUMNS = 'title, ingredients, category, author, description'
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE VIRTUAL TABLE blog_recipesearch_fts USING fts5(
+        {_FTS_COLUMNS},
+        content='blog_recipesearchdocument',
+        content_rowid='recipe_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER blog_recipesearch_ai AFTER INSERT ON blog_recipesearchdocument BEGIN
+        INSERT INTO blog_recipesearch_fts(rowid, {_FTS_COLUMNS})
+        VALUES (new.recipe_id, new.title, new.ingredients, new.category, new.author, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER blog_recipesearch_ad AFTER DELETE ON blog_recipesearchdocument BEGIN
+        INSERT INTO blog_recipesearch_fts(blog_recipesearch_fts, rowid, {_FTS_COLUMNS})
+        VALUES ('delete', old.recipe_id, old.title, old.ingredients, old.category, old.author, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER blog_recipesearch_au AFTER UPDATE ON blog_recipesearchdocument BEGIN
+        INSERT INTO blog_recipesearch_fts(blog_recipesearch_fts, rowid, {_FTS_COLUMNS})
+        VALUES ('delete', old.recipe_id, old.title, old.ingredients, old.category, old.author, old.description);
+        INSERT INTO blog_recipesearch_fts(rowid, {_FTS_COLUMNS})
+        VALUES (new.recipe_id, new.title, new.ingredients, new.category, new.author, new.description);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS blog_recipesearch_au",
+    "DROP TRIGGER IF EXISTS blog_recipesearch_ad",
+    "DROP TRIGGER IF EXISTS blog_recipesearch_ai",
+    "DROP TABLE IF EXISTS blog_recipesearch_fts",
+]
+
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def fold(text):
+    # Frozen copy of blog.search.fold as of this migration: later changes to the app must not alter it.
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return re.sub(r"['’`]", ' ', stripped).casefold()
+
+
+def _run(schema_editor, statements_by_vendor):
+    for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_indexes(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def drop_search_indexes(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+def build_documents(apps, schema_editor):
+    Recipe = apps.get_model('blog', 'Recipe')
+    RecipeSearchDocument = apps.get_model('blog', 'RecipeSearchDocument')
+    recipes = Recipe.objects.select_related('author').prefetch_related('ingredients').order_by('pk')
+    documents = []
+    for recipe in recipes.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        author = 'Redazione' if recipe.author.is_redazione else recipe.author.name
+        documents.append(RecipeSearchDocument(
+            recipe=recipe,
+            title=fold(recipe.title),
+            ingredients=fold(' '.join(ingredient.name for ingredient in recipe.ingredients.all())),
+            category=fold(recipe.category),
+            author=fold(author),
+            description=fold(recipe.description),
+        ))
+        # Write each batch as it fills up, so memory stays flat however many recipes there are.
+        if len(documents) == BACKFILL_BATCH_SIZE:
+            RecipeSearchDocument.objects.bulk_create(documents)
+            documents = []
+    if documents:
+        RecipeSearchDocument.objects.bulk_create(documents)
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_recipe_likes_count_recipe_reports_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='blog.recipe')),
+                ('title', models.TextField(blank=True)),
+                ('ingredients', models.TextField(blank=True)),
+                ('category', models.TextField(blank=True)),
+                ('author', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'recipe search document',
+                'verbose_name_plural': 'recipe search documents',
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(build_documents, noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:19
+
+from django.db import migrations, models
+from blog.migration_operations import AddIndexConcurrentlyIfSupported
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('blog', '0015_recipesearchdocument'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-is_featured', '-created_at', '-id'], name='recipe_pub_featured_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-is_featured', '-likes_count', '-created_at', '-id'], name='recipe_pub_likes_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-is_featured', '-created_at'], name='recipe_pub_category_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('gluten_free', True), ('is_published', True)), fields=['-is_featured', '-created_at'], name='recipe_pub_gluten_free_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_published', True), ('lactose_free', True)), fields=['-is_featured', '-created_at'], name='recipe_pub_lactose_free_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_published', True), ('is_sardinian', True)), fields=['-is_featured', '-created_at'], name='recipe_pub_sardinian_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['author', '-is_featured', '-created_at'], name='recipe_pub_author_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-created_at'], name='recipe_author_created_idx'),
+        ),
+    ]
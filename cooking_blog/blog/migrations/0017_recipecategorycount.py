@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+from django.db import migrations, models
+from django.db.models import Count
+
+FLAG_REPORT_THRESHOLD = 5
+
+
+def build_counts(apps, schema_editor):
+    Recipe = apps.get_model('blog', 'Recipe')
+    RecipeCategoryCount = apps.get_model('blog', 'RecipeCategoryCount')
+    counts = dict(
+        Recipe.objects.filter(is_published=True, reports_count__lte=FLAG_REPORT_THRESHOLD)
+        .order_by()
+        .values('category')
+        .annotate(count=Count('id'))
+        .values_list('category', 'count')
+    )
+    categories = {choice for choice, _ in Recipe._meta.get_field('category').choices} | set(counts)
+    RecipeCategoryCount.objects.bulk_create(
+        [RecipeCategoryCount(category=category, count=counts.get(category, 0)) for category in categories]
+    )
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_recipe_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCategoryCount',
+            fields=[
+                ('category', models.CharField(choices=[('Bread & Pizza', 'Bread & Pizza'), ('Pasta Dishes', 'Pasta Dishes'), ('Meat & Poultry', 'Meat & Poultry'), ('Desserts', 'Desserts'), ('Fish', 'Fish')], max_length=50, primary_key=True, serialize=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'recipe category count',
+                'verbose_name_plural': 'recipe category counts',
+                'ordering': ['category'],
+            },
+        ),
+        migrations.RunPython(build_counts, noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-17 13:00
+
+from django.db import migrations, models
+from django.utils import timezone
+
+FLAG_REPORT_THRESHOLD = 5
+
+
+def hide_flagged_recipes(apps, schema_editor):
+    Recipe = apps.get_model('blog', 'Recipe')
+    Recipe.objects.filter(reports_count__gt=FLAG_REPORT_THRESHOLD).update(is_hidden=True, hidden_at=timezone.now())
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_recipecategorycount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='hidden_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='is_hidden',
+            field=models.BooleanField(default=False, help_text='Nascosta al pubblico: impostata automaticamente quando le segnalazioni superano la soglia.', verbose_name='Nascosta'),
+        ),
+        migrations.RunPython(hide_flagged_recipes, noop),
+    ]
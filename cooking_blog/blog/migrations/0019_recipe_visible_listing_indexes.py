@@ -0,0 +1,77 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:23
+
+from django.db import migrations, models
+from blog.migration_operations import AddIndexConcurrentlyIfSupported, RemoveIndexConcurrentlyIfSupported
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction.
+    # The new indexes are built before the old ones are dropped.
+    atomic = False
+
+    dependencies = [
+        ('blog', '0018_recipe_is_hidden_recipe_hidden_at'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('is_published', True)), fields=['-is_featured', '-created_at', '-id'], name='recipe_vis_featured_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('is_published', True)), fields=['-is_featured', '-likes_count', '-created_at', '-id'], name='recipe_vis_likes_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('is_published', True)), fields=['category', '-is_featured', '-created_at'], name='recipe_vis_category_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('gluten_free', True), ('is_hidden', False), ('is_published', True)), fields=['-is_featured', '-created_at'], name='recipe_vis_gluten_free_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('is_published', True), ('lactose_free', True)), fields=['-is_featured', '-created_at'], name='recipe_vis_lactose_free_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('is_published', True), ('is_sardinian', True)), fields=['-is_featured', '-created_at'], name='recipe_vis_sardinian_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('is_published', True)), fields=['author', '-is_featured', '-created_at'], name='recipe_vis_author_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('is_hidden', True)), fields=['-hidden_at'], name='recipe_hidden_idx'),
+        ),
+        RemoveIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            name='recipe_pub_featured_idx',
+        ),
+        RemoveIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            name='recipe_pub_likes_idx',
+        ),
+        RemoveIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            name='recipe_pub_category_idx',
+        ),
+        RemoveIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            name='recipe_pub_gluten_free_idx',
+        ),
+        RemoveIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            name='recipe_pub_lactose_free_idx',
+        ),
+        RemoveIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            name='recipe_pub_sardinian_idx',
+        ),
+        RemoveIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            name='recipe_pub_author_idx',
+        ),
+    ]
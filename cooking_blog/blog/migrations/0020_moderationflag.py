@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_recipe_visible_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('recipe', 'Ricetta'), ('ingredient', 'Ingrediente'), ('instruction', 'Istruzione'), ('story', 'Storia'), ('report', 'Segnalazione')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('field', models.CharField(max_length=50)),
+                ('term', models.CharField(max_length=100)),
+                ('category', models.CharField(max_length=20)),
+                ('excerpt', models.TextField(blank=True)),
+                ('flagged_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reviewed', models.BooleanField(default=False, verbose_name='Verificato')),
+                ('recipe', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='moderation_flags', to='blog.recipe')),
+            ],
+            options={
+                'verbose_name': 'moderation flag',
+                'verbose_name_plural': 'moderation flags',
+                'ordering': ['reviewed', '-flagged_at'],
+                'constraints': [models.UniqueConstraint(fields=('source', 'object_id', 'field'), name='moderation_flag_unique_field')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:50
+
+import blog.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0021_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.media_storage, upload_to='recipes/'),
+        ),
+        migrations.AlterField(
+            model_name='storypost',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=blog.storage.media_storage, upload_to='stories/'),
+        ),
+    ]
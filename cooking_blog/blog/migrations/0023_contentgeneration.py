@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-17 18:00
+
+import time
+
+from django.db import migrations, models
+
+SCOPES = ('recipes', 'stories', 'sitemap')
+
+
+def create_generations(apps, schema_editor):
+    ContentGeneration = apps.get_model('blog', 'ContentGeneration')
+    now = time.time_ns()
+    ContentGeneration.objects.bulk_create(
+        [ContentGeneration(scope=scope, value=now) for scope in SCOPES], ignore_conflicts=True,
+    )
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0022_content_hashed_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentGeneration',
+            fields=[
+                ('scope', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'content generation',
+                'verbose_name_plural': 'content generations',
+            },
+        ),
+        migrations.RunPython(create_generations, noop),
+    ]
@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
-from django.utils.text import slugify
+from .slugs import allocate_slug, slug_base
+from .storage import media_storage
 
 
 class UserManager(BaseUserManager):
@@ -70,6 +71,16 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Recipe(models.Model):
     """Recipe model for storing cooking recipes."""
     
+    # Recipes with more than this many reports are hidden from public view (is_hidden).
+    FLAG_REPORT_THRESHOLD = 5
+    # Attempts at a fresh slug when a concurrent save takes the one allocated
+    SLUG_ALLOCATION_ATTEMPTS = 5
+    # Columns written by single-statement updates (likes, reports, hiding). A full save of a loaded
+    # instance leaves them out, or it would write back the values read before a concurrent like/report.
+    COUNTER_FIELDS = ('likes_count', 'reports_count')
+    # Written by a full save only when changed on the instance (a moderator unhiding in the admin).
+    MODERATION_FIELDS = ('is_hidden', 'hidden_at')
+    
     CATEGORY_CHOICES = [
         ('Bread & Pizza', 'Bread & Pizza'),
         ('Pasta Dishes', 'Pasta Dishes'),
@@ -84,7 +95,9 @@ class Recipe(models.Model):
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     prep_time = models.IntegerField(help_text="Prep time in minutes")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes')
-    image = models.ImageField(upload_to='recipes/', blank=True, null=True)
+    image = models.ImageField(upload_to='recipes/', storage=media_storage, blank=True, null=True)
+    # Resized variants of `image` (see blog/images.py), filled in after upload
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     gluten_free = models.BooleanField(default=False, help_text="Ricetta senza glutine")
     lactose_free = models.BooleanField(default=False, help_text="Ricetta senza lattosio")
     is_sardinian = models.BooleanField(default=False, help_text="Ricetta tradizionale sarda")
@@ -102,42 +115,124 @@ class Recipe(models.Model):
         help_text="Commenti finali dell'autore da mostrare in fondo alla ricetta."
     )
     liked_by = models.ManyToManyField(User, through='RecipeLike', related_name='liked_recipes', blank=True)
+    # Denormalized counters, kept in sync by the like/report views (see recount_recipe_counters).
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    reports_count = models.PositiveIntegerField(default=0, editable=False)
+    is_hidden = models.BooleanField(
+        default=False,
+        verbose_name="Nascosta",
+        help_text="Nascosta al pubblico: impostata automaticamente quando le segnalazioni superano la soglia."
+    )
+    hidden_at = models.DateTimeField(blank=True, null=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'recipe'
         verbose_name_plural = 'recipes'
+        # Shaped to the public listing (RecipeListCreateView.get_queryset): always published and not
+        # hidden, sorted by -is_featured, -created_at (or likes), with optional category/dietary/author
+        # filters. Built concurrently (migrations 0016, 0019); see PERFORMANCE.md for the EXPLAIN check.
+        indexes = [
+            models.Index(
+                fields=['-is_featured', '-created_at', '-id'],
+                condition=models.Q(is_published=True, is_hidden=False),
+                name='recipe_vis_featured_idx',
+            ),
+            models.Index(
+                fields=['-is_featured', '-likes_count', '-created_at', '-id'],
+                condition=models.Q(is_published=True, is_hidden=False),
+                name='recipe_vis_likes_idx',
+            ),
+            models.Index(
+                fields=['category', '-is_featured', '-created_at'],
+                condition=models.Q(is_published=True, is_hidden=False),
+                name='recipe_vis_category_idx',
+            ),
+            models.Index(
+                fields=['-is_featured', '-created_at'],
+                condition=models.Q(is_published=True, is_hidden=False, gluten_free=True),
+                name='recipe_vis_gluten_free_idx',
+            ),
+            models.Index(
+                fields=['-is_featured', '-created_at'],
+                condition=models.Q(is_published=True, is_hidden=False, lactose_free=True),
+                name='recipe_vis_lactose_free_idx',
+            ),
+            models.Index(
+                fields=['-is_featured', '-created_at'],
+                condition=models.Q(is_published=True, is_hidden=False, is_sardinian=True),
+                name='recipe_vis_sardinian_idx',
+            ),
+            models.Index(
+                fields=['author', '-is_featured', '-created_at'],
+                condition=models.Q(is_published=True, is_hidden=False),
+                name='recipe_vis_author_idx',
+            ),
+            models.Index(fields=['author', '-created_at'], name='recipe_author_created_idx'),
+            models.Index(
+                fields=['-hidden_at'],
+                condition=models.Q(is_hidden=True),
+                name='recipe_hidden_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_moderation = instance._moderation_state()
+        return instance
+    
+    def _moderation_state(self):
+        return tuple(self.__dict__.get(name) for name in self.MODERATION_FIELDS)
+    
+    def _unprotected_update_fields(self):
+        """Fields a save without update_fields writes to an existing row (see COUNTER_FIELDS)."""
+        skipped = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+        if self._moderation_state() == getattr(self, '_loaded_moderation', None):
+            skipped |= set(self.MODERATION_FIELDS)
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in skipped and field.attname not in skipped
+        ]
+    
     def save(self, *args, **kwargs):
+        if (
+            not self._state.adding and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert') and not args
+        ):
+            kwargs['update_fields'] = self._unprotected_update_fields()
+        self._save_with_slug(*args, **kwargs)
+        self._loaded_moderation = self._moderation_state()
+    
+    def _save_with_slug(self, *args, **kwargs):
         if self.is_featured:
             Recipe.objects.filter(is_featured=True).exclude(pk=self.pk).update(is_featured=False)
-        if not self.slug and self.title:
-            base = slugify(self.title) or 'recipe'
-            slug = base
-            n = 1
-            while Recipe.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f'{base}-{n}'
-                n += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
-    
-    @property
-    def likes_count(self):
-        """Return the number of likes for this recipe."""
-        return self.recipe_likes.count()
-    
-    @property
-    def reports_count(self):
-        """Return the number of reports for this recipe."""
-        return self.recipe_reports.count()
+        if self.slug or not self.title:
+            super().save(*args, **kwargs)
+            return
+        base = slug_base(self.title)
+        for attempt in range(self.SLUG_ALLOCATION_ATTEMPTS):
+            self.slug = allocate_slug(Recipe.objects.exclude(pk=self.pk), base)
+            try:
+                # Savepoint: a concurrent publish may take the same slug between allocation and insert
+                with transaction.atomic(using=kwargs.get('using')):
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                if attempt == self.SLUG_ALLOCATION_ATTEMPTS - 1 or not self._slug_taken():
+                    self.slug = ''
+                    raise
+    
+    def _slug_taken(self):
+        return Recipe.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
     
     @property
     def is_flagged(self):
-        """Check if recipe has more than 5 reports and should be hidden."""
-        return self.recipe_reports.count() > 5
+        """Check if recipe has been hidden for having more than 5 reports."""
+        return self.is_hidden
 
 
 class Ingredient(models.Model):
@@ -211,13 +306,96 @@ class RecipeReport(models.Model):
         return f"{self.user.name} reported {self.recipe.title}"
 
 
+class RecipeSearchDocument(models.Model):
+    """Accent-folded search text for a recipe, maintained by blog.search (see migration 0015 for the indexes)."""
+    
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.TextField(blank=True)
+    ingredients = models.TextField(blank=True)
+    category = models.TextField(blank=True)
+    author = models.TextField(blank=True)
+    description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'recipe search document'
+        verbose_name_plural = 'recipe search documents'
+    
+    def __str__(self):
+        return f"Search document for recipe {self.recipe_id}"
+
+
+class RecipeCategoryCount(models.Model):
+    """Number of publicly visible recipes per category, maintained incrementally by blog.category_counts."""
+    
+    category = models.CharField(max_length=50, choices=Recipe.CATEGORY_CHOICES, primary_key=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['category']
+        verbose_name = 'recipe category count'
+        verbose_name_plural = 'recipe category counts'
+    
+    def __str__(self):
+        return f"{self.category}: {self.count}"
+
+
+class ContentGeneration(models.Model):
+    """Current generation of a response cache scope (see blog.cache), in the database so every process sees it."""
+    
+    scope = models.CharField(max_length=20, primary_key=True)
+    value = models.BigIntegerField()
+    
+    class Meta:
+        verbose_name = 'content generation'
+        verbose_name_plural = 'content generations'
+    
+    def __str__(self):
+        return f"{self.scope}: {self.value}"
+
+
+class ModerationFlag(models.Model):
+    """Text flagged by a corpus re-moderation run (remoderate_content command), for staff review."""
+    
+    SOURCE_CHOICES = [
+        ('recipe', 'Ricetta'),
+        ('ingredient', 'Ingrediente'),
+        ('instruction', 'Istruzione'),
+        ('story', 'Storia'),
+        ('report', 'Segnalazione'),
+    ]
+    
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=50)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, null=True, blank=True, related_name='moderation_flags')
+    term = models.CharField(max_length=100)
+    category = models.CharField(max_length=20)
+    excerpt = models.TextField(blank=True)
+    flagged_at = models.DateTimeField(default=timezone.now)
+    reviewed = models.BooleanField(default=False, verbose_name="Verificato")
+    
+    class Meta:
+        ordering = ['reviewed', '-flagged_at']
+        verbose_name = 'moderation flag'
+        verbose_name_plural = 'moderation flags'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'object_id', 'field'], name='moderation_flag_unique_field'),
+        ]
+    
+    def __str__(self):
+        return f"{self.source} {self.object_id} ({self.field}): {self.term}"
+
+
 class StoryPost(models.Model):
     """Story post model for chef and staff member stories."""
     
     title = models.CharField(max_length=255)
     content = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stories')
-    image = models.ImageField(upload_to='stories/', blank=True, null=True)
+    image = models.ImageField(upload_to='stories/', storage=media_storage, blank=True, null=True)
+    # Resized variants of `image` (see blog/images.py), filled in after upload
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     role = models.CharField(max_length=100, help_text="e.g., 'Chef', 'Sous Chef', 'Pastry Chef'")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
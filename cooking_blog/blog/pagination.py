@@ -0,0 +1,157 @@
+"""
+Keyset (cursor) pagination for the public listings.
+
+Unlike PageNumberPagination it never runs COUNT(*) nor OFFSET: each page is a
+range scan that starts right after the last row of the previous page, so deep
+pages cost the same as the first one and rows published in the meantime don't
+shift the window (no duplicates in infinite scroll).
+"""
+import base64
+import binascii
+import datetime
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder keeping the microseconds of datetimes: a cursor must match its row exactly."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate on the queryset's own ORDER BY (plus pk as tie-breaker).
+
+    The cursor is an opaque token holding the ordering it was issued for and the
+    ordering values of the last row returned. Opt in by sending `?cursor=`
+    (empty for the first page), then follow the `next` link.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursore non valido.'
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.next_values = None
+        self.ordering = None
+        self.model = None
+        self.request = None
+
+    @classmethod
+    def is_requested(cls, request):
+        return cls.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset)
+        values = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(self.build_after_filter(values))
+
+        # Fetch one extra row to know whether a next page exists, without counting.
+        rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_values = [self._get_value(rows[-1], field) for field in self.ordering]
+        else:
+            self.next_values = None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, queryset):
+        """Ordering used for the keyset: the queryset's ORDER BY, made total with the pk."""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not any(field.lstrip('-') in ('pk', 'id') for field in ordering):
+            ordering.append('-pk')
+        return ordering
+
+    def build_after_filter(self, values):
+        """
+        Rows strictly after `values` in ordering order:
+        (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ... with < for descending fields.
+        """
+        condition = Q()
+        equal_prefix = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+            equal_prefix &= Q(**{name: value})
+        return condition
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def encode_cursor(self, values):
+        payload = json.dumps({'o': self.ordering, 'v': values}, cls=CursorJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        """Return the ordering values encoded in the cursor, or None for the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+            if payload['o'] != self.ordering or len(payload['v']) != len(self.ordering):
+                raise ValueError('cursor issued for a different ordering')
+            return [self._to_python(field, value) for field, value in zip(self.ordering, payload['v'])]
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_value(self, obj, field):
+        return getattr(obj, field.lstrip('-'))
+
+    def _to_python(self, field, value):
+        name = field.lstrip('-')
+        try:
+            model_field = self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotation (e.g. a computed rank): JSON already holds a plain value
+            return value
+        value = model_field.to_python(value)
+        if value is None:
+            raise ValueError('ordering values are never null')
+        # Out-of-range integers would fail in the database, not here
+        model_field.run_validators(value)
+        return value
+
+
+class CursorPaginationOptInMixin:
+    """Use KeysetPagination when the client sends ?cursor=, the default page-number pagination otherwise."""
+
+    @property
+    def pagination_class(self):
+        if KeysetPagination.is_requested(self.request):
+            return KeysetPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
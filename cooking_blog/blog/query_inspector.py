@@ -0,0 +1,158 @@
+"""
+SQL inspection for development and staging (QueryInspectorMiddleware).
+
+- Repeated queries: the SQL of a request is grouped by shape (literals and
+  IN lists collapsed, so `WHERE recipe_id = 1` and `= 2` are one shape). A
+  shape executed more than QUERY_INSPECTOR_REPEAT_THRESHOLD times is the
+  mark of an N+1, e.g. a serializer method field running a query per row:
+  it is logged as a warning on `blog.query_inspector`, or raised as
+  RepeatedQueriesError when QUERY_INSPECTOR_RAISE is set (the test run).
+- Slow queries: every SELECT slower than QUERY_INSPECTOR_SLOW_MS is run
+  again under EXPLAIN, with ANALYZE and BUFFERS on PostgreSQL, once the
+  response is ready; the plan is appended to a rotating log file
+  (QUERY_INSPECTOR_LOG_PATH) with the view name, the request and the
+  timing. Only SELECTs are explained: EXPLAIN ANALYZE executes the
+  statement.
+
+Disabled unless QUERY_INSPECTOR_ENABLED: EXPLAIN ANALYZE doubles the cost of
+the slow queries, which production doesn't need to pay.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# Statements that are not worth grouping: transaction control repeats by design.
+_IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT', 'ROLLBACK')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,)*\s*(?:%s|\?)\s*\)', re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r'%s')
+
+_explain_logger = None
+
+
+class RepeatedQueriesError(AssertionError):
+    """Raised (QUERY_INSPECTOR_RAISE) when a request repeats the same SQL shape past the threshold."""
+
+
+def normalize_sql(sql):
+    """The shape of a statement: literals and placeholders as ?, IN lists of any length as IN (...)."""
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _PLACEHOLDER_RE.sub('?', shape)
+    return _IN_LIST_RE.sub('IN (...)', shape)
+
+
+def repeated_shapes(statements, threshold):
+    """[(count, shape)] of the shapes among `statements` (SQL strings) seen more than `threshold` times."""
+    shapes = Counter(
+        normalize_sql(sql) for sql in statements if not sql.lstrip().upper().startswith(_IGNORED_PREFIXES)
+    )
+    return [(count, shape) for shape, count in shapes.most_common() if count > threshold]
+
+
+class _Recorder:
+    """connection.execute_wrapper() hook keeping the SQL of one request and its slow SELECTs."""
+
+    def __init__(self, alias, slow_seconds):
+        self.alias = alias
+        self.slow_seconds = slow_seconds
+        self.statements = []
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.statements.append(sql)
+            if duration >= self.slow_seconds and not many and sql.lstrip()[:6].upper() == 'SELECT':
+                self.slow.append((sql, params, duration))
+
+
+def _get_explain_logger():
+    global _explain_logger
+    if _explain_logger is None:
+        path = Path(settings.QUERY_INSPECTOR_LOG_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        explain_logger = logging.getLogger(f'{__name__}.explain')
+        explain_logger.addHandler(handler)
+        explain_logger.setLevel(logging.INFO)
+        explain_logger.propagate = False
+        _explain_logger = explain_logger
+    return _explain_logger
+
+
+def explain(alias, sql, params):
+    """Plan of a SELECT as text: EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL, the backend's EXPLAIN elsewhere."""
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        prefix = connection.ops.explain_query_prefix(analyze=True, buffers=True)
+    else:
+        prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+class QueryInspectorMiddleware:
+    """Report repeated SQL shapes (N+1) and log the plans of slow queries (development and staging)."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSPECTOR_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_seconds = settings.QUERY_INSPECTOR_SLOW_MS / 1000
+        recorders = [_Recorder(alias, slow_seconds) for alias in settings.DATABASES]
+        with ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(connections[recorder.alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name or match.route) if match else 'unmatched'
+        for recorder in recorders:
+            for sql, params, duration in recorder.slow:
+                self._log_plan(request, view_name, recorder.alias, sql, params, duration)
+
+        statements = [sql for recorder in recorders for sql in recorder.statements]
+        repeated = repeated_shapes(statements, settings.QUERY_INSPECTOR_REPEAT_THRESHOLD)
+        if repeated:
+            report = '\n'.join(f'  {count}x {shape}' for count, shape in repeated)
+            message = (
+                f'{request.method} {request.get_full_path()} ({view_name}) repeated queries '
+                f'(threshold {settings.QUERY_INSPECTOR_REPEAT_THRESHOLD}):\n{report}'
+            )
+            if settings.QUERY_INSPECTOR_RAISE:
+                raise RepeatedQueriesError(message)
+            logger.warning(message)
+        return response
+
+    def _log_plan(self, request, view_name, alias, sql, params, duration):
+        try:
+            plan = explain(alias, sql, params)
+        except DatabaseError as exc:
+            plan = f'(EXPLAIN failed: {exc})'
+        _get_explain_logger().info(
+            '%s %s %s %s %.1f ms\n%s\nparams: %r\n%s\n%s',
+            timezone.now().isoformat(), view_name, request.method, request.get_full_path(), duration * 1000,
+            sql, params, plan, '-' * 80,
+        )
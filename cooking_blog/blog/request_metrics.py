@@ -0,0 +1,149 @@
+"""
+Per-request metrics (RequestMetricsMiddleware).
+
+For each measured request the middleware records:
+
+- the number of SQL queries and the time spent in them (all database aliases);
+- view time: from the start of the view until it returns its response;
+- render time: the deferred rendering of DRF/template responses, i.e. the
+  JSON encoding of the serializer data;
+- the total time and the response size in bytes (Content-Length for
+  streamed files).
+
+Each measured request is written as one JSON line at INFO on the
+`blog.request_metrics` logger:
+
+    {"method": "GET", "path": "/api/recipes/", "route": "recipe-list", "status": 200,
+     "total_ms": 12.4, "view_ms": 9.1, "render_ms": 1.2, "db_queries": 4, "db_ms": 5.3,
+     "response_bytes": 8123, "user_id": null}
+
+Staff users and requests carrying the X-Debug-Token header (equal to
+REQUEST_METRICS_DEBUG_TOKEN) also get the numbers back in a `Server-Timing`
+header, which browser dev tools show in the network panel.
+
+Only a random REQUEST_METRICS_SAMPLE_RATE share of the requests is measured
+(plus every request with the debug token); the others pass straight through.
+Times of streamed responses stop when the response is returned, before the
+body is sent.
+"""
+import hmac
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEBUG_TOKEN_HEADER = 'HTTP_X_DEBUG_TOKEN'
+
+
+class _Measurement:
+    """Timers and SQL counters of one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view_start = None
+        self.view_end = None
+        self.render_end = None
+        self.db_queries = 0
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook: time every query of the request.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.db_queries += 1
+
+    def rendered(self, response):
+        self.render_end = time.perf_counter()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _has_debug_token(request):
+    token = getattr(settings, 'REQUEST_METRICS_DEBUG_TOKEN', '')
+    sent = request.META.get(DEBUG_TOKEN_HEADER, '')
+    return bool(token) and bool(sent) and hmac.compare_digest(sent.encode(), token.encode())
+
+
+def _response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+class RequestMetricsMiddleware:
+    """Measure a sample of the requests, log them as JSON and add Server-Timing for staff."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        debug_token = _has_debug_token(request)
+        if not debug_token and random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        measurement = request._request_metrics = _Measurement()
+        with ExitStack() as stack:
+            for alias in settings.DATABASES:
+                stack.enter_context(connections[alias].execute_wrapper(measurement))
+            response = self.get_response(request)
+        end = time.perf_counter()
+
+        metrics = self._metrics(request, response, measurement, end)
+        user = getattr(request, 'user', None)
+        if debug_token or (user is not None and user.is_staff):
+            response['Server-Timing'] = self._server_timing(metrics)
+        logger.info(json.dumps(metrics, separators=(',', ':')))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        measurement = getattr(request, '_request_metrics', None)
+        if measurement is not None:
+            measurement.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        measurement = getattr(request, '_request_metrics', None)
+        if measurement is not None:
+            measurement.view_end = time.perf_counter()
+            response.add_post_render_callback(measurement.rendered)
+        return response
+
+    def _metrics(self, request, response, measurement, end):
+        view_start = measurement.view_start
+        view_end = measurement.view_end or end
+        user = getattr(request, 'user', None)
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': _ms(end - measurement.start),
+            'view_ms': _ms(view_end - view_start) if view_start is not None else None,
+            'render_ms': (
+                _ms(measurement.render_end - measurement.view_end) if measurement.render_end is not None else None
+            ),
+            'db_queries': measurement.db_queries,
+            'db_ms': _ms(measurement.db_time),
+            'response_bytes': _response_size(response),
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+        }
+
+    def _server_timing(self, metrics):
+        entries = [f'db;dur={metrics["db_ms"]};desc="{metrics["db_queries"]} queries"']
+        if metrics['view_ms'] is not None:
+            entries.append(f'view;dur={metrics["view_ms"]}')
+        if metrics['render_ms'] is not None:
+            entries.append(f'render;dur={metrics["render_ms"]}')
+        entries.append(f'total;dur={metrics["total_ms"]}')
+        return ', '.join(entries)
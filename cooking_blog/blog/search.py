@@ -0,0 +1,174 @@
+"""
+Full-text search for recipes.
+
+Each recipe has a RecipeSearchDocument row holding accent-folded, lowercased
+text (title, ingredient names, category, author display name, description),
+kept current by the signal handlers in blog.signals. The matching index is
+database specific and created by migration 0015:
+
+- PostgreSQL: a generated, weighted `tsvector` column using the Italian
+  configuration (GIN indexed) plus a trigram GIN index on title/ingredients,
+  used as a fallback for typos ("malloredus" -> "malloreddus").
+- SQLite: an FTS5 table kept in sync by triggers, with bm25 ranking and
+  prefix matching on a light Italian stem, so local and test runs behave
+  like production.
+
+Results are ranked by relevance through the `search_rank` annotation.
+"""
+import re
+import unicodedata
+from functools import partial
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from .models import Recipe, RecipeSearchDocument
+
+DOCUMENT_TABLE = 'blog_recipesearchdocument'
+FTS_TABLE = 'blog_recipesearch_fts'
+
+# Relative weights of the document fields: title > ingredients > category/author > description
+SQLITE_BM25_WEIGHTS = (10.0, 5.0, 2.0, 2.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+')
+_STEM_SUFFIX_RE = re.compile(r'[aeiouys]{1,2}$')
+
+
+def fold(text):
+    """Casefold and strip accents/apostrophes so 'Seadas’' and 'seadas' index the same way."""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return re.sub(r"['’`]", ' ', stripped).casefold()
+
+
+def tokenize(query):
+    """Search terms of a query; single letters (elided articles like l', d') are dropped."""
+    return [token for token in _TOKEN_RE.findall(fold(query)) if len(token) > 1]
+
+
+def _light_stem(token):
+    """Drop a short Italian/Sardinian inflection ending (malloreddus -> malloredd) for prefix matching."""
+    if len(token) <= 4:
+        return token
+    return _STEM_SUFFIX_RE.sub('', token) or token
+
+
+# Index maintenance
+
+def build_document(recipe):
+    """Return an unsaved RecipeSearchDocument for a recipe (author and ingredients should be preloaded)."""
+    return RecipeSearchDocument(
+        recipe=recipe,
+        title=fold(recipe.title),
+        ingredients=fold(' '.join(ingredient.name for ingredient in recipe.ingredients.all())),
+        category=fold(recipe.category),
+        author=fold(recipe.author.display_name),
+        description=fold(recipe.description),
+    )
+
+
+def index_recipes(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """(Re)build the search documents of the given recipes in one upsert."""
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return 0
+    recipes = (
+        Recipe.objects.using(using)
+        .filter(pk__in=recipe_ids)
+        .select_related('author')
+        .prefetch_related('ingredients')
+    )
+    documents = [build_document(recipe) for recipe in recipes]
+    RecipeSearchDocument.objects.using(using).bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['recipe'],
+        update_fields=['title', 'ingredients', 'category', 'author', 'description', 'updated_at'],
+    )
+    return len(documents)
+
+
+def schedule_index(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Reindex recipes once the current transaction commits (immediately in autocommit).
+    Ids scheduled several times in one transaction (recipe + each ingredient) are indexed once.
+    """
+    connection = connections[using]
+    pending = getattr(connection, '_recipe_search_pending', None)
+    if pending is None:
+        pending = connection._recipe_search_pending = set()
+    pending.update(recipe_ids)
+    transaction.on_commit(partial(_flush_pending, using), using=using, robust=True)
+
+
+def _flush_pending(using):
+    pending = connections[using]._recipe_search_pending
+    recipe_ids = set(pending)
+    pending.clear()
+    index_recipes(recipe_ids, using=using)
+
+
+# Querying
+
+def search_recipes(queryset, query):
+    """Filter `queryset` to recipes matching `query`, annotated with `search_rank` (higher is better)."""
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _search_postgresql(queryset, tokens)
+    if vendor == 'sqlite':
+        return _search_sqlite(queryset, tokens)
+    return _search_fallback(queryset, tokens)
+
+
+def _search_postgresql(queryset, tokens):
+    # Prefix match on every stemmed term (as-you-type), or trigram word similarity for typos.
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    phrase = ' '.join(tokens)
+    table = queryset.model._meta.db_table
+    matches = RawSQL(
+        f"SELECT d.recipe_id FROM {DOCUMENT_TABLE} d "
+        f"WHERE d.vector @@ to_tsquery('italian', %s) "
+        f"OR %s <%% (d.title || ' ' || d.ingredients)",
+        [tsquery, phrase],
+    )
+    rank = RawSQL(
+        f"SELECT ts_rank(d.vector, to_tsquery('italian', %s)) "
+        f"+ 0.1 * word_similarity(%s, d.title || ' ' || d.ingredients) "
+        f"FROM {DOCUMENT_TABLE} d WHERE d.recipe_id = {table}.id",
+        [tsquery, phrase],
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+def _search_sqlite(queryset, tokens):
+    match = ' '.join(f'"{_light_stem(token)}"*' for token in tokens)
+    weights = ', '.join(str(weight) for weight in SQLITE_BM25_WEIGHTS)
+    table = queryset.model._meta.db_table
+    matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    # bm25() is lower-is-better; negate it so search_rank sorts like the PostgreSQL rank.
+    rank = RawSQL(
+        f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+        [match],
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+def _search_fallback(queryset, tokens):
+    """Other databases: substring match on the folded document, no ranking."""
+    condition = Q()
+    for token in tokens:
+        condition &= (
+            Q(search_document__title__contains=token)
+            | Q(search_document__ingredients__contains=token)
+            | Q(search_document__category__contains=token)
+            | Q(search_document__author__contains=token)
+            | Q(search_document__description__contains=token)
+        )
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
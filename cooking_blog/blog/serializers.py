@@ -1,7 +1,12 @@
+from collections import defaultdict
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from django.utils.text import Truncator
 from .models import User, Recipe, Ingredient, Instruction, StoryPost, RecipeReport
-from .content_moderation import contains_inappropriate_content
+from .content_moderation import contains_inappropriate_content, moderate_fields
+from .images import variant_srcset
+from .search import schedule_index
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -54,6 +59,52 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'display_name', 'is_redazione', 'date_joined', 'is_active')
 
 
+class RecipeAuthorSerializer(serializers.ModelSerializer):
+    """Public author info embedded in recipe cards (no email or account dates)."""
+    display_name = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = User
+        fields = ('id', 'name', 'display_name', 'is_redazione')
+        read_only_fields = fields
+
+
+class SparseFieldsetMixin:
+    """Let clients ask for a subset of fields with ?fields=id,title,slug (unknown names are ignored)."""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        query_params = getattr(request, 'query_params', None)
+        requested = query_params.get('fields') if query_params is not None else None
+        if requested:
+            wanted = {name.strip() for name in requested.split(',') if name.strip()}
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class LikedStateMixin:
+    """is_liked for the request user, from the page-wide liked set when the view provides one."""
+    
+    def get_is_liked(self, obj):
+        """Check if the current user has liked this recipe."""
+        liked_recipe_ids = self.context.get('liked_recipe_ids')
+        if liked_recipe_ids is not None:
+            # Resolved for the whole page by the view (see LikedRecipesMixin)
+            return obj.pk in liked_recipe_ids
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return obj.recipe_likes.filter(user=request.user).exists()
+        return False
+
+
+class ImageSrcsetMixin:
+    """image_srcset: resized WebP/JPEG variants of the image, or null until they have been generated."""
+    
+    def get_image_srcset(self, obj):
+        return variant_srcset(obj, self.context.get('request'))
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     """Serializer for ingredients."""
     
@@ -72,12 +123,13 @@ class InstructionSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(ImageSrcsetMixin, LikedStateMixin, serializers.ModelSerializer):
     """Serializer for recipe details."""
     author = UserSerializer(read_only=True)
     ingredients = IngredientSerializer(many=True, read_only=True)
     instructions = InstructionSerializer(many=True, read_only=True)
     image = serializers.ImageField(required=False, allow_null=True)
+    image_srcset = serializers.SerializerMethodField()
     likes_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
     
@@ -85,21 +137,114 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'slug', 'title', 'description', 'final_comment', 'category', 'prep_time',
-            'author', 'image', 'gluten_free', 'lactose_free', 'is_sardinian',
+            'author', 'image', 'image_srcset', 'gluten_free', 'lactose_free', 'is_sardinian',
             'created_at', 'updated_at', 'is_published',
             'ingredients', 'instructions', 'likes_count', 'is_liked'
         )
-        read_only_fields = ('id', 'slug', 'author', 'created_at', 'updated_at', 'likes_count', 'is_liked')
+        read_only_fields = ('id', 'slug', 'author', 'image_srcset', 'created_at', 'updated_at', 'likes_count', 'is_liked')
+
+
+class RecipeCardSerializer(SparseFieldsetMixin, ImageSrcsetMixin, LikedStateMixin, serializers.ModelSerializer):
+    """Compact recipe for list pages: no ingredients, instructions or final comment, truncated description."""
+    DESCRIPTION_MAX_CHARS = 200
+    # Columns to load with .only(); keep in sync with Meta.fields.
+    QUERYSET_FIELDS = (
+        'id', 'slug', 'title', 'description', 'category', 'prep_time', 'image', 'image_variants',
+        'gluten_free', 'lactose_free', 'is_sardinian', 'is_featured', 'is_published',
+        'created_at', 'likes_count',
+        'author__id', 'author__name', 'author__is_redazione',
+    )
+    author = RecipeAuthorSerializer(read_only=True)
+    description = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
     
-    def get_is_liked(self, obj):
-        """Check if the current user has liked this recipe."""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.recipe_likes.filter(user=request.user).exists()
-        return False
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'slug', 'title', 'description', 'category', 'prep_time', 'image', 'image_srcset',
+            'gluten_free', 'lactose_free', 'is_sardinian', 'is_featured', 'is_published',
+            'created_at', 'likes_count', 'is_liked', 'author'
+        )
+        read_only_fields = fields
+    
+    def get_description(self, obj):
+        return Truncator(obj.description).chars(self.DESCRIPTION_MAX_CHARS)
+
+
+def _recipe_lines(texts):
+    """(order, text) for the non-empty lines of a submitted ingredient/instruction list."""
+    return [(index, text.strip()) for index, text in enumerate(texts) if text and text.strip()]
+
+
+def create_recipe_lines(model, text_field, recipe, texts):
+    """Insert the ingredients or instructions of a new recipe with a single bulk INSERT."""
+    model.objects.bulk_create([
+        model(recipe=recipe, order=order, **{text_field: text})
+        for order, text in _recipe_lines(texts)
+    ])
+
 
+def sync_recipe_lines(model, text_field, recipe, texts):
+    """
+    Bring a recipe's ingredients or instructions in line with `texts` in a constant number of
+    queries: rows whose text is unchanged are kept (their order fixed if it moved), the remaining
+    rows are rewritten with the changed lines, and only the surplus is inserted or deleted.
+    """
+    existing = list(model.objects.filter(recipe=recipe).order_by('order', 'pk'))
+    rows_by_text = defaultdict(list)
+    for row in existing:
+        rows_by_text[getattr(row, text_field)].append(row)
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+    to_update = []
+    unmatched = []
+    for order, text in _recipe_lines(texts):
+        if rows_by_text[text]:
+            row = rows_by_text[text].pop(0)
+            if row.order != order:
+                row.order = order
+                to_update.append(row)
+        else:
+            unmatched.append((order, text))
+    spare_rows = [row for rows in rows_by_text.values() for row in rows]
+    spare_rows.sort(key=lambda row: (row.order, row.pk))
+
+    for row, (order, text) in zip(spare_rows, unmatched):
+        row.order = order
+        setattr(row, text_field, text)
+        to_update.append(row)
+    to_create = [model(recipe=recipe, order=order, **{text_field: text}) for order, text in unmatched[len(spare_rows):]]
+    to_delete = [row.pk for row in spare_rows[len(unmatched):]]
+
+    if to_update:
+        model.objects.bulk_update(to_update, ['order', text_field])
+    if to_create:
+        model.objects.bulk_create(to_create)
+    if to_delete:
+        model.objects.filter(pk__in=to_delete).delete()
+
+
+class RecipeModerationMixin:
+    """Moderate every user-written field of a recipe payload in one pass (see blog.content_moderation)."""
+    MODERATED_FIELDS = {
+        'title': 'Il titolo contiene espressioni non consentite. Modifica il testo e riprova.',
+        'description': 'La descrizione contiene espressioni non consentite. Modifica il testo e riprova.',
+        'ingredients': 'Uno o più ingredienti contengono espressioni non consentite.',
+        'instructions': 'Una o più istruzioni contengono espressioni non consentite.',
+    }
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        # Only the fields present in the payload (partial updates send a subset)
+        matches = moderate_fields({field: attrs[field] for field in self.MODERATED_FIELDS if field in attrs})
+        if matches:
+            raise serializers.ValidationError({
+                match.field: self.MODERATED_FIELDS[match.field] for match in matches
+            })
+        return attrs
+
+
+class RecipeCreateSerializer(RecipeModerationMixin, serializers.ModelSerializer):
     """Serializer for creating recipes."""
     ingredients = serializers.ListField(
         child=serializers.CharField(),
@@ -124,34 +269,6 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 )
         return value
 
-    def validate_title(self, value):
-        if contains_inappropriate_content(value):
-            raise serializers.ValidationError(
-                'Il titolo contiene espressioni non consentite. Modifica il testo e riprova.'
-            )
-        return value
-
-    def validate_description(self, value):
-        if contains_inappropriate_content(value):
-            raise serializers.ValidationError(
-                'La descrizione contiene espressioni non consentite. Modifica il testo e riprova.'
-            )
-        return value
-
-    def validate(self, attrs):
-        ingredients = attrs.get('ingredients', [])
-        instructions = attrs.get('instructions', [])
-        for i, text in enumerate(ingredients):
-            if text and contains_inappropriate_content(text):
-                raise serializers.ValidationError({
-                    'ingredients': 'Uno o più ingredienti contengono espressioni non consentite.'
-                })
-        for i, text in enumerate(instructions):
-            if text and contains_inappropriate_content(text):
-                raise serializers.ValidationError({
-                    'instructions': 'Una o più istruzioni contengono espressioni non consentite.'
-                })
-        return attrs
     
     class Meta:
         model = Recipe
@@ -171,33 +288,22 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         
         # Set the author from the request user
         author = self.context['request'].user
-        recipe = Recipe.objects.create(
-            author=author,
-            **validated_data
-        )
-        
-        # Create ingredients
-        for index, ingredient_name in enumerate(ingredients_data):
-            if ingredient_name and ingredient_name.strip():  # Only create if not empty
-                Ingredient.objects.create(
-                    recipe=recipe,
-                    name=ingredient_name.strip(),
-                    order=index
-                )
-        
-        # Create instructions
-        for index, instruction_step in enumerate(instructions_data):
-            if instruction_step and instruction_step.strip():  # Only create if not empty
-                Instruction.objects.create(
-                    recipe=recipe,
-                    step=instruction_step.strip(),
-                    order=index
-                )
+        # All or nothing: a failure must not leave a recipe without its ingredients or steps
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                author=author,
+                **validated_data
+            )
+            # Empty lines are skipped
+            create_recipe_lines(Ingredient, 'name', recipe, ingredients_data)
+            create_recipe_lines(Instruction, 'step', recipe, instructions_data)
+            # Bulk writes send no signals: reindex explicitly (once, after commit)
+            schedule_index([recipe.pk])
         
         return recipe
 
 
-class RecipeUpdateSerializer(serializers.ModelSerializer):
+class RecipeUpdateSerializer(RecipeModerationMixin, serializers.ModelSerializer):
     """Serializer for updating recipes."""
     ingredients = serializers.ListField(
         child=serializers.CharField(),
@@ -222,36 +328,6 @@ class RecipeUpdateSerializer(serializers.ModelSerializer):
                 )
         return value
 
-    def validate_title(self, value):
-        if contains_inappropriate_content(value):
-            raise serializers.ValidationError(
-                'Il titolo contiene espressioni non consentite. Modifica il testo e riprova.'
-            )
-        return value
-
-    def validate_description(self, value):
-        if contains_inappropriate_content(value):
-            raise serializers.ValidationError(
-                'La descrizione contiene espressioni non consentite. Modifica il testo e riprova.'
-            )
-        return value
-
-    def validate(self, attrs):
-        ingredients = attrs.get('ingredients')
-        instructions = attrs.get('instructions')
-        if ingredients is not None:
-            for text in ingredients:
-                if text and contains_inappropriate_content(text):
-                    raise serializers.ValidationError({
-                        'ingredients': 'Uno o più ingredienti contengono espressioni non consentite.'
-                    })
-        if instructions is not None:
-            for text in instructions:
-                if text and contains_inappropriate_content(text):
-                    raise serializers.ValidationError({
-                        'instructions': 'Una o più istruzioni contengono espressioni non consentite.'
-                    })
-        return attrs
     
     class Meta:
         model = Recipe
@@ -264,36 +340,19 @@ class RecipeUpdateSerializer(serializers.ModelSerializer):
         ingredients_data = validated_data.pop('ingredients', None)
         instructions_data = validated_data.pop('instructions', None)
         
-        # Update basic fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        
-        # Update ingredients if provided
-        if ingredients_data is not None:
-            # Delete existing ingredients
-            instance.ingredients.all().delete()
-            # Create new ingredients
-            for index, ingredient_name in enumerate(ingredients_data):
-                if ingredient_name and ingredient_name.strip():
-                    Ingredient.objects.create(
-                        recipe=instance,
-                        name=ingredient_name.strip(),
-                        order=index
-                    )
-        
-        # Update instructions if provided
-        if instructions_data is not None:
-            # Delete existing instructions
-            instance.instructions.all().delete()
-            # Create new instructions
-            for index, instruction_step in enumerate(instructions_data):
-                if instruction_step and instruction_step.strip():
-                    Instruction.objects.create(
-                        recipe=instance,
-                        step=instruction_step.strip(),
-                        order=index
-                    )
+        with transaction.atomic():
+            # Update basic fields (always saved: bumps updated_at, which the ETags rely on)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+            
+            # Update ingredients/instructions if provided, touching only the lines that changed
+            if ingredients_data is not None:
+                sync_recipe_lines(Ingredient, 'name', instance, ingredients_data)
+            if instructions_data is not None:
+                sync_recipe_lines(Instruction, 'step', instance, instructions_data)
+            # Bulk writes send no signals: reindex explicitly (once, after commit)
+            schedule_index([instance.pk])
         
         return instance
 
@@ -315,15 +374,16 @@ class RecipeReportSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'user', 'recipe', 'created_at')
 
 
-class StoryPostSerializer(serializers.ModelSerializer):
+class StoryPostSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     """Serializer for story posts."""
     author = UserSerializer(read_only=True)
     image = serializers.ImageField(required=False, allow_null=True)
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = StoryPost
         fields = (
-            'id', 'title', 'content', 'author', 'image', 'role',
+            'id', 'title', 'content', 'author', 'image', 'image_srcset', 'role',
             'created_at', 'updated_at', 'is_published'
         )
-        read_only_fields = ('id', 'author', 'created_at', 'updated_at')
\ No newline at end of file
+        read_only_fields = ('id', 'author', 'image_srcset', 'created_at', 'updated_at')
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Signal handlers keeping derived data (search documents, response cache and sitemap
+generations, category counts, image variants, publication metrics) in sync with the models. Connected in
+BlogConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from . import cache, category_counts, images, metrics
+from .models import User, Recipe, Ingredient, RecipeLike, RecipeReport, StoryPost
+from .search import schedule_index
+
+# User fields that appear in a recipe's search document (via display_name)
+_USER_SEARCH_FIELDS = {'name', 'is_redazione'}
+# Recipe fields that decide whether and where a recipe is counted in RecipeCategoryCount
+_RECIPE_COUNT_FIELDS = {'category', 'is_published', 'is_hidden'}
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='blog_recipe_search_index')
+def reindex_recipe(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    schedule_index([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Ingredient, dispatch_uid='blog_ingredient_saved_search_index')
+@receiver(post_delete, sender=Ingredient, dispatch_uid='blog_ingredient_deleted_search_index')
+def reindex_ingredient_recipe(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    schedule_index([instance.recipe_id], using=using)
+
+
+@receiver(post_save, sender=User, dispatch_uid='blog_user_search_index')
+def reindex_author_recipes(sender, instance, created=False, raw=False, using=None, update_fields=None, **kwargs):
+    # Logins save last_login only: skip unless the display name may have changed.
+    if raw or created or (update_fields is not None and not _USER_SEARCH_FIELDS & set(update_fields)):
+        return
+    recipe_ids = list(Recipe.objects.using(using).filter(author=instance).values_list('pk', flat=True))
+    if recipe_ids:
+        schedule_index(recipe_ids, using=using)
+        cache.bump_generation(cache.RECIPES)
+    if StoryPost.objects.using(using).filter(author=instance).exists():
+        cache.bump_generation(cache.STORIES)
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='blog_recipe_saved_sitemap')
+@receiver(post_delete, sender=Recipe, dispatch_uid='blog_recipe_deleted_sitemap')
+@receiver(post_save, sender=StoryPost, dispatch_uid='blog_story_saved_sitemap')
+@receiver(post_delete, sender=StoryPost, dispatch_uid='blog_story_deleted_sitemap')
+def invalidate_sitemap(sender, raw=False, **kwargs):
+    if not raw:
+        cache.bump_generation(cache.SITEMAP)
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='blog_recipe_saved_cache')
+@receiver(post_delete, sender=Recipe, dispatch_uid='blog_recipe_deleted_cache')
+@receiver(post_save, sender=RecipeLike, dispatch_uid='blog_like_saved_cache')
+@receiver(post_delete, sender=RecipeLike, dispatch_uid='blog_like_deleted_cache')
+@receiver(post_save, sender=RecipeReport, dispatch_uid='blog_report_saved_cache')
+@receiver(post_delete, sender=RecipeReport, dispatch_uid='blog_report_deleted_cache')
+def invalidate_recipe_responses(sender, raw=False, **kwargs):
+    if not raw:
+        cache.bump_generation(cache.RECIPES)
+
+
+@receiver(post_save, sender=StoryPost, dispatch_uid='blog_story_saved_cache')
+@receiver(post_delete, sender=StoryPost, dispatch_uid='blog_story_deleted_cache')
+def invalidate_story_responses(sender, raw=False, **kwargs):
+    if not raw:
+        cache.bump_generation(cache.STORIES)
+
+
+@receiver(pre_save, sender=Recipe, dispatch_uid='blog_recipe_category_count_before')
+def remember_counted_category(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    instance._counted_category_before = None
+    instance._was_published = False
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not _RECIPE_COUNT_FIELDS & set(update_fields):
+        instance._counted_category_before = category_counts.counted_category(instance)
+        instance._was_published = instance.is_published
+        return
+    previous = (
+        Recipe.objects.using(using)
+        .filter(pk=instance.pk)
+        .values_list('category', 'is_published', 'is_hidden')
+        .first()
+    )
+    if previous is not None:
+        category, is_published, is_hidden = previous
+        instance._was_published = is_published
+        if update_fields is not None and 'is_hidden' not in update_fields:
+            # Not written by this save (see Recipe.COUNTER_FIELDS): the row's value is the one that stays.
+            instance.is_hidden = is_hidden
+        if category_counts.is_visible(is_published, is_hidden):
+            instance._counted_category_before = category
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='blog_recipe_category_count_after')
+def update_category_count(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    category_counts.move(
+        getattr(instance, '_counted_category_before', None),
+        category_counts.counted_category(instance),
+    )
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='blog_recipe_published_metric')
+def count_published_recipe(sender, instance, raw=False, using=None, **kwargs):
+    if not raw and instance.is_published and not getattr(instance, '_was_published', True):
+        transaction.on_commit(metrics.RECIPES_PUBLISHED.inc, using=using)
+
+
+@receiver(post_delete, sender=Recipe, dispatch_uid='blog_recipe_category_count_deleted')
+def uncount_deleted_recipe(sender, instance, **kwargs):
+    category_counts.adjust(category_counts.counted_category(instance), -1)
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='blog_recipe_image_variants')
+@receiver(post_save, sender=StoryPost, dispatch_uid='blog_story_image_variants')
+def generate_image_variants(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    images.schedule_variants(instance, using=using)
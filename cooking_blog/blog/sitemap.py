@@ -0,0 +1,238 @@
+"""
+Sitemap generation, split and cached on disk.
+
+`/api/sitemap.xml` is a sitemap index; the URLs themselves are in numbered
+child sitemaps (`sitemap-pages-1.xml`, `sitemap-recipes-1.xml`,
+`sitemap-recipes-2.xml`, ..., `sitemap-stories-1.xml`), each holding at most
+MAX_URLS entries, the protocol limit.
+
+The children are generated in one streaming pass over
+`values_list(...).iterator()` straight into gzip files, so memory stays flat
+however large the catalog. The files are kept in SITEMAP_CACHE_DIR under a
+version directory named after the 'sitemap' generation (see blog.cache), which
+is bumped only when a recipe or story is saved, deleted or hidden: crawler hits
+are served from disk and a new version is built on the first request after a
+change. The manifest of the version lists the children and their lastmod for
+the index.
+
+Workers don't agree on the current version at every instant (each reads the
+generation on its own), so a build doesn't delete the versions before it
+outright: the KEEP_VERSIONS most recent stay, and older ones only go once
+their files are VERSION_GRACE_SECONDS old. A version removed anyway while a
+request reads it is rebuilt (open_manifest, open_child).
+"""
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from xml.sax.saxutils import escape
+from django.conf import settings
+from . import metrics
+from .models import Recipe, StoryPost
+
+logger = logging.getLogger(__name__)
+
+MAX_URLS = 50000
+CHUNK_SIZE = 2000
+MANIFEST_NAME = 'manifest.json'
+# Versions kept besides the one just built, and the age past which older ones are removed
+KEEP_VERSIONS = 2
+VERSION_GRACE_SECONDS = 600
+SECTIONS = ('pages', 'recipes', 'stories')
+
+URLSET_OPEN = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = '</urlset>\n'
+
+# (path, changefreq, priority) of the frontend's static pages
+STATIC_PAGES = [
+    ('/', 'daily', '1.0'),
+    ('/recipes', 'daily', '0.9'),
+    ('/stories', 'weekly', '0.8'),
+    ('/privacy', 'monthly', '0.3'),
+    ('/terms', 'monthly', '0.3'),
+]
+
+
+def cache_dir():
+    return Path(settings.SITEMAP_CACHE_DIR)
+
+
+def _max_urls():
+    return getattr(settings, 'SITEMAP_MAX_URLS', MAX_URLS)
+
+
+def child_name(section, number):
+    return f'sitemap-{section}-{number}.xml'
+
+
+def _url_entry(loc, changefreq, priority, lastmod=None):
+    lines = ['  <url>', f'    <loc>{escape(loc)}</loc>']
+    if lastmod:
+        lines.append(f'    <lastmod>{lastmod.strftime("%Y-%m-%d")}</lastmod>')
+    lines.append(f'    <changefreq>{changefreq}</changefreq>')
+    lines.append(f'    <priority>{priority}</priority>')
+    lines.append('  </url>\n')
+    return '\n'.join(lines)
+
+
+def _section_entries(section, base_url):
+    """Yield (xml_entry, lastmod) for every URL of a section, streaming from the database."""
+    if section == 'pages':
+        for path, changefreq, priority in STATIC_PAGES:
+            yield _url_entry(f'{base_url}{path}', changefreq, priority), None
+    elif section == 'recipes':
+        rows = (
+            Recipe.objects.filter(is_published=True, is_hidden=False)
+            .order_by('id')
+            .values_list('slug', 'id', 'updated_at')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for slug, recipe_id, updated_at in rows:
+            yield _url_entry(f'{base_url}/recipe/{slug or recipe_id}', 'weekly', '0.8', updated_at), updated_at
+    elif section == 'stories':
+        rows = (
+            StoryPost.objects.filter(is_published=True)
+            .order_by('id')
+            .values_list('id', 'updated_at')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for story_id, updated_at in rows:
+            yield _url_entry(f'{base_url}/stories/{story_id}', 'monthly', '0.7', updated_at), updated_at
+
+
+def _write_section(directory, section, base_url):
+    """Write a section's child sitemaps (gzipped), rolling over every MAX_URLS entries."""
+    children = []
+    handle = None
+    count = 0
+    lastmod = None
+    try:
+        for entry, updated_at in _section_entries(section, base_url):
+            if handle is None or count == _max_urls():
+                if handle is not None:
+                    handle.write(URLSET_CLOSE)
+                    handle.close()
+                    children[-1]['lastmod'] = lastmod.isoformat() if lastmod else None
+                name = child_name(section, len(children) + 1)
+                handle = gzip.open(directory / f'{name}.gz', 'wt', encoding='utf-8')
+                handle.write(URLSET_OPEN)
+                children.append({'name': name})
+                count = 0
+                lastmod = None
+            handle.write(entry)
+            count += 1
+            if updated_at and (lastmod is None or updated_at > lastmod):
+                lastmod = updated_at
+        if handle is not None:
+            handle.write(URLSET_CLOSE)
+            children[-1]['lastmod'] = lastmod.isoformat() if lastmod else None
+    finally:
+        if handle is not None:
+            handle.close()
+    return children
+
+
+def build(version):
+    """Generate every child sitemap for `version`; returns its directory. Safe to race: the first build wins."""
+    root = cache_dir()
+    final_dir = root / version
+    if (final_dir / MANIFEST_NAME).exists():
+        return final_dir
+    root.mkdir(parents=True, exist_ok=True)
+    base_url = getattr(settings, 'FRONTEND_URL', 'https://sardegnaricette.it').rstrip('/')
+    tmp_dir = root / f'.{version}.{uuid.uuid4().hex}'
+    tmp_dir.mkdir()
+    try:
+        children = []
+        for section in SECTIONS:
+            children.extend(_write_section(tmp_dir, section, base_url))
+        (tmp_dir / MANIFEST_NAME).write_text(json.dumps({'children': children}))
+        try:
+            os.rename(tmp_dir, final_dir)
+        except OSError:
+            # Built concurrently by another request or worker
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logger.info("Sitemap version %s built (%d child sitemaps)", version, len(children))
+    _remove_old_versions(root, keep=version)
+    return final_dir
+
+
+def _remove_old_versions(root, keep):
+    """Remove the versions older than the KEEP_VERSIONS most recent, once past VERSION_GRACE_SECONDS."""
+    versions = []
+    for path in root.iterdir():
+        if path.is_dir() and path.name != keep and not path.name.startswith('.'):
+            try:
+                versions.append((path.stat().st_mtime, path))
+            except FileNotFoundError:  # removed by another worker
+                continue
+    versions.sort(reverse=True)
+    cutoff = time.time() - VERSION_GRACE_SECONDS
+    for mtime, path in versions[KEEP_VERSIONS:]:
+        if mtime < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def get_version_dir(version):
+    final_dir = cache_dir() / version
+    if (final_dir / MANIFEST_NAME).exists():
+        metrics.count_cache('sitemap', 'hit')
+        return final_dir
+    metrics.count_cache('sitemap', 'miss')
+    return build(version)
+
+
+def load_manifest(directory):
+    return json.loads((directory / MANIFEST_NAME).read_text())
+
+
+def open_manifest(version):
+    """Manifest of `version`, built if needed (and rebuilt if another worker removed it meanwhile)."""
+    try:
+        return load_manifest(get_version_dir(version))
+    except FileNotFoundError:
+        return load_manifest(get_version_dir(version))
+
+
+def render_index(manifest, child_url):
+    """Sitemap index XML; child_url(name) returns the absolute URL of a child sitemap."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for child in manifest['children']:
+        lines.append('  <sitemap>')
+        lines.append(f'    <loc>{escape(child_url(child["name"]))}</loc>')
+        if child.get('lastmod'):
+            lines.append(f'    <lastmod>{child["lastmod"]}</lastmod>')
+        lines.append('  </sitemap>')
+    lines.append('</sitemapindex>')
+    return '\n'.join(lines) + '\n'
+
+
+def open_child(version, section, number):
+    """
+    Binary file of a child sitemap of `version` (gzipped), or None if the version has no such child.
+    If another worker removed the version before the file could be opened, it is rebuilt once.
+    """
+    if section not in SECTIONS:
+        return None
+    for _ in range(2):
+        directory = get_version_dir(version)
+        try:
+            return open(directory / f'{child_name(section, number)}.gz', 'rb')
+        except FileNotFoundError:
+            if (directory / MANIFEST_NAME).exists():
+                return None  # the version is complete: there is no such child
+    return None
+
+
+def decompressed(handle, chunk_size=64 * 1024):
+    """Iterate over the XML of a child sitemap opened by open_child(), closing the file at the end."""
+    with handle, gzip.GzipFile(fileobj=handle, mode='rb') as xml:
+        while chunk := xml.read(chunk_size):
+            yield chunk
@@ -0,0 +1,36 @@
+"""
+Slug allocation for recipes.
+
+A title's slug is its slugified form, or `<base>-<n>` with the smallest free
+n >= 1 when that is taken. The taken suffixes are read with a single
+`slug LIKE '<base>%'` query instead of probing one candidate at a time, so a
+popular title ("Seadas", "Culurgiones") costs one round trip however many
+recipes share it.
+"""
+from django.utils.text import slugify
+
+DEFAULT_BASE = 'recipe'
+# Room left under SlugField(max_length=255) for a '-<n>' suffix
+MAX_BASE_LENGTH = 240
+
+
+def slug_base(text):
+    """Normalized slug base for a title (or an existing slug)."""
+    base = slugify(text or '')[:MAX_BASE_LENGTH].strip('-')
+    return base or DEFAULT_BASE
+
+
+def next_free_slug(base, taken):
+    """Smallest of `base`, `base-1`, `base-2`, ... that is not in the set `taken`."""
+    if base not in taken:
+        return base
+    n = 1
+    while f'{base}-{n}' in taken:
+        n += 1
+    return f'{base}-{n}'
+
+
+def allocate_slug(queryset, base):
+    """Free slug for `base` among the rows of `queryset`, in one query."""
+    taken = set(queryset.filter(slug__startswith=base).values_list('slug', flat=True))
+    return next_free_slug(base, taken)
@@ -0,0 +1,45 @@
+"""
+Content-addressed storage for uploaded images.
+
+Uploads are saved as `<upload_to>/<sha256 prefix>.<ext>`, so a media URL
+always refers to the same bytes: serve_media can send it with a year-long
+`immutable` Cache-Control (see blog/media.py), and its variants and resizes
+inherit the property. Uploading a file that is already stored reuses it.
+"""
+import hashlib
+import posixpath
+import re
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 20
+_HASHED_NAME_RE = re.compile(rf'^[0-9a-f]{{{HASH_LENGTH}}}(\.[A-Za-z0-9]+)?$')
+
+
+def is_content_hashed(name):
+    """True if the media file `name` is, or is derived from (variants), a content-hashed upload."""
+    return any(_HASHED_NAME_RE.match(part) for part in name.split('/'))
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage (MEDIA_ROOT) that names files after a hash of their content."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(directory, digest.hexdigest()[:HASH_LENGTH] + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+def media_storage():
+    """Storage of the image fields (a callable, so migrations don't serialize the instance)."""
+    return HashedFileSystemStorage()
@@ -1,3 +1,1202 @@
-from django.test import TestCase
+import base64
+import gzip
+import importlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from django.apps import apps as django_apps
+from django.core.cache import cache as django_cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import cache as blog_cache, category_counts, like_buffer, sitemap as sitemaps
+from .content_moderation import contains_inappropriate_content, find_match, moderate_fields
+from .images import FORMATS, RESIZE_CACHE_DIR
+from .serializers import RecipeUpdateSerializer, create_recipe_lines, sync_recipe_lines
+from .search import index_recipes, search_recipes
+from .slugs import allocate_slug, next_free_slug
+from .query_inspector import QueryInspectorMiddleware, RepeatedQueriesError, normalize_sql
+from .models import Ingredient, Instruction, Recipe, RecipeLike, RecipeReport, RecipeSearchDocument, StoryPost, User
 
-# Create your tests here.
+
+class ContentModerationTests(SimpleTestCase):
+    def test_clean_recipe_text_passes(self):
+        for text in ['Culurgiones di patate', 'Seadas al miele', "Penne all'arrabbiata", 'Pane carasau', '']:
+            self.assertFalse(contains_inappropriate_content(text), text)
+
+    def test_quantities_are_not_leetspeak(self):
+        for text in [
+            'Cuocere 5 e g di burro', '5 e g forno', 'Tagliare a cubetti 3 x 2 cm', '200 g di semola, 1 e 5 g di sale',
+            'Aggiungere 4 e 5 pezzi di lardo', '9 e 4 uova', 'Forno a 180 gradi per 35 minuti',
+        ]:
+            self.assertIsNone(find_match(text), text)
+        # Digits inside words are still leetspeak
+        self.assertEqual(find_match('s3ga'), ('seg*', 'explicit'))
+        self.assertEqual(find_match('5eg4'), ('seg*', 'explicit'))
+
+    def test_normalization_catches_evasions(self):
+        for text in ['CAZZÒ', 'c.a.z.z.o', 'c a z z o', 's_t_r_o_n_z_o', 'm3rda', 'vaffanc*lo', 'cazzzzzo']:
+            self.assertTrue(contains_inappropriate_content(text), text)
+
+    def test_batch_reports_field_and_term(self):
+        matches = moderate_fields({
+            'title': 'Seadas',
+            'ingredients': ['farina', 'm e r d a'],
+            'instructions': ['Impastare', 'idiota chi legge'],
+        })
+        self.assertEqual(
+            [(m.field, m.index, m.term) for m in matches],
+            [('ingredients', 1, 'merd*'), ('instructions', 1, 'idiot*')],
+        )
+
+    def test_pathological_input_runs_in_linear_time(self):
+        # Letters drowned in separators used to make the `[\W_]*` evasion regexes backtrack.
+        def timed(size):
+            text = ('c' + '._-' * 8) * (size // 25) + ('c.a.z.z.' + '!' * 20) * (size // 28)
+            started = time.perf_counter()
+            self.assertIsNone(find_match(text))
+            return time.perf_counter() - started
+
+        timed(1000)  # warm up
+        small, large = timed(20000), timed(200000)
+        self.assertLess(large, 2.0)
+        # 10x the input may cost at most ~10x the time (with slack for timer noise), not 100x.
+        self.assertLess(large, max(small, 0.001) * 30)
+
+
+@override_settings(SITEMAP_CACHE_DIR=tempfile.mkdtemp(prefix='blog-tests-sitemap-'), LIKE_WRITE_BEHIND=False)
+class QueryBudgetTests(APITestCase):
+    """
+    Each endpoint runs in a fixed number of queries (after-commit work included), with 1 or 100
+    items on the page, in the recipe or in the request: a row-dependent count means an N+1.
+    """
+    SIZES = (1, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        cls.reader = User.objects.create_user('lettore@example.com', 'Lettore', 'password-123')
+
+    def setUp(self):
+        django_cache.clear()
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def make_recipes(self, count, author=None, lines=3):
+        """`count` published recipes, each with `lines` ingredients and instructions and a like by the reader."""
+        start = Recipe.objects.count()
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                title=f'Culurgiones {start + i}', slug=f'culurgiones-{start + i}', description='Ravioli di patate',
+                category='Pasta Dishes', prep_time=60, author=author or self.author, likes_count=1,
+            )
+            for i in range(count)
+        ])
+        Ingredient.objects.bulk_create(
+            [Ingredient(recipe=recipe, name=f'Ingrediente {n}', order=n) for recipe in recipes for n in range(lines)]
+        )
+        Instruction.objects.bulk_create(
+            [Instruction(recipe=recipe, step=f'Passo {n}', order=n) for recipe in recipes for n in range(lines)]
+        )
+        RecipeLike.objects.bulk_create([RecipeLike(user=self.reader, recipe=recipe) for recipe in recipes])
+        category_counts.rebuild()
+        return recipes
+
+    def assertQueryBudget(self, budget, method, path, data=None, expected_status=200, **kwargs):
+        """Request `path` and fail with a dump of the queries if it takes more than `budget` of them."""
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(path, data, **kwargs)
+        self.assertEqual(response.status_code, expected_status, f'{method.upper()} {path}')
+        if len(queries) > budget:
+            shapes = Counter(normalize_sql(query['sql']) for query in queries)
+            lines = [f'{method.upper()} {path}: {len(queries)} queries, budget {budget}.', 'Repeated statements:']
+            lines += [f'  {count}x {shape}' for shape, count in shapes.most_common() if count > 1] or ['  (none)']
+            lines.append('All queries:')
+            lines += [f"  {n}. {query['sql']}" for n, query in enumerate(queries, 1)]
+            self.fail('\n'.join(lines))
+        return response
+
+    def test_recipe_list(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                self.make_recipes(size)
+                django_cache.clear()
+                self.client.credentials()
+                self.assertQueryBudget(3, 'get', '/api/recipes/')
+                django_cache.clear()
+                self.assertQueryBudget(3, 'get', '/api/recipes/', {'search': 'culurgiones', 'gluten_free': 'false'})
+                self.authenticate(self.reader)
+                self.assertQueryBudget(5, 'get', '/api/recipes/')
+
+    def test_recipe_detail(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                recipe = self.make_recipes(1, lines=size)[0]
+                self.client.credentials()
+                self.assertQueryBudget(4, 'get', f'/api/recipes/{recipe.slug}/')
+                self.authenticate(self.reader)
+                self.assertQueryBudget(6, 'get', f'/api/recipes/{recipe.pk}/')
+
+    def test_recipe_update(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                recipe = self.make_recipes(1, lines=size)[0]
+                self.authenticate(self.author)
+                self.assertQueryBudget(
+                    13, 'patch', f'/api/recipes/{recipe.slug}/',
+                    data={'title': 'Culurgiones ogliastrini', 'ingredients': [f'Nuovo {n}' for n in range(size)]},
+                    format='json',
+                )
+
+    def test_my_recipes(self):
+        self.authenticate(self.author)
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                self.make_recipes(size)
+                self.assertQueryBudget(5, 'get', '/api/recipes/my/')
+
+    def test_like(self):
+        self.authenticate(self.reader)
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                recipe = self.make_recipes(size)[-1]
+                path = f'/api/recipes/{recipe.slug}/like/'
+                self.assertQueryBudget(7, 'delete', path)
+                self.assertQueryBudget(7, 'put', path)
+                self.assertQueryBudget(7, 'post', path)
+
+    def test_like_states(self):
+        self.authenticate(self.reader)
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                ids = ','.join(str(recipe.pk) for recipe in self.make_recipes(size))
+                self.assertQueryBudget(3, 'get', '/api/recipes/likes/', {'ids': ids})
+
+    def test_report(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                recipe = self.make_recipes(size)[-1]
+                self.authenticate(User.objects.create_user(f'segnala{size}@example.com', 'Segnala', 'password-123'))
+                self.assertQueryBudget(
+                    10, 'post', f'/api/recipes/{recipe.slug}/report/', {'reason': 'spam'}, expected_status=201,
+                )
+
+    def test_stories(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                stories = StoryPost.objects.bulk_create([
+                    StoryPost(title=f'Storia {n}', content='La cucina della nonna', author=self.author, role='Chef')
+                    for n in range(size)
+                ])
+                django_cache.clear()
+                self.assertQueryBudget(3, 'get', '/api/stories/')
+                self.assertQueryBudget(2, 'get', f'/api/stories/{stories[-1].pk}/')
+
+    def test_category_counts(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                self.make_recipes(size)
+                django_cache.clear()
+                self.assertQueryBudget(2, 'get', '/api/recipes/category_counts/')
+
+    def test_sitemap(self):
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                self.make_recipes(size)
+                StoryPost.objects.create(title='Storia', content='Testo', author=self.author, role='Chef')
+                # A new generation: the sitemap is rebuilt from the database
+                with self.captureOnCommitCallbacks(execute=True):
+                    blog_cache.bump_generation(blog_cache.SITEMAP)
+                self.assertQueryBudget(3, 'get', '/api/sitemap.xml')
+                self.assertQueryBudget(1, 'get', '/api/sitemap-recipes-1.xml')
+
+    def test_me(self):
+        self.authenticate(self.author)
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                self.make_recipes(size)
+                self.assertQueryBudget(1, 'get', '/api/auth/me/')
+
+    def test_admin_changelists(self):
+        # The rows' __str__ and FK columns must come from select_related, not one query per row.
+        admin_user = User.objects.create_superuser('admin@example.com', 'Admin', 'password-123')
+        self.client.force_login(admin_user)
+        for size in self.SIZES:
+            with self.subTest(size=size):
+                recipes = self.make_recipes(size)
+                RecipeReport.objects.bulk_create([RecipeReport(user=self.reader, recipe=recipe, reason='spam') for recipe in recipes])
+                self.assertQueryBudget(5, 'get', '/admin/blog/recipe/')
+                self.assertQueryBudget(5, 'get', '/admin/blog/recipelike/')
+                self.assertQueryBudget(5, 'get', '/admin/blog/recipereport/')
+
+    def test_failure_lists_repeated_queries(self):
+        self.make_recipes(1)
+        with self.assertRaisesMessage(AssertionError, '2 queries, budget 0') as failure:
+            self.assertQueryBudget(0, 'get', '/api/recipes/category_counts/')
+        self.assertIn('All queries:\n  1. SELECT', str(failure.exception))
+
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'utente{n}@example.com', f'Utente {n}', 'password-123') for n in range(6)]
+
+    def inspect(self, view, **settings):
+        options = {
+            'QUERY_INSPECTOR_ENABLED': True, 'QUERY_INSPECTOR_RAISE': True, 'QUERY_INSPECTOR_REPEAT_THRESHOLD': 5,
+            'QUERY_INSPECTOR_SLOW_MS': 10_000, **settings,
+        }
+        with override_settings(**options):
+            return QueryInspectorMiddleware(view)(RequestFactory().get('/api/recipes/'))
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s) AND name = 'y''s' LIMIT 20"),
+        )
+
+    def test_repeated_shape_raises(self):
+        def one_query_per_user(request):
+            for user in self.users:
+                User.objects.get(pk=user.pk)
+            return HttpResponse()
+
+        with self.assertRaisesMessage(RepeatedQueriesError, '6x SELECT'):
+            self.inspect(one_query_per_user)
+        with self.assertLogs('blog.query_inspector', 'WARNING') as logs:
+            response = self.inspect(one_query_per_user, QUERY_INSPECTOR_RAISE=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(logs.records), 1)
+        message = logs.records[0].getMessage()
+        self.assertIn('GET /api/recipes/ (unmatched) repeated queries (threshold 5):', message)
+        self.assertIn('6x SELECT', message)
+        self.assertIn('FROM "blog_user"', message)
+
+    def test_batched_query_passes(self):
+        def one_query(request):
+            list(User.objects.filter(pk__in=[user.pk for user in self.users]))
+            return HttpResponse()
+
+        self.assertEqual(self.inspect(one_query).status_code, 200)
+
+    def test_slow_query_plan_is_logged(self):
+        from . import query_inspector
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.addCleanup(setattr, query_inspector, '_explain_logger', None)
+            query_inspector._explain_logger = None
+            path = f'{directory}/slow.log'
+
+            def view(request):
+                list(User.objects.filter(email__startswith='utente'))
+                return HttpResponse()
+
+            self.inspect(view, QUERY_INSPECTOR_SLOW_MS=0, QUERY_INSPECTOR_LOG_PATH=path)
+            for handler in list(query_inspector._explain_logger.handlers):
+                handler.close()
+                query_inspector._explain_logger.removeHandler(handler)
+            with open(path) as log:
+                entry = log.read()
+        self.assertIn('GET /api/recipes/', entry)
+        self.assertIn('FROM "blog_user"', entry)
+
+
+class RecipeSaveTests(TestCase):
+    """A save of a loaded recipe must not write back counters changed by concurrent likes and reports."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            title='Seadas', description='Dolce', category='Desserts', prep_time=40, author=self.author,
+        )
+        category_counts.rebuild()
+
+    def update(self, recipe, **data):
+        serializer = RecipeUpdateSerializer(recipe, data=data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def assertCountsConsistent(self):
+        counts = category_counts.get_counts()
+        self.assertEqual(counts, {category: count for category, count in category_counts.rebuild().items() if count})
+
+    def test_concurrent_like_survives_update(self):
+        loaded = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=self.recipe.pk).update(likes_count=F('likes_count') + 1, reports_count=2)
+        self.update(loaded, title='Seadas al miele')
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.title, self.recipe.likes_count, self.recipe.reports_count), ('Seadas al miele', 1, 2))
+
+    def test_concurrent_hide_survives_update(self):
+        loaded = Recipe.objects.get(pk=self.recipe.pk)
+        # What RecipeReportView does when the threshold is crossed
+        Recipe.objects.filter(pk=self.recipe.pk).update(is_hidden=True, hidden_at=timezone.now())
+        category_counts.adjust(self.recipe.category, -1)
+        self.update(loaded, description='Dolce gallurese')
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.is_hidden)
+        self.assertIsNotNone(self.recipe.hidden_at)
+        self.assertCountsConsistent()
+
+    def test_unhiding_on_the_instance_is_saved(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(is_hidden=True, hidden_at=timezone.now())
+        category_counts.adjust(self.recipe.category, -1)
+        loaded = Recipe.objects.get(pk=self.recipe.pk)
+        loaded.is_hidden = False  # a moderator in the admin change form
+        loaded.save()
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.is_hidden)
+        self.assertCountsConsistent()
+
+
+class RecipeLinesTests(TestCase):
+    """create_recipe_lines / sync_recipe_lines: the stored rows must match the submitted list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            title='Malloreddus', description='Gnocchetti', category='Pasta Dishes', prep_time=50, author=self.author,
+        )
+        create_recipe_lines(Ingredient, 'name', self.recipe, ['Semola', 'Acqua', 'Zafferano', 'Sale'])
+        self.pks = dict(Ingredient.objects.filter(recipe=self.recipe).values_list('name', 'pk'))
+
+    def sync(self, texts):
+        sync_recipe_lines(Ingredient, 'name', self.recipe, texts)
+        return list(Ingredient.objects.filter(recipe=self.recipe).order_by('order').values_list('order', 'name', 'pk'))
+
+    def assertLines(self, rows, names):
+        self.assertEqual([(order, name) for order, name, _ in rows], list(enumerate(names)))
+
+    def test_create_skips_empty_lines(self):
+        create_recipe_lines(Instruction, 'step', self.recipe, ['Impastare', '  ', 'Cuocere '])
+        self.assertEqual(
+            list(Instruction.objects.filter(recipe=self.recipe).order_by('order').values_list('order', 'step')),
+            [(0, 'Impastare'), (2, 'Cuocere')],
+        )
+
+    def test_unchanged(self):
+        with self.assertNumQueries(1):
+            sync_recipe_lines(Ingredient, 'name', self.recipe, ['Semola', 'Acqua', 'Zafferano', 'Sale'])
+        rows = self.sync(['Semola', 'Acqua', 'Zafferano', 'Sale'])
+        self.assertLines(rows, ['Semola', 'Acqua', 'Zafferano', 'Sale'])
+        self.assertEqual([pk for _, _, pk in rows], [self.pks[name] for name in ['Semola', 'Acqua', 'Zafferano', 'Sale']])
+
+    def test_reorder_keeps_rows(self):
+        names = ['Sale', 'Zafferano', 'Semola', 'Acqua']
+        rows = self.sync(names)
+        self.assertLines(rows, names)
+        self.assertEqual([pk for _, _, pk in rows], [self.pks[name] for name in names])
+
+    def test_insert_in_the_middle(self):
+        names = ['Semola', 'Acqua', 'Olio', 'Zafferano', 'Sale']
+        rows = self.sync(names)
+        self.assertLines(rows, names)
+        self.assertEqual(Ingredient.objects.filter(recipe=self.recipe).count(), 5)
+        self.assertTrue(set(self.pks.values()) <= {pk for _, _, pk in rows})
+
+    def test_shrink(self):
+        rows = self.sync(['Acqua', 'Sale'])
+        self.assertLines(rows, ['Acqua', 'Sale'])
+        self.assertEqual([pk for _, _, pk in rows], [self.pks['Acqua'], self.pks['Sale']])
+        self.assertFalse(Ingredient.objects.filter(pk__in=[self.pks['Semola'], self.pks['Zafferano']]).exists())
+
+    def test_grow_and_replace(self):
+        names = ['Semola rimacinata', 'Acqua tiepida', 'Zafferano', 'Sale', 'Pecorino', 'Salsiccia']
+        rows = self.sync(names)
+        self.assertLines(rows, names)
+        self.assertEqual(len({pk for _, _, pk in rows}), 6)
+
+    def test_duplicate_lines(self):
+        rows = self.sync(['Acqua', 'Acqua', 'Semola'])
+        self.assertLines(rows, ['Acqua', 'Acqua', 'Semola'])
+
+
+class SlugAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+
+    def create(self, title, slug=''):
+        return Recipe.objects.create(
+            title=title, slug=slug, description='Descrizione', category='Desserts', prep_time=30, author=self.author,
+        )
+
+    def test_next_free_slug(self):
+        self.assertEqual(next_free_slug('seadas', set()), 'seadas')
+        self.assertEqual(next_free_slug('seadas', {'seadas', 'seadas-1', 'seadas-2', 'seadas-10'}), 'seadas-3')
+
+    def test_fills_the_smallest_free_suffix(self):
+        for slug in ('seadas', 'seadas-2', 'seadas-10'):
+            self.create('Seadas', slug=slug)
+        self.assertEqual(self.create('Seadas').slug, 'seadas-1')
+        self.assertEqual(self.create('Seadas!').slug, 'seadas-3')
+
+    def test_slug_sharing_the_prefix_is_not_a_collision(self):
+        self.create('Pane carasau')
+        self.assertEqual(self.create('Pane').slug, 'pane')
+        self.assertEqual(self.create('Pane').slug, 'pane-1')
+        self.assertEqual(self.create('Pane carasau').slug, 'pane-carasau-1')
+
+    def test_allocation_is_one_query(self):
+        for n in range(12):
+            self.create('Culurgiones')
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_slug(Recipe.objects.all(), 'culurgiones'), 'culurgiones-12')
+
+    def test_retries_when_a_concurrent_save_takes_the_slug(self):
+        self.create('Fregola')
+        calls = []
+
+        def stale_then_fresh(queryset, base):
+            calls.append(base)
+            # The first allocation ran before the other recipe committed, so it returns its slug.
+            return 'fregola' if len(calls) == 1 else allocate_slug(queryset, base)
+
+        with mock.patch('blog.models.allocate_slug', side_effect=stale_then_fresh):
+            recipe = self.create('Fregola')
+        self.assertEqual((recipe.slug, len(calls)), ('fregola-1', 2))
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk, slug='fregola-1').exists())
+
+    def test_gives_up_after_the_allocation_attempts(self):
+        self.create('Fregola')
+        with mock.patch('blog.models.allocate_slug', return_value='fregola') as allocate:
+            with self.assertRaises(IntegrityError):
+                self.create('Fregola')
+        self.assertEqual(allocate.call_count, Recipe.SLUG_ALLOCATION_ATTEMPTS)
+        self.assertEqual(Recipe.objects.filter(title='Fregola').count(), 1)
+
+
+@override_settings(SITEMAP_CACHE_DIR=tempfile.mkdtemp(prefix='blog-tests-sitemap-'))
+class RecipeReportTests(APITestCase):
+    """The report that takes a recipe past FLAG_REPORT_THRESHOLD hides it, exactly once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        cls.reporters = [
+            User.objects.create_user(f'segnala{n}@example.com', f'Segnala {n}', 'password-123')
+            for n in range(Recipe.FLAG_REPORT_THRESHOLD + 3)
+        ]
+
+    def setUp(self):
+        django_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                title='Malloreddus alla campidanese', description='Gnocchetti sardi al sugo di salsiccia',
+                category='Pasta Dishes', prep_time=50, author=self.author,
+            )
+        category_counts.rebuild()
+
+    def report(self, reporter, expected_status=201):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(reporter).access_token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/recipes/{self.recipe.slug}/report/', {'reason': 'spam'})
+        self.assertEqual(response.status_code, expected_status, response.data)
+        self.client.credentials()
+        self.recipe.refresh_from_db()
+        return response
+
+    def public_slugs(self):
+        listing = [recipe['slug'] for recipe in self.client.get('/api/recipes/').data['results']]
+        search = [recipe['slug'] for recipe in self.client.get('/api/recipes/', {'search': 'malloreddus'}).data['results']]
+        index = self.client.get('/api/sitemap.xml').content.decode()
+        sitemap = ''.join(
+            b''.join(self.client.get(f'/api/{child}').streaming_content).decode()
+            for child in re.findall(r'/api/(sitemap-recipes-\d+\.xml)</loc>', index)
+        )
+        return listing, search, f'/{self.recipe.slug}<' in sitemap
+
+    def test_threshold_report_hides_once(self):
+        self.assertEqual(self.public_slugs(), ([self.recipe.slug], [self.recipe.slug], True))
+        threshold = Recipe.FLAG_REPORT_THRESHOLD
+        with mock.patch('blog.views.category_counts.adjust', wraps=category_counts.adjust) as adjust:
+            for reporter in self.reporters[:threshold]:
+                self.report(reporter)
+            self.assertFalse(self.recipe.is_hidden)
+            self.report(self.reporters[threshold])
+            self.assertTrue(self.recipe.is_hidden)
+            hidden_at = self.recipe.hidden_at
+            self.assertIsNotNone(hidden_at)
+            for reporter in self.reporters[threshold + 1:]:
+                self.report(reporter)
+        self.assertEqual(self.recipe.hidden_at, hidden_at)
+        self.assertEqual(self.recipe.reports_count, len(self.reporters))
+        adjust.assert_called_once_with('Pasta Dishes', -1)
+        self.assertEqual(category_counts.get_counts(), {})
+        self.assertEqual(self.public_slugs(), ([], [], False))
+
+    def test_duplicate_report_is_rejected(self):
+        self.report(self.reporters[0])
+        with self.assertLogs('blog.exceptions', 'ERROR') as logs:
+            self.report(self.reporters[0], expected_status=400)
+        self.assertIn('Hai già segnalato questa ricetta.', logs.output[0])
+        self.assertEqual(self.recipe.reports_count, 1)
+        self.assertEqual(RecipeReport.objects.filter(recipe=self.recipe).count(), 1)
+
+    def test_hiding_an_unpublished_recipe_leaves_counts_alone(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(is_published=False)
+        category_counts.rebuild()
+        with mock.patch('blog.views.category_counts.adjust', wraps=category_counts.adjust) as adjust:
+            for reporter in self.reporters[:Recipe.FLAG_REPORT_THRESHOLD + 1]:
+                self.report(reporter)
+        self.assertTrue(self.recipe.is_hidden)
+        adjust.assert_not_called()
+
+
+class KeysetPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        Recipe.objects.bulk_create([
+            Recipe(
+                title=f'Pardulas {n}', slug=f'pardulas-{n}', description='Dolci di ricotta', category='Desserts',
+                prep_time=60, author=cls.author, likes_count=n % 3,
+            )
+            for n in range(45)
+        ])
+        # Every row shares created_at: only the pk tie-breaker orders them.
+        Recipe.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        django_cache.clear()
+
+    def walk(self, params):
+        """Follow the next links from the first page; returns the ids in the order served."""
+        ids = []
+        response = self.client.get('/api/recipes/', {**params, 'cursor': ''})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            if not response.data['next']:
+                return ids
+            url = urlsplit(response.data['next'])
+            response = self.client.get(f'{url.path}?{url.query}')
+
+    def test_round_trip_with_tied_sort_keys(self):
+        expected = list(Recipe.objects.order_by('-is_featured', '-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self.walk({}), expected)
+        expected = list(
+            Recipe.objects.order_by('-is_featured', '-likes_count', '-created_at', '-pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(self.walk({'order_by': 'likes'}), expected)
+
+    def next_cursor(self, params):
+        response = self.client.get('/api/recipes/', {**params, 'cursor': ''})
+        return parse_qs(urlsplit(response.data['next']).query)['cursor'][0]
+
+    def assertInvalidCursor(self, cursor, params=None):
+        django_cache.clear()
+        with self.assertLogs('blog.exceptions', 'ERROR'):
+            response = self.client.get('/api/recipes/', {**(params or {}), 'cursor': cursor})
+        self.assertEqual(response.status_code, 404, cursor)
+
+    def test_invalid_cursor(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+        ordering = ['-is_featured', '-created_at', '-pk']
+        for cursor in [
+            'not-a-cursor', '%%%', 'é', encode([1, 2]), encode({'o': ordering}), encode({'o': ordering, 'v': 3}),
+            encode({'o': ordering, 'v': [True, 'ieri', 1]}), encode({'o': ordering, 'v': [None, None, None]}),
+            encode({'o': ordering, 'v': [False, '2026-10-17T10:00:00Z', 2 ** 70]}),
+        ]:
+            with self.subTest(cursor=cursor):
+                self.assertInvalidCursor(cursor)
+
+    def test_tampered_cursor(self):
+        cursor = self.next_cursor({})
+        tampered = cursor[:-4] + ('AAAA' if cursor[-4:] != 'AAAA' else 'BBBB')
+        self.assertInvalidCursor(tampered)
+
+    def test_cursor_reused_with_another_ordering(self):
+        self.assertInvalidCursor(self.next_cursor({'order_by': 'likes'}))
+        self.assertInvalidCursor(self.next_cursor({}), {'order_by': 'likes'})
+
+
+class RecipeSearchTests(TestCase):
+    """search_recipes on the SQLite FTS5 index: ranking, accent folding, stem/prefix matching."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        cls.recipes = {}
+        for slug, title, description, ingredients in [
+            ('seadas', 'Seadas', 'Dolce fritto di pasta violata', ['Semola', 'Pecorino fresco', 'Miele']),
+            ('sebadas-al-limone', 'Sebadas al limone', 'Le seadas del Logudoro', ['Formaggio', 'Limone']),
+            ('malloreddus', 'Malloreddus alla campidanese', 'Gnocchetti al sugo', ['Semola', 'Salsiccia']),
+            ('culurgiones', 'Culurgiones', 'Ravioli ogliastrini', ['Patate', 'Pecorino', 'Menta']),
+        ]:
+            recipe = Recipe.objects.create(
+                title=title, slug=slug, description=description, category='Desserts', prep_time=30, author=cls.author,
+            )
+            create_recipe_lines(Ingredient, 'name', recipe, ingredients)
+            cls.recipes[slug] = recipe
+        index_recipes([recipe.pk for recipe in cls.recipes.values()])
+
+    def search(self, query):
+        results = search_recipes(Recipe.objects.all(), query).order_by('-search_rank', 'pk')
+        return [recipe.slug for recipe in results]
+
+    def test_title_match_outranks_description_match(self):
+        self.assertEqual(self.search('seadas'), ['seadas', 'sebadas-al-limone'])
+        self.assertEqual(self.search('pecorino'), ['culurgiones', 'seadas'])
+
+    def test_accents_and_apostrophes_are_folded(self):
+        for query in ['seadas’', "SEADAS'", 'Seadàs']:
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), ['seadas', 'sebadas-al-limone'])
+
+    def test_stem_and_prefix_matching(self):
+        for query in ['malloreddus', 'malloredus', 'mallor', 'campidanesi']:
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), ['malloreddus'])
+        self.assertEqual(self.search('semola salsiccia'), ['malloreddus'])
+        self.assertEqual(self.search('zafferano'), [])
+
+    def test_migration_backfill_matches_the_index(self):
+        backfill = importlib.import_module('blog.migrations.0015_recipesearchdocument')
+        expected = list(RecipeSearchDocument.objects.order_by('pk').values_list(
+            'recipe', 'title', 'ingredients', 'category', 'author', 'description',
+        ))
+        RecipeSearchDocument.objects.all().delete()
+        with mock.patch.object(backfill, 'BACKFILL_BATCH_SIZE', 3):
+            backfill.build_documents(django_apps, None)
+        self.assertEqual(list(RecipeSearchDocument.objects.order_by('pk').values_list(
+            'recipe', 'title', 'ingredients', 'category', 'author', 'description',
+        )), expected)
+        self.assertEqual(self.search('malloredus'), ['malloreddus'])
+
+
+class ResizedImageTests(TestCase):
+    """On-demand resizes in serve_media: only the allowed sizes, and a disk cache kept under its cap."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory(prefix='blog-tests-media-')
+        self.addCleanup(media_root.cleanup)
+        self.media_root = Path(media_root.name)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, IMAGE_VARIANT_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        (self.media_root / 'recipes').mkdir()
+        # Noise, so the encoded sizes are not trivially small
+        Image.effect_noise((1600, 1200), 64).convert('RGB').save(self.media_root / 'recipes' / 'seadas.jpg')
+
+    def get(self, **params):
+        response = self.client.get('/media/recipes/seadas.jpg', params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def cached_files(self):
+        return [path for path in (self.media_root / RESIZE_CACHE_DIR).glob('*/*.*') if path.parent.name != 'locks']
+
+    def test_sizes_outside_the_allow_list_are_not_found(self):
+        for params in [{'w': '123'}, {'w': 'tanta'}, {'w': '480', 'fmt': 'avif'}, {'fmt': 'webp'}]:
+            with self.subTest(**params), self.assertLogs('django.request', 'WARNING'):
+                self.assertEqual(self.get(**params).status_code, 404)
+        self.assertEqual(self.cached_files(), [])
+
+    def test_allowed_size_is_rendered_once(self):
+        response = self.get(w='480', fmt='webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(self.cached_files()[0]) as resized:
+            self.assertEqual(resized.size, (480, 360))
+        self.assertEqual(self.get(w='480', fmt='webp').status_code, 200)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_renders_without_fcntl(self):
+        with mock.patch('blog.images.fcntl', None):
+            self.assertEqual(self.get(w='320').status_code, 200)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_eviction_keeps_the_cache_under_its_cap(self):
+        self.get(w='1280')
+        cap = self.cached_files()[0].stat().st_size * 2
+        with override_settings(IMAGE_RESIZE_CACHE_MAX_BYTES=cap):
+            for width in (960, 640, 480, 1280, 960):
+                for fmt in FORMATS:
+                    self.assertEqual(self.get(w=str(width), fmt=fmt).status_code, 200)
+                    self.assertLessEqual(sum(path.stat().st_size for path in self.cached_files()), cap)
+
+
+class ConditionalGetTests(APITestCase):
+    """ETag validation of the detail endpoints: 304 only for the exact representation the client holds."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        cls.reader = User.objects.create_user('lettore@example.com', 'Lettore', 'password-123')
+        cls.recipe = Recipe.objects.create(
+            title='Fregola con arselle', description='Fregola sarda', category='Pasta Dishes', prep_time=40,
+            author=cls.author,
+        )
+        cls.story = StoryPost.objects.create(title='Storia', content='Testo', author=cls.author, role='Chef')
+
+    def setUp(self):
+        django_cache.clear()
+        self.recipe_url = f'/api/recipes/{self.recipe.slug}/'
+        self.story_url = f'/api/stories/{self.story.pk}/'
+
+    def get(self, url, user=None, **headers):
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {RefreshToken.for_user(user).access_token}'
+        return self.client.get(url, **headers)
+
+    def test_matching_etag_is_not_modified(self):
+        for url in [self.recipe_url, self.story_url]:
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('Last-Modified'))
+                not_modified = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified['ETag'], response['ETag'])
+                self.assertEqual(not_modified.content, b'')
+
+    def test_vary_headers(self):
+        for url in [self.recipe_url, self.story_url]:
+            with self.subTest(url=url):
+                response = self.get(url)
+                not_modified = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                for headers in [response, not_modified]:
+                    vary = {value.strip() for value in headers['Vary'].split(',')}
+                    self.assertLessEqual({'Accept', 'Authorization'}, vary)
+
+    def test_like_makes_the_etag_stale(self):
+        etag = self.get(self.recipe_url)['ETag']
+        # Likes don't touch updated_at: If-Modified-Since alone must not validate the old copy either.
+        Recipe.objects.filter(pk=self.recipe.pk).update(likes_count=F('likes_count') + 1)
+        response = self.get(
+            self.recipe_url, HTTP_IF_NONE_MATCH=etag,
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.get(self.recipe_url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_author_change_makes_the_story_etag_stale(self):
+        etag = self.get(self.story_url)['ETag']
+        User.objects.filter(pk=self.author.pk).update(name='Autrice')
+        response = self.get(self.story_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_collection_etag_changes_after_a_write_in_another_process(self):
+        other_process_cache = LocMemCache('blog-tests-other-process', {})
+        for url in ['/api/recipes/', '/api/recipes/category_counts/', '/api/stories/']:
+            with self.subTest(url=url):
+                etag = self.get(url)['ETag']
+                self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                # The write and its bump happen where this process's cache can't see them.
+                with mock.patch('blog.cache.cache', other_process_cache), self.captureOnCommitCallbacks(execute=True):
+                    if 'stories' in url:
+                        StoryPost.objects.create(title='Altra storia', content='Testo', author=self.author, role='Chef')
+                    else:
+                        Recipe.objects.create(
+                            title='Seadas', description='Dolce fritto', category='Desserts', prep_time=45,
+                            author=self.author,
+                        )
+                response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_anonymous_and_authenticated_variants(self):
+        anonymous = self.get(self.recipe_url)['ETag']
+        authenticated = self.get(self.recipe_url, self.reader)
+        self.assertNotEqual(authenticated['ETag'], anonymous)
+        self.assertEqual(self.get(self.recipe_url, self.reader, HTTP_IF_NONE_MATCH=anonymous).status_code, 200)
+        self.assertEqual(self.get(self.recipe_url, HTTP_IF_NONE_MATCH=authenticated['ETag']).status_code, 200)
+        self.assertEqual(
+            self.get(self.recipe_url, self.reader, HTTP_IF_NONE_MATCH=authenticated['ETag']).status_code, 304,
+        )
+        # The reader's own like is part of their variant
+        RecipeLike.objects.create(recipe=self.recipe, user=self.reader)
+        self.assertEqual(
+            self.get(self.recipe_url, self.reader, HTTP_IF_NONE_MATCH=authenticated['ETag']).status_code, 200,
+        )
+
+
+class SitemapTests(APITestCase):
+    """Child sitemaps split at SITEMAP_MAX_URLS, and versions surviving other workers' builds."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f'Pardulas {n}', description='Dolci di ricotta', category='Desserts', prep_time=60,
+                author=cls.author,
+            )
+            for n in range(5)
+        ]
+
+    def setUp(self):
+        django_cache.clear()
+        cache_dir = tempfile.TemporaryDirectory(prefix='blog-tests-sitemap-')
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = Path(cache_dir.name)
+        settings_override = override_settings(SITEMAP_CACHE_DIR=cache_dir.name, SITEMAP_MAX_URLS=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def children(self):
+        index = self.client.get('/api/sitemap.xml').content.decode()
+        return re.findall(r'/api/(sitemap-[a-z]+-\d+\.xml)</loc>', index)
+
+    def child(self, name, gzipped=False):
+        headers = {'HTTP_ACCEPT_ENCODING': 'gzip'} if gzipped else {}
+        response = self.client.get(f'/api/{name}', **headers)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        return (gzip.decompress(content) if gzipped else content).decode()
+
+    def test_sections_split_at_max_urls(self):
+        self.assertEqual(self.children(), [
+            'sitemap-pages-1.xml', 'sitemap-pages-2.xml', 'sitemap-pages-3.xml',
+            'sitemap-recipes-1.xml', 'sitemap-recipes-2.xml', 'sitemap-recipes-3.xml',
+        ])
+        pages = [
+            re.findall(r'<loc>[^<]*/recipe/([^<]+)</loc>', self.child(f'sitemap-recipes-{number}.xml'))
+            for number in (1, 2, 3)
+        ]
+        slugs = [recipe.slug for recipe in self.recipes]
+        self.assertEqual(pages, [slugs[0:2], slugs[2:4], slugs[4:]])
+        self.assertEqual(self.child('sitemap-recipes-2.xml', gzipped=True), self.child('sitemap-recipes-2.xml'))
+        with self.assertLogs('blog.exceptions', 'ERROR'), self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/api/sitemap-recipes-4.xml').status_code, 404)
+
+    def test_recent_versions_are_kept(self):
+        for version in ['v1', 'v2', 'v3', 'v4']:
+            sitemaps.build(version)
+        self.assertEqual(sorted(path.name for path in self.cache_dir.iterdir()), ['v1', 'v2', 'v3', 'v4'])
+        # Past the grace period, only the KEEP_VERSIONS most recent stay besides the new one.
+        stale = time.time() - sitemaps.VERSION_GRACE_SECONDS - 60
+        for age, version in enumerate(['v1', 'v2', 'v3', 'v4']):
+            os.utime(self.cache_dir / version, (stale + age, stale + age))
+        sitemaps.build('v5')
+        self.assertEqual(sorted(path.name for path in self.cache_dir.iterdir()), ['v3', 'v4', 'v5'])
+
+    def test_version_removed_while_serving_is_rebuilt(self):
+        name = self.children()[3]
+        expected = self.child(name)
+        get_version_dir = sitemaps.get_version_dir
+
+        def removed_after_lookup(version):
+            directory = get_version_dir(version)
+            shutil.rmtree(directory)
+            removed.stop()
+            return directory
+
+        removed = mock.patch('blog.sitemap.get_version_dir', side_effect=removed_after_lookup)
+        removed.start()
+        self.assertEqual(self.child(name), expected)
+        removed.start()
+        self.assertEqual(self.children()[3], name)
+
+
+@override_settings(LIKE_WRITE_BEHIND=False)
+class RecipeLikeTests(APITestCase):
+    """PUT and DELETE are idempotent; POST toggles by exactly one."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        cls.readers = [
+            User.objects.create_user(f'lettore{n}@example.com', f'Lettore {n}', 'password-123') for n in range(2)
+        ]
+        cls.recipe = Recipe.objects.create(
+            title='Fregola con arselle', description='Fregola sarda', category='Pasta Dishes', prep_time=40,
+            author=cls.author,
+        )
+
+    def like(self, method, reader):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(reader).access_token}')
+        response = getattr(self.client, method)(f'/api/recipes/{self.recipe.slug}/like/')
+        self.client.credentials()
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(response.data['likes_count'], self.recipe.likes_count)
+        self.assertEqual(self.recipe.likes_count, RecipeLike.objects.filter(recipe=self.recipe).count())
+        return response.data
+
+    def test_repeated_put_and_delete(self):
+        self.like('put', self.readers[1])
+        for _ in range(3):
+            self.assertEqual(self.like('put', self.readers[0]), {'liked': True, 'likes_count': 2})
+        for _ in range(3):
+            self.assertEqual(self.like('delete', self.readers[0]), {'liked': False, 'likes_count': 1})
+
+    def test_toggle_changes_the_count_by_one(self):
+        self.like('put', self.readers[1])
+        for expected in [{'liked': True, 'likes_count': 2}, {'liked': False, 'likes_count': 1}] * 2:
+            self.assertEqual(self.like('post', self.readers[0]), expected)
+
+
+class LikeBufferTests(APITestCase):
+    """Write-behind likes: events coalesce per user and recipe, and a flush drains the optimistic state."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        cls.reader = User.objects.create_user('lettore@example.com', 'Lettore', 'password-123')
+        cls.recipe = Recipe.objects.create(
+            title='Fregola con arselle', description='Fregola sarda', category='Pasta Dishes', prep_time=40,
+            author=cls.author,
+        )
+
+    def setUp(self):
+        django_cache.clear()
+        buffer_dir = tempfile.TemporaryDirectory(prefix='blog-tests-likes-')
+        self.addCleanup(buffer_dir.cleanup)
+        self.buffer_dir = Path(buffer_dir.name)
+        settings_override = override_settings(
+            LIKE_WRITE_BEHIND=True, LIKE_BUFFER_PATH=self.buffer_dir / 'likes.log',
+            LIKE_BUFFER_FLUSH_IN_PROCESS=False, LIKE_BUFFER_FSYNC=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.reader).access_token}')
+
+    def like(self, method):
+        response = getattr(self.client, method)(f'/api/recipes/{self.recipe.slug}/like/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def state(self):
+        return self.client.get('/api/recipes/likes/', {'ids': str(self.recipe.pk)}).data[self.recipe.pk]
+
+    def test_like_unlike_like_flushes_to_one_row(self):
+        self.assertEqual(self.like('put'), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.like('delete'), {'liked': False, 'likes_count': 0})
+        self.assertEqual(self.like('put'), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.state(), {'liked': True, 'likes_count': 1})
+        self.assertFalse(RecipeLike.objects.exists())
+
+        self.assertEqual(like_buffer.flush(), 3)
+        self.recipe.refresh_from_db()
+        self.assertEqual(list(RecipeLike.objects.values_list('user', 'recipe')), [(self.reader.pk, self.recipe.pk)])
+        self.assertEqual(self.recipe.likes_count, 1)
+        self.assertFalse(django_cache.get(like_buffer._delta_key(self.recipe.pk)))
+        self.assertIsNone(django_cache.get(like_buffer._state_key(self.reader.pk, self.recipe.pk)))
+        self.assertEqual([path.name for path in self.buffer_dir.iterdir()], ['likes.log.lock'])
+        self.assertEqual(self.state(), {'liked': True, 'likes_count': 1})
+
+        self.assertEqual(like_buffer.flush(), 0)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.likes_count, 1)
+
+    def test_repeated_like_is_not_buffered(self):
+        self.like('put')
+        self.like('put')
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(self.like('put'), {'liked': True, 'likes_count': 1})
+        self.assertEqual(like_buffer.flush(), 0)
+
+    def test_delta_keeps_other_pending_likes_and_survives_eviction(self):
+        key = like_buffer._delta_key(self.recipe.pk)
+        # Two likes from other users are still pending in the shared cache.
+        django_cache.set(key, 2, None)
+        self.assertEqual(self.like('put'), {'liked': True, 'likes_count': 3})
+
+        incr = LocMemCache.incr
+        evicted = []
+
+        def evict_once(cache_backend, key, delta=1, version=None):
+            if evicted:
+                return incr(cache_backend, key, delta, version)
+            # The key is evicted, then another worker buffers a like before this one retries.
+            evicted.append(key)
+            cache_backend.delete(key, version=version)
+            cache_backend.add(key, 0, None, version=version)
+            incr(cache_backend, key, 1, version)
+            raise ValueError(f"Key '{key}' not found")
+
+        with mock.patch.object(LocMemCache, 'incr', autospec=True, side_effect=evict_once):
+            self.assertEqual(self.like('delete'), {'liked': False, 'likes_count': 0})
+        self.assertEqual(evicted, [key])
+        self.assertEqual(django_cache.get(key), 0)
+
+
+class CategoryCountTests(TestCase):
+    """The incrementally maintained counts must always equal a rebuild() from the recipes table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+
+    def setUp(self):
+        self.recipes = [
+            Recipe.objects.create(
+                title=f'Ricetta {n}', description='Descrizione', category=category, prep_time=30, author=self.author,
+            )
+            for n, category in enumerate(['Desserts', 'Desserts', 'Fish', 'Pasta Dishes'])
+        ]
+
+    def assertCounts(self, expected):
+        self.assertEqual(category_counts.get_counts(), expected)
+        self.assertEqual(category_counts.rebuild(), expected)
+        self.assertEqual(category_counts.get_counts(), expected)
+
+    def test_create(self):
+        self.assertCounts({'Desserts': 2, 'Fish': 1, 'Pasta Dishes': 1})
+        Recipe.objects.create(
+            title='Bozza', description='Descrizione', category='Fish', prep_time=30, author=self.author,
+            is_published=False,
+        )
+        self.assertCounts({'Desserts': 2, 'Fish': 1, 'Pasta Dishes': 1})
+
+    def test_category_change(self):
+        recipe = self.recipes[0]
+        recipe.category = 'Fish'
+        recipe.save()
+        self.assertCounts({'Desserts': 1, 'Fish': 2, 'Pasta Dishes': 1})
+        recipe.category = 'Bread & Pizza'
+        recipe.save(update_fields=['category'])
+        self.assertCounts({'Bread & Pizza': 1, 'Desserts': 1, 'Fish': 1, 'Pasta Dishes': 1})
+
+    def test_publish_and_unpublish(self):
+        recipe = self.recipes[2]
+        recipe.is_published = False
+        recipe.save()
+        self.assertCounts({'Desserts': 2, 'Pasta Dishes': 1})
+        # An unpublished recipe changing category is still not counted
+        recipe.category = 'Desserts'
+        recipe.save()
+        self.assertCounts({'Desserts': 2, 'Pasta Dishes': 1})
+        recipe.is_published = True
+        recipe.save(update_fields=['is_published'])
+        self.assertCounts({'Desserts': 3, 'Pasta Dishes': 1})
+
+    def test_hide_and_unhide(self):
+        recipe = self.recipes[3]
+        recipe.is_hidden = True
+        recipe.hidden_at = timezone.now()
+        recipe.save()
+        self.assertCounts({'Desserts': 2, 'Fish': 1})
+        recipe.is_hidden = False
+        recipe.hidden_at = None
+        recipe.category = 'Fish'
+        recipe.save()
+        self.assertCounts({'Desserts': 2, 'Fish': 2})
+
+    def test_edit_of_a_recipe_hidden_meanwhile(self):
+        # Loaded before reports hid it: the edit keeps it hidden and uncounted.
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        Recipe.objects.filter(pk=recipe.pk).update(is_hidden=True, hidden_at=timezone.now())
+        category_counts.adjust('Desserts', -1)
+        recipe.category = 'Fish'
+        recipe.save()
+        self.assertCounts({'Desserts': 1, 'Fish': 1, 'Pasta Dishes': 1})
+
+    def test_delete(self):
+        self.recipes[0].delete()
+        self.assertCounts({'Desserts': 1, 'Fish': 1, 'Pasta Dishes': 1})
+        hidden = self.recipes[2]
+        hidden.is_hidden = True
+        hidden.save()
+        hidden.delete()
+        self.assertCounts({'Desserts': 1, 'Pasta Dishes': 1})
+        unpublished = self.recipes[1]
+        unpublished.is_published = False
+        unpublished.save()
+        unpublished.delete()
+        self.assertCounts({'Pasta Dishes': 1})
+
+
+class ResponseCacheTests(APITestCase):
+    """Anonymous listings: one cache entry per origin, invalidated when a recipe write commits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('autore@example.com', 'Autore', 'password-123')
+        Recipe.objects.bulk_create([
+            Recipe(
+                title=f'Pardulas {n}', slug=f'pardulas-{n}', description='Dolci di ricotta', category='Desserts',
+                prep_time=60, author=cls.author,
+            )
+            for n in range(25)
+        ])
+
+    def setUp(self):
+        django_cache.clear()
+
+    def test_links_follow_the_request_origin(self):
+        for host, secure in [('localhost', False), ('127.0.0.1', False), ('localhost', True)]:
+            with self.subTest(host=host, secure=secure):
+                response = self.client.get('/api/recipes/', HTTP_HOST=host, secure=secure)
+                origin = f"{'https' if secure else 'http'}://{host}"
+                self.assertTrue(response.data['next'].startswith(f'{origin}/api/recipes/'), response.data['next'])
+
+    def test_bump_from_another_process_invalidates_the_list(self):
+        # A management command or another gunicorn worker has its own in-memory cache: only the database is shared.
+        other_process_cache = LocMemCache('blog-tests-other-process', {})
+        self.assertEqual(self.client.get('/api/recipes/').data['count'], 25)
+        generation = blog_cache.get_generation(blog_cache.RECIPES)
+        with mock.patch('blog.cache.cache', other_process_cache), self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.create(
+                title='Seadas', description='Dolce fritto', category='Desserts', prep_time=45, author=self.author,
+            )
+        self.assertGreater(blog_cache.get_generation(blog_cache.RECIPES), generation)
+        self.assertEqual(self.client.get('/api/recipes/').data['count'], 26)
+
+    def test_recipe_write_invalidates_the_list_on_commit(self):
+        generation = blog_cache.get_generation(blog_cache.RECIPES)
+        self.assertEqual(self.client.get('/api/recipes/').data['count'], 25)
+        with self.captureOnCommitCallbacks() as callbacks:
+            recipe = Recipe.objects.create(
+                title='Seadas', description='Dolce fritto', category='Desserts', prep_time=45, author=self.author,
+            )
+        # Not before the commit: a rolled back write must not cost the cached entries.
+        self.assertEqual(blog_cache.get_generation(blog_cache.RECIPES), generation)
+        self.assertEqual(self.client.get('/api/recipes/').data['count'], 25)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(blog_cache.get_generation(blog_cache.RECIPES), generation)
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], 26)
+        self.assertEqual(response.data['results'][0]['slug'], recipe.slug)
+
+
+class MetricsMiddlewareTests(TestCase):
+    """Request counters keep a bounded set of label values, whatever the client sends."""
+
+    def count(self, method):
+        return REGISTRY.get_sample_value(
+            'blog_http_requests_total', {'method': method, 'route': 'blog:recipe-list-create', 'status': '405'},
+        ) or 0
+
+    def test_unknown_methods_share_one_label(self):
+        before = self.count('other')
+        for method in ['PROPFIND', 'BREW', 'X' * 50]:
+            with self.assertLogs('blog.exceptions', 'ERROR'), self.assertLogs('django.request', 'WARNING'):
+                response = self.client.generic(method, '/api/recipes/')
+            self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.count('other'), before + 3)
+        self.assertIsNone(REGISTRY.get_sample_value('blog_http_requests_total', {
+            'method': 'PROPFIND', 'route': 'blog:recipe-list-create', 'status': '405',
+        }))
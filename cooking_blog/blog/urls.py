@@ -15,6 +15,7 @@ urlpatterns = [
     path('recipes/', views.RecipeListCreateView.as_view(), name='recipe-list-create'),
     path('recipes/category_counts/', views.recipe_category_counts, name='recipe-category-counts'),
     path('recipes/my/', views.MyRecipesView.as_view(), name='my-recipes'),
+    path('recipes/likes/', views.recipe_like_states, name='recipe-like-states'),
     path('recipes/<str:slug_or_id>/', views.RecipeDetailView.as_view(), name='recipe-detail'),
     path('recipes/<str:slug_or_id>/like/', views.RecipeLikeView.as_view(), name='recipe-like'),
     path('recipes/<str:slug_or_id>/report/', views.RecipeReportView.as_view(), name='recipe-report'),
@@ -25,4 +26,5 @@ urlpatterns = [
     
     # SEO endpoints
     path('sitemap.xml', views.sitemap, name='sitemap'),
+    path('sitemap-<str:section>-<int:number>.xml', views.sitemap_section, name='sitemap-section'),
 ]
\ No newline at end of file
@@ -5,26 +5,65 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db.models import Q, Count
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q, F
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 import logging
 from .serializers import (
     UserRegistrationSerializer, UserSerializer,
-    RecipeSerializer, RecipeCreateSerializer, RecipeUpdateSerializer,
+    RecipeSerializer, RecipeCardSerializer, RecipeCreateSerializer, RecipeUpdateSerializer,
     StoryPostSerializer, RecipeReportSerializer
 )
 from .models import User, Recipe, StoryPost, RecipeLike, RecipeReport
+from . import cache, category_counts, likes, metrics, sitemap as sitemaps
+from .conditional import (
+    ConditionalGetMixin, collection_validators, generation_to_datetime, make_etag, not_modified_response,
+    request_variant, set_validator_headers,
+)
+from .pagination import CursorPaginationOptInMixin
+from .search import search_recipes
 
 logger = logging.getLogger(__name__)
 
 
+def slug_or_id_lookup(slug_or_id):
+    """Filter kwargs matching a recipe by numeric id or by slug."""
+    if slug_or_id.isdigit():
+        return {'pk': int(slug_or_id)}
+    return {'slug': slug_or_id}
+
+
 def get_recipe_by_slug_or_id(slug_or_id, queryset=None):
     """Resolve a recipe by numeric id or by slug. Raises Http404 if not found."""
     if queryset is None:
         queryset = Recipe.objects.all()
-    if slug_or_id.isdigit():
-        return get_object_or_404(queryset, pk=int(slug_or_id))
-    return get_object_or_404(queryset, slug=slug_or_id)
+    return get_object_or_404(queryset, **slug_or_id_lookup(slug_or_id))
+
+
+def get_liked_recipe_ids(user, recipes):
+    """Return the ids among `recipes` (a recipe or an iterable of recipes) liked by `user`, in one query."""
+    if not user or not user.is_authenticated:
+        return set()
+    if isinstance(recipes, Recipe):
+        recipes = [recipes]
+    recipe_ids = [recipe.pk for recipe in recipes]
+    if not recipe_ids:
+        return set()
+    return set(
+        RecipeLike.objects.filter(user=user, recipe_id__in=recipe_ids).values_list('recipe_id', flat=True)
+    )
+
+
+class LikedRecipesMixin:
+    """Resolve is_liked for a whole page of recipes up front instead of once per serialized row."""
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.request.method == 'GET':
+            context = self.get_serializer_context()
+            context['liked_recipe_ids'] = get_liked_recipe_ids(self.request.user, args[0])
+            kwargs['context'] = context
+        return super().get_serializer(*args, **kwargs)
 
 
 @api_view(['POST'])
@@ -103,22 +142,34 @@ def me(request):
 @permission_classes([AllowAny])
 def recipe_category_counts(request):
     """Return recipe count per category (unfiltered: published, not flagged). Used for category cards so counts don't change when user applies filters."""
-    queryset = Recipe.objects.filter(is_published=True).annotate(
-        report_count=Count('recipe_reports')
-    ).filter(report_count__lte=5).values('category').annotate(count=Count('id'))
-    counts = {row['category']: row['count'] for row in queryset}
-    return Response(counts, status=status.HTTP_200_OK)
-
-
-class RecipeListCreateView(generics.ListCreateAPIView):
-    """List all recipes or create a new recipe."""
-    queryset = Recipe.objects.filter(is_published=True).select_related('author').prefetch_related('ingredients', 'instructions')
+    etag, last_modified = collection_validators(request, cache.RECIPES, ())
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    # Maintained incrementally in RecipeCategoryCount (see blog/category_counts.py)
+    if cache.is_cacheable(request):
+        counts = cache.cached_response_data('category_counts', cache.RECIPES, request, category_counts.get_counts)
+    else:
+        counts = category_counts.get_counts()
+    response = Response(counts, status=status.HTTP_200_OK)
+    set_validator_headers(response, etag, last_modified)
+    return response
+
+
+class RecipeListCreateView(ConditionalGetMixin, CursorPaginationOptInMixin, LikedRecipesMixin, generics.ListCreateAPIView):
+    """
+    List all recipes (compact cards, ?fields= for a sparse fieldset) or create a new recipe.
+    Send ?cursor= for keyset pagination (infinite scroll).
+    """
+    # Cards only need a handful of columns: no prefetches of ingredients/instructions.
+    # Hidden recipes (more than 5 reports) are excluded.
+    queryset = Recipe.objects.filter(is_published=True, is_hidden=False).select_related('author').only(*RecipeCardSerializer.QUERYSET_FIELDS)
     permission_classes = [AllowAny]  # Allow anyone to view, but creation requires auth
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return RecipeCreateSerializer
-        return RecipeSerializer
+        return RecipeCardSerializer
     
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -126,22 +177,12 @@ class RecipeListCreateView(generics.ListCreateAPIView):
         return [AllowAny()]
     
     def get_queryset(self):
-        queryset = Recipe.objects.filter(is_published=True).select_related('author').prefetch_related('ingredients', 'instructions', 'recipe_likes', 'recipe_reports')
-        
-        # Exclude recipes with more than 5 reports (flagged recipes)
-        queryset = queryset.annotate(
-            report_count=Count('recipe_reports')
-        ).exclude(report_count__gt=5)
+        queryset = super().get_queryset()
         
-        # Search functionality
-        search_query = self.request.query_params.get('search', None)
+        # Full-text search (title, ingredients, category, author, description), ranked by relevance
+        search_query = (self.request.query_params.get('search') or '').strip()
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__icontains=search_query) |
-                Q(author__name__icontains=search_query)
-            )
+            queryset = search_recipes(queryset, search_query)
         
         # Category filter
         category = self.request.query_params.get('category', None)
@@ -174,11 +215,28 @@ class RecipeListCreateView(generics.ListCreateAPIView):
         # Order by: most liked (order_by=likes or order_by=most_liked)
         order_by = (self.request.query_params.get('order_by') or '').strip().lower()
         if order_by in ('likes', 'most_liked'):
-            queryset = queryset.annotate(likes_count_ord=Count('recipe_likes'))
-            return queryset.order_by('-is_featured', '-likes_count_ord', '-created_at')
+            return queryset.order_by('-is_featured', '-likes_count', '-created_at')
+        
+        if 'search_rank' in queryset.query.annotations:
+            return queryset.order_by('-search_rank', '-created_at')
         
         return queryset.order_by('-is_featured', '-created_at')
     
+    def get_validators(self, request):
+        return collection_validators(request, cache.RECIPES, cache.RECIPE_LIST_PARAMS)
+    
+    def list(self, request, *args, **kwargs):
+        # Anonymous listings are served from the shared response cache
+        if not cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        compute_list = super().list
+        data = cache.cached_response_data(
+            'recipe_list', cache.RECIPES, request,
+            lambda: compute_list(request, *args, **kwargs).data,
+            allowed_params=cache.RECIPE_LIST_PARAMS,
+        )
+        return Response(data)
+    
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
@@ -190,7 +248,7 @@ class RecipeListCreateView(generics.ListCreateAPIView):
         serializer.save()
 
 
-class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class RecipeDetailView(ConditionalGetMixin, LikedRecipesMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a single recipe. URL accepts id or slug."""
     queryset = Recipe.objects.select_related('author').prefetch_related('ingredients', 'instructions')
     permission_classes = [AllowAny]
@@ -210,13 +268,31 @@ class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
         # For GET requests, show published recipes to anyone (excluding flagged recipes)
         # For PUT/PATCH/DELETE, show all recipes but check ownership in permissions
         if self.request.method == 'GET':
-            queryset = Recipe.objects.filter(is_published=True).select_related('author').prefetch_related('ingredients', 'instructions', 'recipe_likes', 'recipe_reports')
-            # Exclude recipes with more than 5 reports
+            # Hidden recipes (more than 5 reports) are excluded
+            return Recipe.objects.filter(is_published=True, is_hidden=False).select_related('author').prefetch_related('ingredients', 'instructions')
+        # Writes don't render ingredients/instructions: RecipeUpdateSerializer diffs them itself
+        return Recipe.objects.select_related('author')
+
+    def get_validators(self, request):
+        # One indexed lookup of everything the representation depends on: edits (ingredients and
+        # instructions are saved through the recipe, bumping updated_at), likes, the embedded author
+        # and, for a logged-in user, their own like.
+        queryset = Recipe.objects.filter(is_published=True, is_hidden=False, **slug_or_id_lookup(self.kwargs['slug_or_id']))
+        fields = [
+            'updated_at', 'likes_count', 'image_variants__source',
+            'author__name', 'author__email', 'author__is_redazione', 'author__is_active',
+        ]
+        if request.user.is_authenticated:
             queryset = queryset.annotate(
-                report_count=Count('recipe_reports')
-            ).exclude(report_count__gt=5)
-            return queryset
-        return Recipe.objects.select_related('author').prefetch_related('ingredients', 'instructions', 'recipe_likes', 'recipe_reports')
+                is_liked=Exists(RecipeLike.objects.filter(recipe=OuterRef('pk'), user=request.user))
+            )
+            fields.append('is_liked')
+        row = queryset.values_list('pk', *fields).first()
+        if row is None:
+            return None
+        # No Last-Modified: likes, image variants, the author and the request variant don't touch updated_at,
+        # so If-Modified-Since would answer 304 for a representation that changed. The ETag covers them all.
+        return make_etag('recipe', *row, *request_variant(request)), None
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -229,9 +305,9 @@ class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
         return [AllowAny()]
     
     def perform_update(self, serializer):
-        # Check if user owns the recipe
-        recipe = self.get_object()
-        if recipe.author != self.request.user:
+        # Check if user owns the recipe (already loaded by update())
+        recipe = serializer.instance
+        if recipe.author_id != self.request.user.pk:
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Non hai il permesso di modificare questa ricetta.")
         serializer.save()
@@ -244,13 +320,16 @@ class RecipeDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.delete()
 
 
-class MyRecipesView(generics.ListAPIView):
-    """List all recipes created by the authenticated user."""
-    serializer_class = RecipeSerializer
+class MyRecipesView(ConditionalGetMixin, LikedRecipesMixin, generics.ListAPIView):
+    """List all recipes created by the authenticated user (compact cards)."""
+    serializer_class = RecipeCardSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Recipe.objects.filter(author=self.request.user).select_related('author').prefetch_related('ingredients', 'instructions', 'recipe_likes', 'recipe_reports').order_by('-created_at')
+        return Recipe.objects.filter(author=self.request.user).select_related('author').only(*RecipeCardSerializer.QUERYSET_FIELDS).order_by('-created_at')
+    
+    def get_validators(self, request):
+        return collection_validators(request, cache.RECIPES, ('page',))
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -272,65 +351,82 @@ class RecipeReportView(generics.CreateAPIView):
         recipe = self.get_object()
         user = self.request.user
         
-        # Check if user already reported this recipe
-        if RecipeReport.objects.filter(user=user, recipe=recipe).exists():
-            from rest_framework.exceptions import ValidationError
-            raise ValidationError({"error": "Hai già segnalato questa ricetta."})
-        
         # Check if user is trying to report their own recipe
-        if recipe.author == user:
+        if recipe.author_id == user.pk:
             from rest_framework.exceptions import ValidationError
             raise ValidationError({"error": "Non puoi segnalare la tua stessa ricetta."})
         
-        # Save the report with user and recipe
-        serializer.save(user=user, recipe=recipe)
-        
-        # Check if recipe should be flagged (more than 5 reports)
-        report_count = recipe.recipe_reports.count()
-        if report_count > 5:
-            # Recipe is now flagged and will be hidden from public view
-            pass
+        with transaction.atomic():
+            # A single insert: the (user, recipe) unique constraint rejects duplicate reports
+            try:
+                with transaction.atomic():
+                    serializer.save(user=user, recipe=recipe)
+            except IntegrityError:
+                from rest_framework.exceptions import ValidationError
+                raise ValidationError({"error": "Hai già segnalato questa ricetta."})
+            
+            Recipe.objects.filter(pk=recipe.pk).update(reports_count=F('reports_count') + 1)
+            transaction.on_commit(metrics.REPORTS.inc)
+            # Hide the recipe when it crosses the threshold. The row lock taken by the update
+            # above serializes concurrent reports, so exactly one of them flips the flag.
+            hidden = Recipe.objects.filter(
+                pk=recipe.pk, is_hidden=False, reports_count__gt=Recipe.FLAG_REPORT_THRESHOLD
+            ).update(is_hidden=True, hidden_at=timezone.now())
+            if hidden:
+                cache.bump_generation(cache.SITEMAP)
+                if recipe.is_published:
+                    category_counts.adjust(recipe.category, -1)
 
 
 class RecipeLikeView(generics.GenericAPIView):
-    """Toggle like on a recipe. URL accepts id or slug."""
+    """
+    Like state of a recipe for the current user. URL accepts id or slug.
+    POST toggles; PUT (like) and DELETE (unlike) are idempotent. See blog/likes.py.
+    """
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthenticated]
 
-    def get_object(self):
+    def get_recipe_id(self):
+        # Numeric ids go straight to the write (a missing recipe is detected there): no lookup query
         slug_or_id = self.kwargs.get('slug_or_id')
-        return get_recipe_by_slug_or_id(slug_or_id, queryset=self.get_queryset())
+        if slug_or_id.isdigit():
+            return int(slug_or_id)
+        return get_object_or_404(self.get_queryset().values_list('pk', flat=True), slug=slug_or_id)
 
     def post(self, request, slug_or_id):
         """Add or remove a like from a recipe."""
-        recipe = self.get_object()
-        user = request.user
-        
-        # Check if user already liked this recipe
-        like, created = RecipeLike.objects.get_or_create(
-            user=user,
-            recipe=recipe
-        )
-        
-        if not created:
-            # User already liked, so remove the like
-            like.delete()
-            liked = False
-        else:
-            # User just liked the recipe
-            liked = True
-        
-        # Return updated like count
-        likes_count = recipe.recipe_likes.count()
-        
+        liked, likes_count = likes.toggle_like(request.user, self.get_recipe_id())
         return Response({
             'liked': liked,
             'likes_count': likes_count
         }, status=status.HTTP_200_OK)
 
+    def put(self, request, slug_or_id):
+        """Like a recipe (no-op if already liked)."""
+        likes_count = likes.set_like(request.user, self.get_recipe_id(), True)
+        return Response({'liked': True, 'likes_count': likes_count}, status=status.HTTP_200_OK)
+
+    def delete(self, request, slug_or_id):
+        """Remove the like from a recipe (no-op if not liked)."""
+        likes_count = likes.set_like(request.user, self.get_recipe_id(), False)
+        return Response({'liked': False, 'likes_count': likes_count}, status=status.HTTP_200_OK)
 
-class StoryPostListView(generics.ListAPIView):
-    """List all published story posts."""
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def recipe_like_states(request):
+    """Like state and count for many recipes at once: ?ids=1,2,3 (max 100). Used to hydrate a page in one call."""
+    raw_ids = [value.strip() for value in request.query_params.get('ids', '').split(',') if value.strip()]
+    if not all(value.isdigit() for value in raw_ids):
+        return Response({'error': 'ids deve essere un elenco di id numerici separati da virgole.'}, status=status.HTTP_400_BAD_REQUEST)
+    recipe_ids = {int(value) for value in raw_ids}
+    if len(recipe_ids) > likes.MAX_BATCH_IDS:
+        return Response({'error': f'Al massimo {likes.MAX_BATCH_IDS} id per richiesta.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(likes.like_states(request.user, recipe_ids), status=status.HTTP_200_OK)
+
+
+class StoryPostListView(ConditionalGetMixin, CursorPaginationOptInMixin, generics.ListAPIView):
+    """List all published story posts. Send ?cursor= for keyset pagination (infinite scroll)."""
     queryset = StoryPost.objects.filter(is_published=True).select_related('author')
     serializer_class = StoryPostSerializer
     permission_classes = [AllowAny]
@@ -349,89 +445,103 @@ class StoryPostListView(generics.ListAPIView):
             )
         
         return queryset.order_by('-created_at')
+    
+    def get_validators(self, request):
+        return collection_validators(request, cache.STORIES, cache.STORY_LIST_PARAMS)
+    
+    def list(self, request, *args, **kwargs):
+        # Anonymous listings are served from the shared response cache
+        if not cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        compute_list = super().list
+        data = cache.cached_response_data(
+            'story_list', cache.STORIES, request,
+            lambda: compute_list(request, *args, **kwargs).data,
+            allowed_params=cache.STORY_LIST_PARAMS,
+        )
+        return Response(data)
 
 
-class StoryPostDetailView(generics.RetrieveAPIView):
+class StoryPostDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     """Retrieve a single story post."""
     queryset = StoryPost.objects.filter(is_published=True).select_related('author')
     serializer_class = StoryPostSerializer
     permission_classes = [AllowAny]
+    
+    def get_validators(self, request):
+        row = (
+            StoryPost.objects.filter(is_published=True, pk=self.kwargs['pk'])
+            .values_list(
+                'pk', 'updated_at', 'image_variants__source',
+                'author__name', 'author__email', 'author__is_redazione', 'author__is_active',
+            )
+            .first()
+        )
+        if row is None:
+            return None
+        # ETag only, as for recipes: the author and the request variant don't touch updated_at.
+        return make_etag('story', *row, *request_variant(request)), None
+
+
+def _sitemap_version():
+    """(version, last_modified) of the sitemap: its generation, plus the frontend URL the entries point to."""
+    import hashlib
+    
+    generation = cache.get_generation(cache.SITEMAP)
+    base_url = getattr(settings, 'FRONTEND_URL', 'https://sardegnaricette.it')
+    url_hash = hashlib.sha1(base_url.encode('utf-8')).hexdigest()[:8]
+    return f'{generation}-{url_hash}', generation_to_datetime(generation)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def sitemap(request):
-    """Generate XML sitemap for SEO. Uses frontend URL so search engines index the right domain."""
+    """
+    Sitemap index for SEO, pointing to the numbered child sitemaps (see blog/sitemap.py).
+    Entries use the frontend URL so search engines index the right domain.
+    """
     from django.http import HttpResponse
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    base_url = getattr(settings, 'FRONTEND_URL', 'https://sardegnaricette.it').rstrip('/')
-    
-    # Get all published recipes
-    recipes = Recipe.objects.filter(is_published=True).order_by('-updated_at')
-    
-    # Get all published stories
-    stories = StoryPost.objects.filter(is_published=True).order_by('-updated_at')
-    
-    xml = ['<?xml version="1.0" encoding="UTF-8"?>']
-    xml.append('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
-    
-    # Homepage
-    xml.append('  <url>')
-    xml.append(f'    <loc>{base_url}/</loc>')
-    xml.append('    <changefreq>daily</changefreq>')
-    xml.append('    <priority>1.0</priority>')
-    xml.append('  </url>')
-    
-    # Recipes page
-    xml.append('  <url>')
-    xml.append(f'    <loc>{base_url}/recipes</loc>')
-    xml.append('    <changefreq>daily</changefreq>')
-    xml.append('    <priority>0.9</priority>')
-    xml.append('  </url>')
-    
-    # Stories page
-    xml.append('  <url>')
-    xml.append(f'    <loc>{base_url}/stories</loc>')
-    xml.append('    <changefreq>weekly</changefreq>')
-    xml.append('    <priority>0.8</priority>')
-    xml.append('  </url>')
-    
-    # Privacy and Terms
-    xml.append('  <url>')
-    xml.append(f'    <loc>{base_url}/privacy</loc>')
-    xml.append('    <changefreq>monthly</changefreq>')
-    xml.append('    <priority>0.3</priority>')
-    xml.append('  </url>')
-    
-    xml.append('  <url>')
-    xml.append(f'    <loc>{base_url}/terms</loc>')
-    xml.append('    <changefreq>monthly</changefreq>')
-    xml.append('    <priority>0.3</priority>')
-    xml.append('  </url>')
-    
-    # Individual recipes
-    for recipe in recipes:
-        lastmod = recipe.updated_at.strftime('%Y-%m-%d')
-        slug_or_id = recipe.slug or str(recipe.id)
-        xml.append('  <url>')
-        xml.append(f'    <loc>{base_url}/recipe/{slug_or_id}</loc>')
-        xml.append(f'    <lastmod>{lastmod}</lastmod>')
-        xml.append('    <changefreq>weekly</changefreq>')
-        xml.append('    <priority>0.8</priority>')
-        xml.append('  </url>')
-    
-    # Individual stories
-    for story in stories:
-        lastmod = story.updated_at.strftime('%Y-%m-%d')
-        xml.append('  <url>')
-        xml.append(f'    <loc>{base_url}/stories/{story.id}</loc>')
-        xml.append(f'    <lastmod>{lastmod}</lastmod>')
-        xml.append('    <changefreq>monthly</changefreq>')
-        xml.append('    <priority>0.7</priority>')
-        xml.append('  </url>')
-    
-    xml.append('</urlset>')
-    
-    return HttpResponse('\n'.join(xml), content_type='application/xml')
\ No newline at end of file
+    from django.urls import reverse
+    
+    version, last_modified = _sitemap_version()
+    etag = make_etag('sitemap-index', version, request.get_host())
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    
+    manifest = sitemaps.open_manifest(version)
+    
+    def child_url(name):
+        section, number = name[len('sitemap-'):-len('.xml')].rsplit('-', 1)
+        return request.build_absolute_uri(reverse('blog:sitemap-section', args=[section, int(number)]))
+    
+    response = HttpResponse(sitemaps.render_index(manifest, child_url), content_type='application/xml')
+    set_validator_headers(response, etag, last_modified)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def sitemap_section(request, section, number):
+    """A child sitemap, served gzip-compressed from the on-disk cache (decompressed for clients that can't take gzip)."""
+    from django.http import FileResponse, Http404, StreamingHttpResponse
+    from django.utils.cache import patch_vary_headers
+    
+    version, last_modified = _sitemap_version()
+    etag = make_etag('sitemap', version, section, number)
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+    
+    # An open file stays readable even if another worker removes its version directory meanwhile.
+    handle = sitemaps.open_child(version, section, number)
+    if handle is None:
+        raise Http404('Sitemap non trovata.')
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = FileResponse(handle, content_type='application/xml')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(sitemaps.decompressed(handle), content_type='application/xml')
+    patch_vary_headers(response, ('Accept-Encoding',))
+    set_validator_headers(response, etag, last_modified)
+    return response
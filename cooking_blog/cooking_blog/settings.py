@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -58,6 +59,9 @@ else:
 
     MIDDLEWARE = [
         'django.middleware.security.SecurityMiddleware',
+        'blog.metrics.MetricsMiddleware',
+        'blog.request_metrics.RequestMetricsMiddleware',
+        'blog.query_inspector.QueryInspectorMiddleware',
         'django.contrib.sessions.middleware.SessionMiddleware',
         'corsheaders.middleware.CorsMiddleware',
         'django.middleware.common.CommonMiddleware',
@@ -142,6 +146,53 @@ else:
     MEDIA_URL = 'media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+    # Cache (anonymous listing responses, see blog/cache.py)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cooking-blog',
+        }
+    }
+    RESPONSE_CACHE_TIMEOUT = 300  # seconds; entries are also invalidated on every content change
+
+    # Write-behind like buffering for traffic spikes (see blog/like_buffer.py)
+    LIKE_WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND', 'False') == 'True'
+    LIKE_BUFFER_PATH = BASE_DIR / 'like_buffer' / 'likes.log'
+    LIKE_BUFFER_FLUSH_INTERVAL = 2.0  # seconds
+    LIKE_BUFFER_FLUSH_IN_PROCESS = True
+    LIKE_BUFFER_FSYNC = True
+
+    # On-disk cache of the generated sitemaps (see blog/sitemap.py)
+    SITEMAP_CACHE_DIR = BASE_DIR / 'sitemap_cache'
+
+    # Resized WebP/JPEG variants of uploaded images (see blog/images.py); 0 disables the pool
+    IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', '1'))
+    # On-demand resizing in serve_media (?w=480&fmt=webp): allowed widths and LRU disk cache size
+    IMAGE_RESIZE_WIDTHS = (160, 320, 480, 640, 960, 1280)
+    IMAGE_RESIZE_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+    # Media responses (see blog/media.py): max-age of files without a content-hashed name, and
+    # optional hand-off of the transfer to a front proxy ('x-accel-redirect' or 'x-sendfile')
+    MEDIA_CACHE_MAX_AGE = 3600
+    MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+    MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+    # Per-request metrics (see blog/request_metrics.py): share of requests measured and logged, and the
+    # X-Debug-Token value that returns a Server-Timing header to non-staff clients
+    REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '1.0'))
+    REQUEST_METRICS_DEBUG_TOKEN = os.environ.get('REQUEST_METRICS_DEBUG_TOKEN', '')
+    # Bearer token of the Prometheus endpoint /metrics (see blog/metrics.py); empty disables it
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+    # SQL inspection (see blog/query_inspector.py): warn about SQL shapes repeated more than
+    # QUERY_INSPECTOR_REPEAT_THRESHOLD times in a request (fail under `manage.py test`), and log the
+    # EXPLAIN of queries slower than QUERY_INSPECTOR_SLOW_MS. Turn it off (QUERY_INSPECTOR=False) to benchmark.
+    QUERY_INSPECTOR_ENABLED = os.environ.get('QUERY_INSPECTOR', 'True') == 'True'
+    QUERY_INSPECTOR_REPEAT_THRESHOLD = 5
+    QUERY_INSPECTOR_RAISE = sys.argv[1:2] == ['test']
+    QUERY_INSPECTOR_SLOW_MS = 100
+    QUERY_INSPECTOR_LOG_PATH = BASE_DIR / 'logs' / 'slow_queries.log'
+
     # Custom User Model
     AUTH_USER_MODEL = 'blog.User'
 
@@ -45,6 +45,9 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise for static files
+    'blog.metrics.MetricsMiddleware',
+    'blog.request_metrics.RequestMetricsMiddleware',
+    'blog.query_inspector.QueryInspectorMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -120,6 +123,79 @@ MEDIA_URL = '/media/'
 # WhiteNoise configuration for static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Cache (anonymous listing responses, see blog/cache.py).
+# Set REDIS_URL (requires the redis package) to share it between workers/instances; the generations that
+# invalidate it are in the database, so a per-worker in-memory cache is never stale, only colder.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cooking-blog',
+        }
+    }
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))
+
+# Write-behind like buffering for traffic spikes (see blog/like_buffer.py).
+# The log goes on the persistent disk when there is one, so buffered likes survive a redeploy.
+LIKE_WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND', 'False') == 'True'
+LIKE_BUFFER_PATH = (
+    Path(RENDER_DISK_PATH) / 'like_buffer' / 'likes.log' if RENDER_DISK_PATH
+    else Path('/tmp/cooking_blog_like_buffer/likes.log')
+)
+LIKE_BUFFER_FLUSH_INTERVAL = float(os.environ.get('LIKE_BUFFER_FLUSH_INTERVAL', '2'))
+# Set to False when flush_like_buffer --loop runs as a separate process (requires REDIS_URL)
+LIKE_BUFFER_FLUSH_IN_PROCESS = os.environ.get('LIKE_BUFFER_FLUSH_IN_PROCESS', 'True') == 'True'
+LIKE_BUFFER_FSYNC = os.environ.get('LIKE_BUFFER_FSYNC', 'True') == 'True'
+
+# On-disk cache of the generated sitemaps (see blog/sitemap.py); rebuilt on demand, so /tmp is fine
+SITEMAP_CACHE_DIR = Path('/tmp/cooking_blog_sitemap')
+
+# Resized WebP/JPEG variants of uploaded images (see blog/images.py), encoded in a process pool
+# next to the gunicorn worker. 0 disables the pool: run generate_image_variants instead.
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', '1'))
+# On-demand resizing in serve_media (?w=480&fmt=webp). Only these widths are rendered, and the cache
+# (MEDIA_ROOT/resized) drops least recently used files above IMAGE_RESIZE_CACHE_MAX_MB: the disk is small.
+IMAGE_RESIZE_WIDTHS = (160, 320, 480, 640, 960, 1280)
+IMAGE_RESIZE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_RESIZE_CACHE_MAX_MB', '200')) * 1024 * 1024
+
+# Media responses (see blog/media.py). Content-hashed uploads are cached for a year (immutable);
+# older file names for MEDIA_CACHE_MAX_AGE. With nginx in front, set MEDIA_SENDFILE=x-accel-redirect and
+# map MEDIA_ACCEL_REDIRECT_PREFIX to MEDIA_ROOT in an `internal` location (x-sendfile for Apache/Caddy),
+# so file bytes never pass through the gunicorn worker. Render's own proxy doesn't support either.
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', '86400'))
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Per-request metrics (see blog/request_metrics.py): one JSON log line per measured request. Only
+# REQUEST_METRICS_SAMPLE_RATE of the requests are measured; those sending X-Debug-Token equal to
+# REQUEST_METRICS_DEBUG_TOKEN always are, and get a Server-Timing header like staff users.
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0.1'))
+REQUEST_METRICS_DEBUG_TOKEN = os.environ.get('REQUEST_METRICS_DEBUG_TOKEN', '')
+
+# Prometheus endpoint /metrics (see blog/metrics.py), scraped with `Authorization: Bearer <METRICS_TOKEN>`;
+# disabled while the token is empty. Workers share their metrics through PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py).
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# SQL inspection for staging (see blog/query_inspector.py), off unless QUERY_INSPECTOR=True: repeated SQL
+# shapes (N+1) are logged as warnings, and SELECTs slower than QUERY_INSPECTOR_SLOW_MS are re-run under
+# EXPLAIN (ANALYZE, BUFFERS) into a rotating log next to the uploads (or in /tmp without a disk).
+QUERY_INSPECTOR_ENABLED = os.environ.get('QUERY_INSPECTOR', 'False') == 'True'
+QUERY_INSPECTOR_REPEAT_THRESHOLD = int(os.environ.get('QUERY_INSPECTOR_REPEAT_THRESHOLD', '5'))
+QUERY_INSPECTOR_RAISE = False
+QUERY_INSPECTOR_SLOW_MS = int(os.environ.get('QUERY_INSPECTOR_SLOW_MS', '200'))
+QUERY_INSPECTOR_LOG_PATH = (
+    Path(RENDER_DISK_PATH) / 'logs' / 'slow_queries.log' if RENDER_DISK_PATH
+    else Path('/tmp/cooking_blog_logs/slow_queries.log')
+)
+
 # Custom User Model
 AUTH_USER_MODEL = 'blog.User'
 
@@ -177,12 +253,22 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        # The message is already a JSON object: one line per request, ready for log search
+        'json_line': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'request_metrics': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json_line',
+            'stream': 'ext://sys.stdout',
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -194,5 +280,10 @@ LOGGING = {
             'level': os.environ.get('DJANGO_LOG_LEVEL', 'INFO'),
             'propagate': False,
         },
+        'blog.request_metrics': {
+            'handlers': ['request_metrics'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
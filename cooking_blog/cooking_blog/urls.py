@@ -15,34 +15,68 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 import logging
-from pathlib import Path
+import os
+import posixpath
+from stat import S_ISREG
 from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
-from django.views.static import serve as static_serve
+from django.core.exceptions import SuspiciousFileOperation
 from django.http import Http404
+from django.utils._os import safe_join
+from blog.images import resized_image
+from blog.media import media_response
+from blog.metrics import metrics_view
 
 logger = logging.getLogger(__name__)
 
 
 def serve_media(request, path):
-    """Serve media files; log MEDIA_ROOT and path when file is missing (helps debug uploads)."""
-    document_root = Path(settings.MEDIA_ROOT).resolve()
-    full_path = (document_root / path).resolve()
-    if not str(full_path).startswith(str(document_root)) or not full_path.exists() or not full_path.is_file():
+    """
+    Serve media files with validators, long-lived caching and byte ranges (see blog/media.py);
+    log MEDIA_ROOT and path when file is missing (helps debug uploads).
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        stat = None
+    if stat is None or not S_ISREG(stat.st_mode):
         logger.warning(
             "Media not found: path=%s MEDIA_ROOT=%s exists=%s",
-            path, settings.MEDIA_ROOT, document_root.exists(),
+            path, settings.MEDIA_ROOT, os.path.isdir(settings.MEDIA_ROOT),
         )
         raise Http404("Media not found")
-    return static_serve(request, path, document_root=settings.MEDIA_ROOT)
+    if 'w' in request.GET or 'fmt' in request.GET:
+        return serve_resized_media(request, path)
+    return media_response(request, path, full_path, stat)
+
+
+def serve_resized_media(request, path):
+    """Serve an image resized on demand (?w=480&fmt=webp), from the disk cache after the first request."""
+    try:
+        width = int(request.GET.get('w', ''))
+    except ValueError:
+        width = None
+    try:
+        resized = resized_image(path, width, request.GET.get('fmt', 'jpeg').lower())
+        stat = resized.stat()
+    except ValueError:
+        # Only the allowed sizes and formats exist: anything else is a missing resource, like an unknown file.
+        raise Http404("Media not found")
+    except OSError:
+        logger.exception("Media resize failed: path=%s", path)
+        raise Http404("Media not found")
+    return media_response(request, path, resized, stat)
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('blog.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files (uploaded images) with logging on 404
@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration (render.yaml: `gunicorn -c gunicorn.conf.py cooking_blog.wsgi:application`).
+
+Sets up the Prometheus multiprocess mode of blog/metrics.py: every worker
+writes its metrics to files in PROMETHEUS_MULTIPROC_DIR, which is emptied
+when gunicorn starts; the files of a worker that exits are retired so its
+gauges stop being reported.
+"""
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+timeout = 120
+accesslog = '-'
+errorlog = '-'
+
+# Must be set before prometheus_client is imported, in the master and (inherited) in the workers.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/cooking_blog_prometheus')
+
+
+def on_starting(server):
+    # Files left by a previous run would add their counts to this one's.
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def post_worker_init(worker):
+    # In the worker: the master doesn't import blog.metrics, or it would show up as a worker.
+    from blog.metrics import GUNICORN_WORKERS
+
+    GUNICORN_WORKERS.set(worker.cfg.workers)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)